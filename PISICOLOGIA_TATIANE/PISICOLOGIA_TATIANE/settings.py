@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,23 +50,41 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'core.middleware.SessaoPerfilBackendMiddleware', # Provisório: remover a partir de 2026-11-07
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.PerfilMiddleware', # request.role / request.profile
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Carrega User, Usuario e Paciente/Psicologo em uma única query por requisição
+AUTHENTICATION_BACKENDS = [
+    'core.backends.PerfilModelBackend',
+]
+
 ROOT_URLCONF = 'PISICOLOGIA_TATIANE.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, "templates")],
-        'APP_DIRS': True,
+        # Templates compilados uma vez por processo (cached.Loader). Em
+        # desenvolvimento o autoreload do runserver limpa o cache quando um
+        # template muda. Com 'loaders' definido, APP_DIRS tem que ser False
+        # (o app_directories.Loader faz o mesmo papel).
+        'APP_DIRS': False,
         'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.fragmentos',
             ],
         },
     },
@@ -127,6 +147,29 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
+# Destino do build de estáticos (python manage.py construir_estaticos).
+# O storage de core/storage.py grava cada arquivo com o hash do conteúdo no
+# nome, minifica CSS/JS e deixa ao lado versões .gz (e .br, com o pacote
+# brotli). Com DEBUG=False o {% static %} aponta para os nomes com hash, e a
+# frente pode servir STATIC_ROOT com cache de um ano. No nginx:
+#     location /static/ {
+#         alias /caminho/para/staticfiles/;
+#         gzip_static on;
+#         brotli_static on;   # módulo ngx_brotli
+#         expires max;
+#         add_header Cache-Control "public, max-age=31536000, immutable";
+#     }
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.storage.ArmazenamentoEstatico',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -139,6 +182,14 @@ MEDIA_URL = "/media/"
 # (os.path.join(BASE_DIR, "media") cria uma pasta "media" na raiz do projeto)
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Quem envia o corpo dos arquivos de mídia (core/midia.py), depois que o
+# Django checa o acesso: None (o próprio Django, com FileResponse/sendfile),
+# 'nginx' (X-Accel-Redirect) ou 'apache' (X-Sendfile, mod_xsendfile).
+# No nginx, a localização interna precisa apontar para MEDIA_ROOT:
+#     location /_midia_protegida/ { internal; alias /caminho/para/media/; }
+MIDIA_SENDFILE = os.environ.get('MIDIA_SENDFILE') or None
+MIDIA_ACCEL_PREFIXO = '/_midia_protegida/'
+
 # URL para onde o Django redireciona se o usuário não estiver logado
 LOGIN_URL = "nome_da_sua_url_de_login"  # Ex: "login"
 
@@ -146,4 +197,74 @@ LOGIN_URL = "nome_da_sua_url_de_login"  # Ex: "login"
 LOGIN_REDIRECT_URL = 'home'  # '/' significa a página inicial. Mude se quiser.
 
 # Opcional: Para onde o usuário vai DEPOIS de fazer logout
-LOGOUT_REDIRECT_URL = 'home' # '/' significa a página inicial.
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'home' # '/' significa a página inicial.
+
+# Limite de tentativas de login (core/throttle.py): (capacidade, janela em segundos)
+# por username e por IP. Tentativas recusadas não chegam a calcular o hash da senha.
+LOGIN_THROTTLE = {
+    'usuario': (5, 60),
+    'ip': (30, 60),
+}
+
+# Email (lembretes de consulta). Em desenvolvimento as mensagens saem no
+# console; em produção troque pelo backend SMTP.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'Psicologia Tatiane <nao-responda@psicologiatatiane.com.br>'
+
+# Cache (snapshot do dashboard do psicólogo). O LocMemCache é por processo:
+# com vários processos/servidores use um cache compartilhado (Redis, Memcached)
+# para que a invalidação por signals valha para todos.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'psicologia-tatiane',
+    }
+}
+
+# Sessões. O modo é escolhido pela variável de ambiente SESSAO_MODO:
+#   'db'             - tabela django_session (padrão do Django): lê/escreve no banco a cada requisição
+#   'cached_db'      - lê do cache 'sessoes' e só vai ao banco em cache miss; escreve nos dois.
+#                      Só existe com um cache compartilhado em SESSAO_CACHE_URL (ver abaixo)
+#   'signed_cookies' - a sessão inteira vai no cookie assinado; nenhum acesso a banco/disco
+#                      (o logout não invalida cópias antigas do cookie; sessão limitada a ~4KB)
+#   'file'           - um arquivo por sessão em SESSAO_DIRETORIO
+# Sessões expiradas no banco ou em arquivos: manage.py limpar_sessoes (rodar pelo cron).
+# Compare os modos com: manage.py benchmark_sessoes
+MODOS_SESSAO = {
+    'db': 'django.contrib.sessions.backends.db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'file': 'django.contrib.sessions.backends.file',
+}
+
+# Cache das sessões no modo cached_db: tem de ser compartilhado entre os
+# processos (redis://... ou o endereço host:porta de um Memcached). Um cache
+# local (LocMem) não serve: o logout só limparia o cache do processo que o
+# atendeu e os outros continuariam aceitando a sessão até o TIMEOUT.
+SESSAO_CACHE_URL = os.environ.get('SESSAO_CACHE_URL')
+if SESSAO_CACHE_URL:
+    CACHES['sessoes'] = {
+        'BACKEND': (
+            'django.core.cache.backends.redis.RedisCache'
+            if SESSAO_CACHE_URL.startswith(('redis://', 'rediss://', 'unix://'))
+            else 'django.core.cache.backends.memcached.PyMemcacheCache'
+        ),
+        'LOCATION': SESSAO_CACHE_URL,
+        'KEY_PREFIX': 'sessoes',
+        'TIMEOUT': 300,
+    }
+    SESSION_CACHE_ALIAS = 'sessoes'
+    MODOS_SESSAO['cached_db'] = 'django.contrib.sessions.backends.cached_db'
+
+SESSAO_MODO = os.environ.get('SESSAO_MODO', 'db')
+if SESSAO_MODO not in MODOS_SESSAO:
+    raise ImproperlyConfigured(
+        f"SESSAO_MODO={SESSAO_MODO!r} inválido. Opções: {', '.join(MODOS_SESSAO)}"
+        + ("" if SESSAO_CACHE_URL else " ('cached_db' exige SESSAO_CACHE_URL com um cache compartilhado)")
+    )
+SESSION_ENGINE = MODOS_SESSAO[SESSAO_MODO]
+SESSION_FILE_PATH = os.environ.get('SESSAO_DIRETORIO', os.path.join(BASE_DIR, 'sessoes'))
+
+# Mensagens flash (django.contrib.messages): guardadas em cookie, sem tocar a
+# sessão; só caem para a sessão se não couberem no cookie (padrão do Django,
+# explícito aqui porque o modo de sessão é configurável).
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
@@ -15,9 +15,9 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings         # <-- Importar settings
-from django.conf.urls.static import static
+from core.views import midia_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,8 +27,7 @@ urlpatterns = [
     path('dashboard/paciente/', include('paciente.urls')),
     path('dashboard/psicologo/', include('psicologo.urls')),
     
-    
+    # Mídia (fotos de perfil) com controle de acesso, em produção também:
+    # com MIDIA_SENDFILE o corpo do arquivo é enviado pelo nginx/apache
+    re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<caminho>.+)$', midia_view, name='midia'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Roster psicólogo/paciente, resumos mensais e lembretes mantidos a
+        # cada consulta criada, alterada ou apagada
+        from . import receivers  # noqa: F401
@@ -1,9 +1,12 @@
 # core/auth_services.py (NOVO ARQUIVO)
 
 from django.shortcuts import redirect
-from django.contrib.auth import login, authenticate
-from django.contrib.auth.forms import AuthenticationForm
-from .forms import CustomUserCreationForm
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from .forms import CustomUserCreationForm, LoginForm
+from . import throttle
+from .middleware import resolver_perfil
 
 def add_login_form_placeholders(form):
     """Adiciona placeholders ao formulário de login."""
@@ -31,23 +34,17 @@ def add_register_form_placeholders(form):
 
 def handle_login_post(request):
     """Processa uma tentativa de login. Retorna um redirect se for sucesso."""
-    form = AuthenticationForm(request, data=request.POST)
+    form = LoginForm(request, data=request.POST)
     add_login_form_placeholders(form) # Adiciona placeholders em caso de erro
 
+    # is_valid() já autentica (um único hash de senha); não chamamos
+    # authenticate() de novo, só pegamos o usuário do formulário
     if form.is_valid():
-        user = authenticate(
-            username=form.cleaned_data.get('username'),
-            password=form.cleaned_data.get('password')
-        )
-        if user is not None:
-            login(request, user)
-            
-            # !! CORREÇÃO AQUI !!
-            # Mude de:
-            # return get_user_redirect_url(user)
-            # Para (retornando dois valores):
-            return get_user_redirect_url(user), form
-            
+        user = form.get_user()
+        login(request, user)
+        throttle.login_bem_sucedido(form.cleaned_data.get('username'))
+        return get_user_redirect_url(user), form
+
     # Se falhou, retorna o formulário com erros (Isto já está correto)
     return None, form 
 
@@ -57,7 +54,18 @@ def handle_register_post(request):
     add_register_form_placeholders(form) # Adiciona placeholders em caso de erro
 
     if form.is_valid():
-        user = form.save()
+        try:
+            with transaction.atomic():
+                user = form.save()
+        except IntegrityError:
+            # O banco decide: email já usado (índice LOWER(email)) ou username
+            # cadastrado por outra requisição entre a validação e o INSERT
+            if User.objects.filter(username=form.cleaned_data['username']).exists():
+                form.add_error('username', User._meta.get_field('username').error_messages['unique'])
+            else:
+                form.add_error('email', "Este email já está em uso.")
+            return None, form
+
         login(request, user)
         # ESTA É A LÓGICA CORRETA: redireciona para completar o perfil
         
@@ -72,19 +80,14 @@ def handle_register_post(request):
 
 def get_user_redirect_url(user):
     """Verifica o tipo de perfil do usuário e retorna a URL do dashboard correto."""
-    try:
-        # 'hasattr' checa se o atributo existe
-        if hasattr(user, 'usuario') and hasattr(user.usuario, 'psicologo'):
-            return redirect('psicologo:dashboard')
-        elif hasattr(user, 'usuario') and hasattr(user.usuario, 'paciente'):
-            return redirect('paciente:dashboard')
-        else:
-            # Usuário logado mas sem perfil (Paciente/Psicologo)
-            return redirect('completar_perfil')
-            
-    except AttributeError:
-        # 'user.usuario' não existe (pode ser admin ou precisa completar)
-        if user.is_superuser:
-            return redirect('/admin')
-        else:
-            return redirect('completar_perfil')
\ No newline at end of file
+    # Admin não tem Usuario: iria parar no completar_perfil
+    if user.is_superuser or user.is_staff:
+        return redirect('/admin')
+    papel, _ = resolver_perfil(user)
+    if papel == 'psicologo':
+        return redirect('psicologo:dashboard')
+    elif papel == 'paciente':
+        return redirect('paciente:dashboard')
+    else:
+        # Usuário logado mas sem perfil (Paciente/Psicologo)
+        return redirect('completar_perfil')
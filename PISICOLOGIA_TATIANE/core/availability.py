@@ -0,0 +1,97 @@
+# core/availability.py
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import Consulta, HorarioTrabalho
+
+# Duração de uma sessão. Usada tanto para fatiar os intervalos de trabalho
+# em horários quanto para saber quanto tempo uma consulta existente ocupa.
+DURACAO_SESSAO_MINUTOS = 60
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _hora(minutos):
+    return datetime.min.time().replace(hour=minutos // 60, minute=minutos % 60)
+
+
+def psicologo_tem_horarios(psicologo_id):
+    """Indica se o psicólogo já cadastrou seus horários de trabalho."""
+    return HorarioTrabalho.objects.filter(psicologo_clinica__psicologo_id=psicologo_id).exists()
+
+
+def horarios_livres(psicologo_id, inicio, fim, agora=None, ignorar=()):
+    """
+    Calcula os horários livres de um psicólogo entre as datas 'inicio' e 'fim'
+    (inclusive). Faz apenas duas consultas ao banco: os intervalos de trabalho
+    e as consultas ativas do período. O resto é feito em memória, com um
+    índice ordenado de horários ocupados por dia.
+    'ignorar' são ids de consultas que não ocupam horário (ex: as sessões
+    de uma série que estão mudando de hora).
+
+    Retorna uma lista de dicts {'data', 'hora', 'clinica_id', 'clinica'},
+    em ordem cronológica.
+    """
+    agora = timezone.localtime(agora or timezone.now())
+
+    # 1. Intervalos de trabalho por dia da semana
+    intervalos = defaultdict(list)
+    horarios = HorarioTrabalho.objects.filter(
+        psicologo_clinica__psicologo_id=psicologo_id
+    ).values_list(
+        'dia_semana', 'hora_inicio', 'hora_fim',
+        'psicologo_clinica__clinica_id', 'psicologo_clinica__clinica__nome',
+    )
+    for dia_semana, hora_inicio, hora_fim, clinica_id, clinica_nome in horarios:
+        intervalos[dia_semana].append((_minutos(hora_inicio), _minutos(hora_fim), clinica_id, clinica_nome))
+    if not intervalos:
+        return []
+
+    # 2. Índice de horários ocupados: data -> lista ordenada de inícios (em minutos)
+    ocupados = defaultdict(list)
+    consultas = Consulta.objects.filter(
+        psicologo_id=psicologo_id,
+        data__range=(inicio, fim),
+        status__in=Consulta.STATUS_ATIVOS,
+    ).exclude(id_consulta__in=ignorar).order_by('data', 'hora').values_list('data', 'hora')
+    for data, hora in consultas:
+        ocupados[data].append(_minutos(hora))
+
+    # 3. Percorre os dias, fatiando cada intervalo e descontando os ocupados
+    livres = []
+    vistos = set()
+    dia = inicio
+    while dia <= fim:
+        inicios_ocupados = ocupados.get(dia, [])
+        for ini, fim_intervalo, clinica_id, clinica_nome in sorted(intervalos.get(dia.weekday(), [])):
+            slot = ini
+            while slot + DURACAO_SESSAO_MINUTOS <= fim_intervalo:
+                # Primeira consulta que começa depois de (slot - duração): se ela
+                # começar antes do fim do slot, há sobreposição.
+                i = bisect_right(inicios_ocupados, slot - DURACAO_SESSAO_MINUTOS)
+                sobreposto = i < len(inicios_ocupados) and inicios_ocupados[i] < slot + DURACAO_SESSAO_MINUTOS
+                passado = dia < agora.date() or (dia == agora.date() and slot <= _minutos(agora))
+
+                if not sobreposto and not passado and (dia, slot) not in vistos:
+                    vistos.add((dia, slot))
+                    livres.append({
+                        'data': dia,
+                        'hora': _hora(slot),
+                        'clinica_id': clinica_id,
+                        'clinica': clinica_nome,
+                    })
+                slot += DURACAO_SESSAO_MINUTOS
+        dia += timedelta(days=1)
+
+    livres.sort(key=lambda s: (s['data'], s['hora']))
+    return livres
+
+
+def horario_disponivel(psicologo_id, data, hora):
+    """Verifica se 'data' às 'hora' está entre os horários livres do psicólogo."""
+    return any(slot['hora'] == hora for slot in horarios_livres(psicologo_id, data, data))
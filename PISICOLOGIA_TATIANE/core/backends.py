@@ -0,0 +1,22 @@
+# core/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+# Perfis carregados junto com o User em toda requisição
+PERFIL_RELACIONADOS = ('usuario__paciente', 'usuario__psicologo')
+
+
+class PerfilModelBackend(ModelBackend):
+    """
+    ModelBackend que carrega User -> Usuario -> Paciente/Psicologo em uma
+    única query (select_related) ao restaurar o usuário da sessão.
+    Depois disso, 'user.usuario.psicologo' e afins não vão mais ao banco.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related(*PERFIL_RELACIONADOS).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
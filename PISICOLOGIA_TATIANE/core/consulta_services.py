@@ -0,0 +1,145 @@
+# core/consulta_services.py
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from . import reminders
+from .availability import horarios_livres, psicologo_tem_horarios
+from .models import Consulta, SerieConsulta
+
+# Status de sessões que ainda podem ser alteradas em uma série
+# (as mesmas origens que a tabela de transições aceita para cancelar)
+STATUS_ALTERAVEIS_SERIE = Consulta.TRANSICOES['cancelada']
+
+
+def criar_consultas(form):
+    """
+    Cria as consultas de um ConsultaForm já validado: uma consulta avulsa
+    ou todas as sessões de uma série, em um único bulk_create.
+    Levanta IntegrityError se algum horário for ocupado no meio do caminho
+    (nada é salvo nesse caso). Retorna a lista de consultas criadas.
+    """
+    consulta = form.save(commit=False)
+    datas = form.datas_recorrencia()
+
+    with transaction.atomic():
+        if len(datas) == 1:
+            consulta.save()
+            return [consulta]
+
+        serie = SerieConsulta.objects.create(
+            paciente=consulta.paciente,
+            psicologo=consulta.psicologo,
+            frequencia=form.cleaned_data['repetir'],
+            data_inicio=datas[0],
+            hora=consulta.hora,
+            total_sessoes=form.cleaned_data.get('sessoes'),
+            data_fim=form.cleaned_data.get('repetir_ate'),
+        )
+        # bulk_create não dispara post_save: o roster e os resumos são
+        # atualizados pelo sinal consultas_alteradas_em_lote (core/receivers.py)
+        return Consulta.objects.bulk_create([
+            Consulta(
+                paciente=consulta.paciente,
+                psicologo=consulta.psicologo,
+                data=data,
+                hora=consulta.hora,
+                observacao=consulta.observacao,
+                serie=serie,
+            )
+            for data in datas
+        ])
+
+
+def _desta_em_diante(consulta):
+    """Sessões da série a partir desta (inclusive) que ainda podem mudar."""
+    return Consulta.objects.filter(
+        serie_id=consulta.serie_id,
+        data__gte=consulta.data,
+        status__in=STATUS_ALTERAVEIS_SERIE,
+    )
+
+
+def cancelar_desta_em_diante(consulta):
+    """Cancela esta sessão e as seguintes da série em um único UPDATE."""
+    return _desta_em_diante(consulta).transition('cancelada')
+
+
+def alterar_hora_desta_em_diante(consulta, nova_hora):
+    """
+    Muda o horário desta sessão e das seguintes (e o da série) em um único
+    UPDATE. Como no ConsultaForm, se o psicólogo já cadastrou seus horários
+    o novo horário precisa estar livre em todas as datas (as próprias
+    sessões que estão mudando não contam como ocupadas).
+    Levanta ValidationError se estiver fora da agenda e IntegrityError se
+    colidir com outra consulta; nada é alterado nesses casos.
+    """
+    with transaction.atomic():
+        sessoes = dict(_desta_em_diante(consulta).values_list('id_consulta', 'data'))
+        if not sessoes:
+            return 0
+
+        if psicologo_tem_horarios(consulta.psicologo_id):
+            datas = sorted(set(sessoes.values()))
+            livres = {
+                (slot['data'], slot['hora'])
+                for slot in horarios_livres(consulta.psicologo_id, datas[0], datas[-1], ignorar=list(sessoes))
+            }
+            indisponiveis = [data for data in datas if (data, nova_hora) not in livres]
+            if indisponiveis:
+                raise ValidationError(
+                    "Fora do horário de atendimento nas datas: "
+                    + ", ".join(data.strftime('%d/%m/%Y') for data in indisponiveis)
+                )
+
+        total = _desta_em_diante(consulta).filter(id_consulta__in=sessoes).update(
+            hora=nova_hora, atualizada_em=timezone.now()
+        )
+        SerieConsulta.objects.filter(pk=consulta.serie_id).update(hora=nova_hora)
+        reminders.reprogramar_lembretes(list(sessoes))
+        return total
+
+
+# --- Status em lote ---
+
+# Limite de consultas por requisição em lote
+MAX_CONSULTAS_LOTE = 500
+
+
+def atualizar_status_em_lote(psicologo, ids, novo_status):
+    """
+    Aplica 'novo_status' a várias consultas do psicólogo com um único
+    UPDATE ... WHERE status IN (origens permitidas por Consulta.TRANSICOES).
+
+    Retorna (atualizadas, recusadas), onde 'recusadas' é uma lista de
+    (id_consulta, motivo) para as consultas que não puderam mudar. Cada id
+    pedido termina em exatamente um dos dois.
+    """
+    # Em lote, consultas que já estão no status de destino contam como recusadas
+    origens = [status for status in Consulta.TRANSICOES[novo_status] if status != novo_status]
+    ids = list(dict.fromkeys(ids))[:MAX_CONSULTAS_LOTE]
+    consultas = Consulta.objects.filter(psicologo=psicologo, id_consulta__in=ids)
+
+    with transaction.atomic():
+        # Status de antes (linhas travadas onde o banco permite) e de depois
+        # do UPDATE, na mesma transação: quem decide é o WHERE do UPDATE, e
+        # as duas leituras dizem qual id ele alterou e por que os outros não
+        antes = dict(consultas.select_for_update().values_list('id_consulta', 'status'))
+        consultas.transition(novo_status, origens=origens)
+        depois = dict(consultas.values_list('id_consulta', 'status'))
+
+    nomes_status = dict(Consulta.STATUS_CHOICES)
+    atualizadas, recusadas = 0, []
+    for id_consulta in ids:
+        status = antes.get(id_consulta)
+        if status is None or id_consulta not in depois:
+            recusadas.append((id_consulta, "consulta não encontrada"))
+        elif status in origens and depois[id_consulta] == novo_status:
+            atualizadas += 1
+        elif status == novo_status:
+            recusadas.append((id_consulta, f"já está '{nomes_status[status]}'"))
+        elif status not in origens:
+            recusadas.append((id_consulta, f"não pode sair de '{nomes_status[status]}'"))
+        else:
+            recusadas.append((id_consulta, "foi alterada ao mesmo tempo por outra ação"))
+    return atualizadas, recusadas
@@ -0,0 +1,7 @@
+# core/context_processors.py
+from .fragmentos import TEMPO_FRAGMENTOS
+
+
+def fragmentos(request):
+    """Validade do {% cache %} dos templates (core/fragmentos.py)."""
+    return {'TEMPO_FRAGMENTOS': TEMPO_FRAGMENTOS}
@@ -0,0 +1,41 @@
+# core/decorators.py
+from functools import wraps
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+
+
+def _papel_required(papel):
+    def decorator(view_func):
+        @login_required
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            # Logado mas sem perfil: precisa completar o cadastro
+            if request.role is None:
+                return redirect('completar_perfil')
+            if request.role != papel:
+                messages.error(request, "Acesso não permitido.")
+                return redirect('home')
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
+
+
+def perfil_required(view_func):
+    """Exige usuário logado com perfil completo (paciente ou psicólogo)."""
+    @login_required
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if request.role is None:
+            messages.warning(request, 'Você precisa completar seu perfil primeiro.')
+            return redirect('completar_perfil')
+        return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+# Exige usuário logado com perfil de psicólogo (request.profile é o Psicologo)
+psicologo_required = _papel_required('psicologo')
+
+# Exige usuário logado com perfil de paciente (request.profile é o Paciente)
+paciente_required = _papel_required('paciente')
@@ -0,0 +1,164 @@
+# core/estatisticas.py
+from datetime import date
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Consulta, ResumoMensal
+
+# Como cada consulta é contada no resumo: pelo status, exceto as duas que a
+# rotina 'fechar_consultas_passadas' encontra no passado: a confirmada que
+# não foi fechada, que é falta, e a pendente que ela cancelou, que é expirada
+SITUACAO = Case(
+    When(status='confirmada', fechamento_pendente=True, then=Value('faltou')),
+    When(status='cancelada', expirada=True, then=Value('expirada')),
+    default=F('status'),
+    output_field=CharField(),
+)
+
+
+def _proximo_mes(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _mes_anterior(mes):
+    return date(mes.year - (mes.month == 1), (mes.month - 2) % 12 + 1, 1)
+
+
+def _contagens(consultas):
+    """{(psicologo_id, mes, status): total} das consultas informadas."""
+    linhas = (
+        consultas.order_by()
+        .annotate(mes=TruncMonth('data'), situacao=SITUACAO)
+        .values('psicologo_id', 'mes', 'situacao')
+        .annotate(total=Count('id_consulta'))
+    )
+    return {
+        (linha['psicologo_id'], linha['mes'], linha['situacao']): linha['total']
+        for linha in linhas.iterator()
+    }
+
+
+def _gravar(contagens, existentes):
+    """Grava as contagens (upsert) e apaga as linhas de 'existentes' que sumiram."""
+    with transaction.atomic():
+        ResumoMensal.objects.bulk_create(
+            [
+                ResumoMensal(psicologo_id=psicologo_id, mes=mes, status=status, total=total)
+                for (psicologo_id, mes, status), total in contagens.items()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['psicologo', 'mes', 'status'],
+            update_fields=['total'],
+        )
+        sobrando = [id_resumo for chave, id_resumo in existentes.items() if chave not in contagens]
+        if sobrando:
+            ResumoMensal.objects.filter(id__in=sobrando).delete()
+
+
+def _existentes(resumos):
+    return {
+        (psicologo_id, mes, status): id_resumo
+        for id_resumo, psicologo_id, mes, status in resumos.values_list('id', 'psicologo_id', 'mes', 'status')
+    }
+
+
+def recalcular_meses(meses):
+    """
+    Refaz o resumo dos (psicologo_id, mes) informados a partir das consultas
+    daquele mês (faixa de datas no índice psicólogo/data). O custo depende
+    só do número de consultas nesses meses, não do histórico inteiro.
+    """
+    meses = {(psicologo_id, mes.replace(day=1)) for psicologo_id, mes in meses if psicologo_id and mes}
+    if not meses:
+        return
+    faixas = reduce(or_, (
+        Q(psicologo_id=psicologo_id, data__gte=mes, data__lt=_proximo_mes(mes))
+        for psicologo_id, mes in meses
+    ))
+    resumos = reduce(or_, (Q(psicologo_id=psicologo_id, mes=mes) for psicologo_id, mes in meses))
+    _gravar(
+        _contagens(Consulta.objects.filter(faixas)),
+        _existentes(ResumoMensal.objects.filter(resumos)),
+    )
+
+
+def agendar_recalculo(meses):
+    """Recalcula depois do commit, lendo o estado já gravado das consultas."""
+    meses = set(meses)
+    transaction.on_commit(lambda: recalcular_meses(meses))
+
+
+def reconstruir(psicologo_id=None):
+    """Refaz todos os resumos (ou os de um psicólogo). Retorna quantas linhas foram gravadas."""
+    consultas = Consulta.objects.all()
+    resumos = ResumoMensal.objects.all()
+    if psicologo_id is not None:
+        consultas = consultas.filter(psicologo_id=psicologo_id)
+        resumos = resumos.filter(psicologo_id=psicologo_id)
+    contagens = _contagens(consultas)
+    _gravar(contagens, _existentes(resumos))
+    return len(contagens)
+
+
+# --- Leitura (página de estatísticas) ---
+
+def _taxa(parte, todo):
+    """Porcentagem arredondada, ou None se não houver base."""
+    return round(100 * parte / todo, 1) if todo else None
+
+
+def _indicadores(contagem):
+    realizadas = contagem.get('realizada', 0)
+    faltas = contagem.get('faltou', 0)
+    canceladas = contagem.get('cancelada', 0)
+    expiradas = contagem.get('expirada', 0)
+    total = sum(contagem.values())
+    return {
+        'total': total,
+        'realizadas': realizadas,
+        'faltas': faltas,
+        'canceladas': canceladas,
+        'expiradas': expiradas,
+        'outras': total - realizadas - faltas - canceladas,
+        # Pendentes que expiraram nunca chegaram a ser marcadas: ficam fora
+        # da taxa de cancelamento (nem canceladas, nem na base)
+        'base_cancelamento': total - expiradas,
+        'taxa_comparecimento': _taxa(realizadas, realizadas + faltas),
+        'taxa_faltas': _taxa(faltas, realizadas + faltas),
+        'taxa_cancelamento': _taxa(canceladas, total - expiradas),
+    }
+
+
+def resumo_do_periodo(psicologo, meses=12, hoje=None):
+    """
+    Indicadores dos últimos 'meses' meses (incluindo o atual), lidos só do
+    ResumoMensal: no máximo meses x status linhas, qualquer que seja o histórico.
+    Retorna (lista por mês do mais antigo ao mais recente, indicadores do período).
+    """
+    hoje = hoje or timezone.localdate()
+    lista_meses = [hoje.replace(day=1)]
+    for _ in range(meses - 1):
+        lista_meses.append(_mes_anterior(lista_meses[-1]))
+    lista_meses.reverse()
+
+    por_mes = {mes: {} for mes in lista_meses}
+    for mes, status, total in ResumoMensal.objects.filter(
+        psicologo=psicologo, mes__gte=lista_meses[0], mes__lte=lista_meses[-1],
+    ).values_list('mes', 'status', 'total'):
+        por_mes[mes][status] = total
+
+    periodo = {}
+    for contagem in por_mes.values():
+        for status, total in contagem.items():
+            periodo[status] = periodo.get(status, 0) + total
+
+    return (
+        [{'mes': mes, **_indicadores(contagem)} for mes, contagem in por_mes.items()],
+        _indicadores(periodo),
+    )
@@ -1,7 +1,27 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.models import User
-from .models import Psicologo, Usuario, Paciente, Consulta
+from datetime import timedelta
+from .models import Psicologo, Usuario, Paciente, Consulta, SerieConsulta
+from .availability import horarios_livres, psicologo_tem_horarios
+from . import throttle
+
+class LoginForm(AuthenticationForm):
+    """
+    AuthenticationForm com limite de tentativas (core.throttle).
+    O limite é checado antes do authenticate(): tentativa recusada não
+    gasta o hash da senha. Depois de is_valid(), use form.get_user().
+    """
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        'throttled': "Muitas tentativas de login. Aguarde um minuto e tente novamente.",
+    }
+
+    def clean(self):
+        if not throttle.permitir_login(self.request, self.cleaned_data.get('username')):
+            raise forms.ValidationError(self.error_messages['throttled'], code='throttled')
+        return super().clean()
+
 
 class CustomUserCreationForm(UserCreationForm):
     # O email está ótimo
@@ -24,11 +44,10 @@ class CustomUserCreationForm(UserCreationForm):
 
 
     def clean_email(self):
-        # ... (seu clean_email está perfeito, não mude) ...
-        email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
-            raise forms.ValidationError("Este email já está em uso.")
-        return email
+        # Sem consulta ao banco: email repetido (mesmo com maiúsculas diferentes)
+        # é barrado pelo índice único em LOWER(email) na hora do INSERT
+        # (veja auth_services.handle_register_post)
+        return User.objects.normalize_email(self.cleaned_data.get('email'))
 
     def save(self, commit=True):
         # ... (seu save está perfeito, não mude) ...
@@ -38,7 +57,23 @@ class CustomUserCreationForm(UserCreationForm):
             user.save()
         return user
 
-class UsuarioProfileForm(forms.ModelForm):
+class UnicidadeNoBancoMixin:
+    """
+    Com validar_unicos=False o form não faz os SELECTs de campos únicos
+    (cpf, crp...) no is_valid(): quem garante é a constraint do banco, e
+    o IntegrityError é tratado no serviço (veja perfil_services).
+    """
+
+    def __init__(self, *args, validar_unicos=True, **kwargs):
+        self.validar_unicos = validar_unicos
+        super().__init__(*args, **kwargs)
+
+    def validate_unique(self):
+        if self.validar_unicos:
+            super().validate_unique()
+
+
+class UsuarioProfileForm(UnicidadeNoBancoMixin, forms.ModelForm):
     class Meta:
         model = Usuario
         fields = ['nome', 'cpf', 'idade', 'rua', 'numero', 'bairro', 'cidade', 'cep']
@@ -70,7 +105,7 @@ class PacienteProfileForm(forms.ModelForm):
         self.fields['responsavel'].label = ''
         self.fields['plano_saude'].label = ''
   
-class PsicologoProfileForm(forms.ModelForm):
+class PsicologoProfileForm(UnicidadeNoBancoMixin, forms.ModelForm):
     class Meta:
         model = Psicologo
         # Pega os campos do seu models.py
@@ -87,6 +122,26 @@ class PsicologoProfileForm(forms.ModelForm):
         self.fields['especialidade'].label = ''
         
 class ConsultaForm(forms.ModelForm):
+    # Limite de sessões criadas de uma vez por uma série recorrente
+    MAX_SESSOES_SERIE = 52
+
+    # --- Recorrência (opcional) ---
+    repetir = forms.ChoiceField(
+        label="Repetir",
+        choices=[('', 'Não repetir')] + SerieConsulta.FREQUENCIA_CHOICES,
+        required=False,
+    )
+    sessoes = forms.IntegerField(
+        label="Número de sessões",
+        min_value=2, max_value=MAX_SESSOES_SERIE,
+        required=False,
+        widget=forms.NumberInput(attrs={'placeholder': 'Ex: 10 (ou use "Repetir até")'}),
+    )
+    repetir_ate = forms.DateField(
+        label="Repetir até",
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
     
     class Meta:
         model = Consulta
@@ -109,38 +164,36 @@ class ConsultaForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         # --- A MÁGICA ACONTECE AQUI ---
         
-        # 1. Pega o 'user' que a view vai nos passar
-        user = kwargs.pop('user', None)
+        # 1. Pega o papel e o perfil já resolvidos pelo PerfilMiddleware
+        #    (request.role / request.profile), que a view vai nos passar
+        role = kwargs.pop('role', None)
+        profile = kwargs.pop('profile', None)
         
         super(ConsultaForm, self).__init__(*args, **kwargs)
-        
-        if not user:
-            # Se, por algum motivo, não recebermos o user, não faz nada
-            return
 
         # 2. Adapta o formulário baseado no tipo de usuário
-        if hasattr(user, 'usuario') and hasattr(user.usuario, 'paciente'):
+        if role == 'paciente':
             # --- O USUÁRIO É UM PACIENTE ---
             
             # Define o 'paciente' como o próprio usuário e esconde o campo
-            self.fields['paciente'].queryset = Paciente.objects.filter(id=user.usuario.paciente.id)
-            self.fields['paciente'].initial = user.usuario.paciente
+            self.fields['paciente'].queryset = Paciente.objects.filter(id=profile.id)
+            self.fields['paciente'].initial = profile
             self.fields['paciente'].widget = forms.HiddenInput()
             
             # Mostra todos os psicólogos no dropdown
-            self.fields['psicologo'].queryset = Psicologo.objects.all()
+            self.fields['psicologo'].queryset = Psicologo.objects.select_related('usuario')
             self.fields['psicologo'].label = "Escolha o Psicólogo"
 
-        elif hasattr(user, 'usuario') and hasattr(user.usuario, 'psicologo'):
+        elif role == 'psicologo':
             # --- O USUÁRIO É UM PSICÓLOGO ---
             
             # Define o 'psicologo' como o próprio usuário e esconde o campo
-            self.fields['psicologo'].queryset = Psicologo.objects.filter(id=user.usuario.psicologo.id)
-            self.fields['psicologo'].initial = user.usuario.psicologo
+            self.fields['psicologo'].queryset = Psicologo.objects.filter(id=profile.id)
+            self.fields['psicologo'].initial = profile
             self.fields['psicologo'].widget = forms.HiddenInput()
             
             # Mostra todos os pacientes no dropdown
-            self.fields['paciente'].queryset = Paciente.objects.all()
+            self.fields['paciente'].queryset = Paciente.objects.select_related('usuario')
             self.fields['paciente'].label = "Escolha o Paciente"
             
         else:
@@ -148,6 +201,73 @@ class ConsultaForm(forms.ModelForm):
             # Esconde os dois para evitar erros.
             self.fields['paciente'].widget = forms.HiddenInput()
             self.fields['psicologo'].widget = forms.HiddenInput()
+
+    def datas_recorrencia(self):
+        """Datas de todas as sessões a criar (só a primeira, se não repetir)."""
+        data = self.cleaned_data['data']
+        frequencia = self.cleaned_data.get('repetir')
+        if not frequencia:
+            return [data]
+
+        passo = timedelta(days=SerieConsulta.INTERVALO_DIAS[frequencia])
+        limite = self.cleaned_data.get('repetir_ate')
+        total = self.cleaned_data.get('sessoes') or self.MAX_SESSOES_SERIE
+
+        datas = []
+        while len(datas) < total and (limite is None or data <= limite):
+            datas.append(data)
+            data += passo
+        return datas
+
+    def clean(self):
+        cleaned_data = super().clean()
+        psicologo = cleaned_data.get('psicologo')
+        data = cleaned_data.get('data')
+        hora = cleaned_data.get('hora')
+
+        if cleaned_data.get('repetir'):
+            if not cleaned_data.get('sessoes') and not cleaned_data.get('repetir_ate'):
+                self.add_error('sessoes', "Informe o número de sessões ou a data final da repetição.")
+                return cleaned_data
+            if data and cleaned_data.get('repetir_ate') and cleaned_data['repetir_ate'] < data:
+                self.add_error('repetir_ate', "A data final deve ser depois da primeira sessão.")
+                return cleaned_data
+
+        if not (psicologo and data and hora):
+            return cleaned_data
+
+        datas = self.datas_recorrencia()
+
+        # 1. Conflitos: uma única consulta por faixa de datas traz todos os
+        # horários já ocupados da série (ou da consulta avulsa).
+        # (O erro vai no campo 'hora', o que evita repetir a mesma mensagem
+        # na validação da UniqueConstraint 'consulta_horario_unico'.)
+        ocupadas = set(Consulta.objects.filter(
+            psicologo=psicologo, hora=hora,
+            data__range=(datas[0], datas[-1]),
+            status__in=Consulta.STATUS_ATIVOS,
+        ).values_list('data', flat=True))
+        conflitos = [d for d in datas if d in ocupadas]
+        if conflitos:
+            if len(datas) == 1:
+                self.add_error('hora', "Este horário já está reservado para este psicólogo.")
+            else:
+                self.add_error('hora', "Horário já reservado nas datas: " + ", ".join(d.strftime('%d/%m/%Y') for d in conflitos))
+            return cleaned_data
+
+        # 2. Só valida contra a agenda se o psicólogo já cadastrou seus horários
+        if psicologo_tem_horarios(psicologo.id):
+            livres = {
+                (slot['data'], slot['hora'])
+                for slot in horarios_livres(psicologo.id, datas[0], datas[-1])
+            }
+            indisponiveis = [d for d in datas if (d, hora) not in livres]
+            if len(datas) == 1 and indisponiveis:
+                self.add_error('hora', "Este horário não está disponível para o psicólogo escolhido. Escolha um dos horários livres.")
+            elif indisponiveis:
+                self.add_error('hora', "Fora do horário de atendimento nas datas: " + ", ".join(d.strftime('%d/%m/%Y') for d in indisponiveis))
+
+        return cleaned_data
             
 class FotoPerfilForm(forms.ModelForm):
     class Meta:
@@ -155,4 +275,9 @@ class FotoPerfilForm(forms.ModelForm):
         fields = ['foto_perfil']
         labels = {
             'foto_perfil': 'Alterar Foto de Perfil' 
+        }
+        # Sem o link "Atualmente: ..." do ClearableFileInput, que apontaria
+        # para o original (com EXIF), que não é servido
+        widgets = {
+            'foto_perfil': forms.FileInput(),
         }
\ No newline at end of file
@@ -0,0 +1,165 @@
+# core/fotos.py
+import hashlib
+import io
+import os
+import re
+from functools import lru_cache
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from PIL import Image, ImageOps
+
+from .models import Usuario
+
+# Variantes geradas para cada foto: nome -> lado máximo em pixels.
+# O avatar tem o dobro do maior uso (48px) para telas de alta densidade.
+VARIANTES = {
+    'avatar': 96,
+    'card': 320,
+    'full': 1024,
+}
+
+FORMATO = 'WEBP'
+EXTENSAO = 'webp'
+QUALIDADE = 82
+METODO = 4
+
+# Vai no nome de cada variante: mudar o processamento (tamanhos, formato,
+# qualidade) gera nomes novos em vez de regravar arquivos servidos como
+# imutáveis. Depois de mudar, devolva as fotos à fila com uma migração de
+# dados (ver 0022_variantes_com_assinatura).
+ASSINATURA = hashlib.sha256(
+    repr((sorted(VARIANTES.items()), FORMATO, QUALIDADE, METODO)).encode()
+).hexdigest()[:8]
+
+# Foto padrão do modelo: não é processada, é servida como está
+FOTO_PADRAO = Usuario._meta.get_field('foto_perfil').default
+
+DIRETORIO_VARIANTES = 'fotos_perfil/variantes'
+
+# Tentativas do worker por foto antes de desistir (até o usuário enviar outra)
+MAX_FALHAS = 3
+
+
+@lru_cache(maxsize=4096)
+def nome_variante(nome_original, variante):
+    """
+    Caminho (no storage) da variante de uma foto: o nome do original, que
+    é o hash do seu conteúdo (core/storage.py), mais a ASSINATURA do
+    processamento. Mesmo nome, mesmos bytes: o arquivo nunca é regravado.
+    """
+    base = os.path.splitext(os.path.basename(nome_original))[0]
+    return f"{DIRETORIO_VARIANTES}/{base}-{ASSINATURA}-{variante}.{EXTENSAO}"
+
+
+def filtro_donos_da_variante(nome_variante_arquivo):
+    """Q dos Usuarios cuja foto originou a variante 'nome_variante_arquivo'."""
+    base = os.path.basename(nome_variante_arquivo).rsplit('-', 2)[0]
+    diretorio = Usuario._meta.get_field('foto_perfil').upload_to.rstrip('/')
+    if re.fullmatch(r'[0-9a-f]{64}', base):
+        diretorio = f"{diretorio}/{base[:2]}/{base[2:4]}"
+    # Intervalo em vez de LIKE: usa o índice de foto_perfil
+    prefixo = f"{diretorio}/{base}."
+    return Q(foto_perfil__gte=prefixo, foto_perfil__lt=prefixo + '\uffff')
+
+
+def variante_para(tamanho):
+    """Menor variante que cobre 'tamanho' px em tela 2x (ou a maior, se nenhuma cobrir)."""
+    for variante, lado in sorted(VARIANTES.items(), key=lambda item: item[1]):
+        if lado >= tamanho * 2:
+            return variante
+    return max(VARIANTES, key=VARIANTES.get)
+
+
+def url_foto(usuario, tamanho):
+    """
+    URL da foto de 'usuario' para exibir com 'tamanho' px.
+    Enquanto as variantes não ficam prontas, devolve a foto padrão: o
+    original enviado ainda tem o EXIF (GPS, câmera...) e nunca é servido
+    (ver core/midia.py).
+    Não faz query nem acessa o storage: o nome da variante é calculado.
+    """
+    foto = usuario.foto_perfil
+    if foto and usuario.foto_variantes_prontas and foto.name != FOTO_PADRAO:
+        return default_storage.url(nome_variante(foto.name, variante_para(tamanho)))
+    return default_storage.url(FOTO_PADRAO)
+
+
+def pendentes(limite):
+    """(id, nome da foto) dos usuários com foto ainda sem variantes (e sem falhas demais)."""
+    return list(
+        Usuario.objects.filter(foto_variantes_prontas=False, foto_falhas__lt=MAX_FALHAS)
+        .exclude(foto_perfil='').exclude(foto_perfil=FOTO_PADRAO).exclude(foto_perfil__isnull=True)
+        .order_by('pk')
+        .values_list('pk', 'foto_perfil')[:limite]
+    )
+
+
+def gerar_variantes(conteudo):
+    """
+    Recebe os bytes da foto original e devolve {variante: bytes em WebP}.
+    Aplica a rotação do EXIF e descarta todos os metadados (GPS, câmera...).
+    Só CPU, sem banco nem storage: roda dentro do pool de processos.
+    """
+    with Image.open(io.BytesIO(conteudo)) as original:
+        imagem = ImageOps.exif_transpose(original)
+        imagem = imagem.convert('RGBA' if imagem.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    resultado = {}
+    for variante, lado in VARIANTES.items():
+        copia = imagem.copy()
+        copia.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        saida = io.BytesIO()
+        # Imagem nova (sem .info): nada de EXIF/ICC/XMP no arquivo gerado
+        copia.save(saida, FORMATO, quality=QUALIDADE, method=METODO)
+        resultado[variante] = saida.getvalue()
+    return resultado
+
+
+def ler_original(nome):
+    with Usuario._meta.get_field('foto_perfil').storage.open(nome, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def variantes_existem(nome_original):
+    """
+    As fotos têm nome pelo hash do conteúdo (core/storage.py): a mesma foto
+    enviada de novo, ou por outro usuário, reaproveita as variantes já geradas.
+    """
+    return all(default_storage.exists(nome_variante(nome_original, variante)) for variante in VARIANTES)
+
+
+def marcar_pronta(usuario_id, nome_original):
+    """
+    Marca as variantes como prontas se o usuário ainda usa essa foto.
+    A navegação em cache não precisa ser invalidada: foto_variantes_prontas
+    faz parte da chave do fragmento (templates/base.html).
+    """
+    return bool(
+        Usuario.objects.filter(pk=usuario_id, foto_perfil=nome_original)
+        .update(foto_variantes_prontas=True)
+    )
+
+
+def registrar_falha(usuario_id, nome_original):
+    """Conta uma falha de processamento, se o usuário ainda usa essa foto."""
+    return bool(
+        Usuario.objects.filter(pk=usuario_id, foto_perfil=nome_original)
+        .update(foto_falhas=F('foto_falhas') + 1)
+    )
+
+
+def gravar_variantes(usuario_id, nome_original, variantes):
+    """
+    Salva as variantes no storage e marca o usuário como pronto, desde que
+    ele não tenha trocado de foto no meio do caminho.
+    Uma variante que já existe fica como está: o nome identifica o conteúdo
+    (nome_variante) e pode estar em cache nos navegadores como imutável.
+    Retorna True se a marcação foi feita.
+    """
+    for variante, conteudo in variantes.items():
+        destino = nome_variante(nome_original, variante)
+        if not default_storage.exists(destino):
+            default_storage.save(destino, ContentFile(conteudo))
+    return marcar_pronta(usuario_id, nome_original)
@@ -0,0 +1,13 @@
+# core/fragmentos.py
+
+# Validade dos fragmentos de template em cache ({% cache TEMPO_FRAGMENTOS ... %}).
+# Os fragmentos não são apagados quando os dados mudam: o cache é local a cada
+# processo, e o delete de um não alcança os outros. Em vez disso, cada chave
+# varia por tudo o que o fragmento mostra, e uma mudança gera uma chave nova;
+# o tempo só limita quanto as entradas antigas ocupam.
+#   navegacao              - cabeçalho do base.html: papel, usuário, nome da foto e
+#                            foto_variantes_prontas (o worker de fotos roda em outro processo).
+#   dashboard_boas_vindas  - nome (e CRP/especialidade) no topo dos dashboards.
+#   dashboard_plano        - plano de saúde no dashboard do paciente.
+#   dashboard_atalhos      - links de acesso rápido: varia só pelo papel.
+TEMPO_FRAGMENTOS = 60 * 60
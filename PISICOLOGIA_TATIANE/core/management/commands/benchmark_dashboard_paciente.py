@@ -0,0 +1,80 @@
+# core/management/commands/benchmark_dashboard_paciente.py
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Consulta, Paciente
+from paciente.dashboard import consultas_do_dashboard
+
+
+def dashboard_antigo(paciente):
+    """As três queries que a view fazia antes (sem select_related)."""
+    hoje = timezone.now().date()
+    agora = timezone.now().time()
+    return {
+        'consultas_futuras': Consulta.objects.filter(
+            paciente=paciente, data__gte=hoje, status__in=['confirmada', 'pendente']
+        ).exclude(data=hoje, hora__lt=agora).order_by('data', 'hora')[:3],
+        'consultas_realizadas': Consulta.objects.filter(
+            paciente=paciente, status='realizada'
+        ).order_by('-data', '-hora')[:5],
+        'consultas_canceladas': Consulta.objects.filter(
+            paciente=paciente, status='cancelada'
+        ).order_by('-data', '-hora')[:3],
+    }
+
+
+def _usar_como_template(secoes):
+    """Percorre as seções como o template faz (inclui o nome do psicólogo)."""
+    return [
+        (consulta.id_consulta, consulta.psicologo.usuario.nome)
+        for consultas in secoes.values()
+        for consulta in consultas
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara número de queries e tempo do dashboard do paciente: três queries "
+        "separadas (antes) contra a query única com ROW_NUMBER() (agora)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paciente', type=int,
+                            help="id do paciente (padrão: o que tem mais consultas).")
+        parser.add_argument('--repeticoes', type=int, default=50,
+                            help="Execuções de cada versão (padrão: 50).")
+
+    def handle(self, *args, **options):
+        if options['paciente']:
+            paciente = Paciente.objects.filter(pk=options['paciente']).first()
+        else:
+            paciente = Paciente.objects.annotate(total=Count('consultas')).order_by('-total').first()
+        if paciente is None:
+            raise CommandError("Paciente não encontrado.")
+
+        total = paciente.consultas.count()
+        self.stdout.write(f"Paciente {paciente.pk} ({paciente}) com {total} consultas")
+
+        resultados = {}
+        for nome, funcao in (('antes', dashboard_antigo), ('agora', consultas_do_dashboard)):
+            tempos = []
+            for _ in range(options['repeticoes']):
+                inicio = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    linhas = _usar_como_template(funcao(paciente))
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nome] = linhas
+            self.stdout.write(
+                f"{nome:>5}: {len(queries)} queries, mediana {statistics.median(tempos):.2f} ms, "
+                f"p95 {sorted(tempos)[int(len(tempos) * 0.95) - 1]:.2f} ms"
+            )
+
+        if resultados['antes'] != resultados['agora']:
+            raise CommandError("As duas versões devolveram consultas diferentes.")
+        self.stdout.write(self.style.SUCCESS("Mesmo resultado nas duas versões."))
@@ -0,0 +1,97 @@
+# core/management/commands/benchmark_login.py
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from core import throttle
+from core.forms import LoginForm
+
+USERNAME = 'benchmark-login'
+SENHA = 'senha-do-benchmark-123'
+
+
+def login_antigo(request):
+    """O fluxo anterior: is_valid() autentica e depois authenticate() de novo."""
+    form = AuthenticationForm(request, data=request.POST)
+    if form.is_valid():
+        return authenticate(
+            username=form.cleaned_data.get('username'),
+            password=form.cleaned_data.get('password'),
+        )
+    return None
+
+
+def login_atual(request):
+    """O fluxo de auth_services.handle_login_post: um único hash."""
+    form = LoginForm(request, data=request.POST)
+    if form.is_valid():
+        return form.get_user()
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede logins por segundo em um único processo (= por núcleo) no fluxo antigo "
+        "(dois hashes) e no atual (um hash), e quantas tentativas de força bruta "
+        "contra um username são recusadas antes do hash. Usa um usuário temporário; "
+        "nada fica gravado no banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20,
+                            help="Logins medidos em cada fluxo (padrão: 20).")
+        parser.add_argument('--tentativas', type=int, default=200,
+                            help="Tentativas com senha errada no teste de força bruta (padrão: 200).")
+
+    def _medir(self, funcao, request, repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            # Entre um login e outro o limite é zerado: aqui só o custo do hash importa
+            throttle.balde('ip').liberar(throttle.ip_do_request(request))
+            throttle.login_bem_sucedido(USERNAME)
+            if funcao(request) is None:
+                raise RuntimeError("Login do benchmark falhou.")
+        return repeticoes / (time.perf_counter() - inicio)
+
+    def handle(self, *args, **options):
+        fabrica = RequestFactory()
+        correto = fabrica.post('/conta/', {'username': USERNAME, 'password': SENHA})
+        errado = fabrica.post('/conta/', {'username': USERNAME, 'password': 'errada'})
+
+        with transaction.atomic():
+            User.objects.create_user(USERNAME, password=SENHA)
+
+            resultados = {}
+            for nome, funcao in (('antes', login_antigo), ('agora', login_atual)):
+                resultados[nome] = self._medir(funcao, correto, options['repeticoes'])
+                self.stdout.write(f"{nome:>5}: {resultados[nome]:.1f} logins/s por núcleo")
+
+            throttle.balde('ip').liberar(throttle.ip_do_request(errado))
+            throttle.login_bem_sucedido(USERNAME)
+            recusadas = com_hash = 0
+            inicio = time.perf_counter()
+            for _ in range(options['tentativas']):
+                form = LoginForm(errado, data=errado.POST)
+                form.is_valid()
+                if form.has_error('__all__', code='throttled'):
+                    recusadas += 1
+                else:
+                    com_hash += 1
+            duracao = time.perf_counter() - inicio
+
+            throttle.balde('ip').liberar(throttle.ip_do_request(errado))
+            throttle.login_bem_sucedido(USERNAME)
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"Força bruta: {options['tentativas']} tentativas em {duracao:.2f}s, "
+            f"{com_hash} com hash de senha, {recusadas} recusadas antes do hash"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Ganho no login: {resultados['agora'] / resultados['antes']:.2f}x"
+        ))
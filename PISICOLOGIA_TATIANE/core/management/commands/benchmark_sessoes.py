@@ -0,0 +1,92 @@
+# core/management/commands/benchmark_sessoes.py
+import tempfile
+import time
+from datetime import date, time as hora, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from core.models import Consulta, Paciente, Psicologo, Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede requisições por segundo dos dashboards de psicólogo e paciente em "
+        "cada modo de sessão (settings.MODOS_SESSAO), com as queries por requisição. "
+        "Roda no próprio processo (sem servidor HTTP), num banco de teste descartável "
+        "criado e apagado pelo comando: o banco configurado não é tocado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=200,
+                            help="Requisições por dashboard em cada modo (padrão: 200).")
+        parser.add_argument('--modos', nargs='+', choices=sorted(settings.MODOS_SESSAO),
+                            default=list(settings.MODOS_SESSAO),
+                            help="Modos a comparar (padrão: todos).")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        bancos = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            paginas = self._criar_dados()
+            with tempfile.TemporaryDirectory() as diretorio:
+                for modo in options['modos']:
+                    with override_settings(
+                        SESSION_ENGINE=settings.MODOS_SESSAO[modo], SESSION_FILE_PATH=diretorio,
+                    ):
+                        for nome, user in paginas:
+                            self._medir(modo, nome, user, options['requisicoes'])
+        finally:
+            teardown_databases(bancos, verbosity=0)
+            teardown_test_environment()
+
+    def _criar_dados(self):
+        """Um psicólogo e um paciente com algumas consultas, no banco de teste."""
+        perfis = []
+        for indice, (tipo, modelo) in enumerate([('psicologo', Psicologo), ('paciente', Paciente)]):
+            user = User.objects.create_user(f'benchmark-{tipo}', f'{tipo}@exemplo.com', 'senha-benchmark')
+            usuario = Usuario.objects.create(
+                user=user, cpf=f'{indice + 1:011d}', nome=f'Benchmark {tipo}', email=user.email,
+            )
+            extras = {'crp': 'CRP-0'} if modelo is Psicologo else {}
+            perfis.append(modelo.objects.create(usuario=usuario, **extras))
+        psicologo, paciente = perfis
+        hoje = date.today()
+        for semana in range(-4, 4):
+            Consulta.objects.create(
+                psicologo=psicologo, paciente=paciente, data=hoje + timedelta(weeks=semana),
+                hora=hora(10), status='realizada' if semana < 0 else 'confirmada',
+            )
+        return [
+            ('psicologo:dashboard', psicologo.usuario.user),
+            ('paciente:dashboard', paciente.usuario.user),
+        ]
+
+    def _medir(self, modo, nome, user, requisicoes):
+        client = Client()
+        client.force_login(user)
+        url = reverse(nome)
+        # Aquece o cache (snapshot do dashboard, sessão no cached_db)
+        client.get(url)
+
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(requisicoes):
+                resposta = client.get(url)
+                if resposta.status_code != 200:
+                    raise CommandError(f"{url} respondeu {resposta.status_code} no modo {modo}.")
+        duracao = time.perf_counter() - inicio
+        client.logout()
+
+        self.stdout.write(
+            f"{modo:>14}  {url:<22} {requisicoes / duracao:7.0f} req/s  "
+            f"{len(queries) / requisicoes:.1f} queries/req"
+        )
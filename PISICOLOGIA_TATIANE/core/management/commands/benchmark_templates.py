@@ -0,0 +1,86 @@
+# core/management/commands/benchmark_templates.py
+import copy
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.models import Consulta
+
+
+def _templates_sem_cache_de_loader():
+    """settings.TEMPLATES com os loaders sem o cached.Loader (relê e compila a cada render)."""
+    templates = copy.deepcopy(settings.TEMPLATES)
+    for engine in templates:
+        engine['OPTIONS']['loaders'] = [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o tempo (ms por página) dos dashboards e páginas principais em três "
+        "cenários: sem cache de templates compilados, com cached.Loader e cache frio "
+        "(fragmentos e snapshot do dashboard refeitos a cada requisição), e com "
+        "cached.Loader e cache quente. Roda no próprio processo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=50,
+                            help="Requisições por página em cada cenário (padrão: 50).")
+
+    def handle(self, *args, **options):
+        consulta = (
+            Consulta.objects.select_related('psicologo__usuario__user', 'paciente__usuario__user')
+            .first()
+        )
+        if consulta is None:
+            raise CommandError("É preciso ao menos uma consulta no banco.")
+        paginas = [
+            (consulta.psicologo.usuario.user, 'psicologo:dashboard', 'psicologo/dashboard.html'),
+            (consulta.psicologo.usuario.user, 'meu_perfil', 'core/meu_perfil.html'),
+            (consulta.paciente.usuario.user, 'paciente:dashboard', 'paciente/dashboard.html'),
+            (consulta.paciente.usuario.user, 'paciente:meus_agendamentos', 'paciente/meus_agendamentos.html'),
+        ]
+
+        cenarios = [
+            ('sem cached.Loader', _templates_sem_cache_de_loader(), True),
+            ('cached.Loader, cache frio', settings.TEMPLATES, True),
+            ('cached.Loader, cache quente', settings.TEMPLATES, False),
+        ]
+        # O Client precisa de 'testserver' em ALLOWED_HOSTS
+        with override_settings(ALLOWED_HOSTS=['testserver', *settings.ALLOWED_HOSTS]):
+            for nome_cenario, templates, frios in cenarios:
+                self.stdout.write(self.style.MIGRATE_HEADING(nome_cenario))
+                with override_settings(TEMPLATES=templates):
+                    for user, url_nome, template in paginas:
+                        self._medir(user, reverse(url_nome), template, frios, options['repeticoes'])
+
+    def _medir(self, user, url, template, frios, repeticoes):
+        client = Client()
+        client.force_login(user)
+        # Aquece o snapshot do dashboard e o cache de templates (quando houver)
+        client.get(url)
+
+        tempos = []
+        for _ in range(repeticoes):
+            if frios:
+                cache.clear()
+            inicio = time.perf_counter()
+            resposta = client.get(url)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            if resposta.status_code != 200:
+                raise CommandError(f"{url} respondeu {resposta.status_code}.")
+        client.logout()
+
+        self.stdout.write(
+            f"  {template:<36} mediana {statistics.median(tempos):6.2f} ms  "
+            f"p95 {sorted(tempos)[int(len(tempos) * 0.95) - 1]:6.2f} ms"
+        )
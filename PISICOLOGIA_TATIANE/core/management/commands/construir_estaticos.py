@@ -0,0 +1,64 @@
+# core/management/commands/construir_estaticos.py
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from core import storage as armazenamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Build dos estáticos para produção: roda o collectstatic com o storage "
+        "de core/storage.py (nomes com hash do conteúdo, CSS/JS minificados, "
+        "versões .gz/.br ao lado) e mostra quantos bytes cada etapa economiza."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limpar', action='store_true',
+                            help="Apaga o conteúdo de STATIC_ROOT antes (remove builds antigos).")
+
+    def handle(self, *args, **options):
+        if not settings.STATIC_ROOT:
+            raise CommandError("Defina STATIC_ROOT nas settings.")
+        if armazenamento.brotli is None:
+            self.stdout.write(self.style.WARNING(
+                "Pacote brotli não instalado: só serão geradas as versões .gz."
+            ))
+
+        call_command('collectstatic', interactive=False, clear=options['limpar'], verbosity=0)
+
+        # Relê o manifesto gravado pelo collectstatic
+        staticfiles_storage.hashed_files, _ = staticfiles_storage.load_manifest()
+        totais = {'original': 0, 'minificado': 0, '.gz': 0, '.br': 0}
+        arquivos = 0
+        for nome, nome_com_hash in staticfiles_storage.hashed_files.items():
+            if not nome.lower().endswith(armazenamento.EXTENSOES_COMPRIMIVEIS):
+                continue
+            origem = finders.find(nome)
+            if origem is None:
+                continue
+            arquivos += 1
+            minificado = staticfiles_storage.size(nome_com_hash)
+            totais['original'] += os.path.getsize(origem)
+            totais['minificado'] += minificado
+            for sufixo in ('.gz', '.br'):
+                comprimido = nome_com_hash + sufixo
+                # Sem a versão comprimida, a frente manda o arquivo como está
+                totais[sufixo] += (
+                    staticfiles_storage.size(comprimido)
+                    if staticfiles_storage.exists(comprimido) else minificado
+                )
+
+        self.stdout.write(f"{arquivos} arquivos de texto em {settings.STATIC_ROOT}:")
+        for etapa, total in totais.items():
+            if etapa == '.br' and armazenamento.brotli is None:
+                continue
+            economia = 100 * (1 - total / totais['original']) if totais['original'] else 0
+            self.stdout.write(f"  {etapa:<10} {total / 1024:8.1f} KB  (-{economia:.0f}%)")
+        self.stdout.write(self.style.SUCCESS(
+            "Build pronto. Com DEBUG=False as páginas usam os nomes com hash."
+        ))
@@ -0,0 +1,39 @@
+# core/management/commands/enviar_lembretes.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import reminders
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de lembretes de consulta: agenda os lembretes das próximas consultas "
+        "(24h e 2h antes) e envia por email os que venceram. Roda em laço até ser "
+        "interrompido; vários workers podem rodar ao mesmo tempo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true',
+                            help="Processa um único ciclo e termina (útil no cron).")
+        parser.add_argument('--intervalo', type=float, default=60,
+                            help="Segundos entre ciclos (padrão: 60).")
+        parser.add_argument('--lote', type=int, default=200,
+                            help="Lembretes reservados por lote (padrão: 200).")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                inicio = time.monotonic()
+                enviados, descartados, falhas = reminders.processar_ciclo(options['lote'])
+                duracao = time.monotonic() - inicio
+                if enviados or descartados or falhas or options['uma_vez']:
+                    self.stdout.write(
+                        f"{enviados} enviados, {descartados} descartados, {falhas} falhas "
+                        f"em {duracao:.2f}s"
+                    )
+                if options['uma_vez']:
+                    break
+                time.sleep(max(options['intervalo'] - duracao, 0))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Worker de lembretes interrompido."))
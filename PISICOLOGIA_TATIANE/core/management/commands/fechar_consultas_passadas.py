@@ -0,0 +1,85 @@
+# core/management/commands/fechar_consultas_passadas.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Consulta
+
+
+class Command(BaseCommand):
+    help = (
+        "Rotina de manutenção (para o cron): cancela consultas 'pendente' cuja data "
+        "já passou (marcadas como expiradas) e marca as 'confirmada' passadas como aguardando fechamento. "
+        "Percorre a tabela em lotes por id; pode ser interrompida e rodada de novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=1000,
+                            help="Consultas por lote (padrão: 1000).")
+        parser.add_argument('--a-partir-de', type=int, default=0,
+                            help="Retoma a partir deste id_consulta (o último informado na execução anterior).")
+        parser.add_argument('--pausa', type=float, default=0,
+                            help="Segundos de espera entre lotes, para aliviar o banco.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Só conta o que seria alterado.")
+
+    def handle(self, *args, **options):
+        tamanho = options['tamanho_lote']
+        ultimo_id = options['a_partir_de']
+        hoje = timezone.localdate()
+
+        # Confirmadas já marcadas não são lidas de novo nas próximas execuções
+        passadas = Consulta.objects.filter(data__lt=hoje).filter(
+            Q(status='pendente') | Q(status='confirmada', fechamento_pendente=False)
+        )
+
+        total_expiradas = total_marcadas = total_lidas = 0
+        inicio = time.monotonic()
+
+        while True:
+            # Próximo lote por id (keyset): nunca usa OFFSET
+            lote = list(
+                passadas.filter(id_consulta__gt=ultimo_id)
+                .order_by('id_consulta')
+                .values_list('id_consulta', flat=True)[:tamanho]
+            )
+            if not lote:
+                break
+
+            inicio_lote = time.monotonic()
+            if options['dry_run']:
+                expiradas = passadas.filter(id_consulta__in=lote, status='pendente').count()
+                marcadas = len(lote) - expiradas
+            else:
+                with transaction.atomic():
+                    # 'expirada' separa estas das canceladas de verdade nas estatísticas
+                    expiradas = Consulta.objects.filter(id_consulta__in=lote).transition(
+                        'cancelada', origens=['pendente'], expirada=True
+                    )
+                    marcadas = passadas.filter(
+                        id_consulta__in=lote, status='confirmada'
+                    ).update(fechamento_pendente=True, atualizada_em=timezone.now())
+
+            ultimo_id = lote[-1]
+            total_lidas += len(lote)
+            total_expiradas += expiradas
+            total_marcadas += marcadas
+
+            duracao = time.monotonic() - inicio_lote
+            self.stdout.write(
+                f"Lote até id {ultimo_id}: {len(lote)} lidas, {expiradas} expiradas, "
+                f"{marcadas} marcadas para fechamento ({len(lote) / max(duracao, 1e-6):.0f} consultas/s)"
+            )
+
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{'[dry-run] ' if options['dry_run'] else ''}{total_lidas} consultas passadas em "
+            f"{duracao:.2f}s ({total_lidas / max(duracao, 1e-6):.0f}/s): {total_expiradas} pendentes "
+            f"expiradas, {total_marcadas} confirmadas marcadas para fechamento. Último id: {ultimo_id}."
+        ))
@@ -0,0 +1,95 @@
+# core/management/commands/limpar_midia_orfa.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from core import fotos
+from core.models import Usuario
+
+
+def _percorrer(storage, diretorio):
+    """Todos os arquivos abaixo de 'diretorio' no storage (caminhos relativos ao storage)."""
+    subdiretorios, arquivos = storage.listdir(diretorio)
+    for arquivo in arquivos:
+        yield f"{diretorio}/{arquivo}"
+    for subdiretorio in subdiretorios:
+        yield from _percorrer(storage, f"{diretorio}/{subdiretorio}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Rotina de manutenção (para o cron): conta quantos usuários referenciam "
+        "cada arquivo de foto de perfil e apaga os que ficaram sem nenhuma "
+        "referência (e suas variantes), além de temporários de uploads "
+        "interrompidos. Arquivos recentes são preservados: o registro que vai "
+        "usá-los pode ainda não ter sido gravado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idade-minima', type=int, default=60,
+                            help="Só apaga arquivos modificados há mais desses minutos (padrão: 60).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Só lista o que seria apagado.")
+
+    def handle(self, *args, **options):
+        campo = Usuario._meta.get_field('foto_perfil')
+        storage = campo.storage
+        diretorio = campo.upload_to.rstrip('/')
+        limite = timezone.now() - timedelta(minutes=options['idade_minima'])
+
+        # Contagem de referências por arquivo (uma query agregada)
+        referencias = dict(
+            Usuario.objects.exclude(foto_perfil__isnull=True).exclude(foto_perfil='')
+            .values_list('foto_perfil').annotate(total=Count('pk')).order_by()
+        )
+        referencias[campo.default] = referencias.get(campo.default, 0) + 1
+        variantes_usadas = {
+            fotos.nome_variante(nome, variante)
+            for nome in referencias for variante in fotos.VARIANTES
+        }
+
+        if not storage.exists(diretorio):
+            self.stdout.write("Nenhum arquivo de foto no storage.")
+            return
+
+        apagados = mantidos = recentes = bytes_liberados = 0
+        variantes_apagadas = []
+        for nome in _percorrer(storage, diretorio):
+            if nome.startswith(f"{fotos.DIRETORIO_VARIANTES}/"):
+                orfao = nome not in variantes_usadas
+            else:
+                orfao = nome.endswith('.tmp') or referencias.get(nome, 0) == 0
+            if not orfao:
+                mantidos += 1
+                continue
+            if storage.get_modified_time(nome) > limite:
+                recentes += 1
+                continue
+
+            tamanho = storage.size(nome)
+            if options['dry_run']:
+                self.stdout.write(f"[dry-run] apagaria {nome} ({tamanho} bytes)")
+            else:
+                storage.delete(nome)
+                if nome.startswith(f"{fotos.DIRETORIO_VARIANTES}/"):
+                    variantes_apagadas.append(nome)
+            apagados += 1
+            bytes_liberados += tamanho
+
+        # As referências foram lidas no início: um usuário salvo depois disso
+        # pode ter reaproveitado este conteúdo (o storage só renova o mtime do
+        # original) e o worker já ter marcado as variantes como prontas.
+        # Quem usa uma variante apagada volta para a fila do processar_fotos.
+        reprocessar = sum(
+            Usuario.objects.filter(fotos.filtro_donos_da_variante(nome), foto_variantes_prontas=True)
+            .update(foto_variantes_prontas=False)
+            for nome in variantes_apagadas
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'[dry-run] ' if options['dry_run'] else ''}{apagados} arquivos órfãos apagados "
+            f"({bytes_liberados / 1024:.0f} KB), {mantidos} em uso, {recentes} órfãos recentes preservados, "
+            f"{reprocessar} fotos devolvidas à fila de variantes."
+        ))
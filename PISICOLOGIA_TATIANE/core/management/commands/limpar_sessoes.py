@@ -0,0 +1,77 @@
+# core/management/commands/limpar_sessoes.py
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.file import SessionStore as SessaoArquivo
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+# Motores que guardam sessões na tabela django_session
+MOTORES_BANCO = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rotina de manutenção (para o cron): apaga sessões expiradas. No banco, "
+        "apaga em lotes pequenos (índice em expire_date) para não travar a tabela "
+        "django_session; no modo 'file', apaga os arquivos vencidos. Cookies "
+        "assinados expiram sozinhos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=1000,
+                            help="Sessões apagadas por lote (padrão: 1000).")
+        parser.add_argument('--pausa', type=float, default=0,
+                            help="Segundos de espera entre lotes, para aliviar o banco.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Só conta o que seria apagado.")
+
+    def handle(self, *args, **options):
+        motor = settings.SESSION_ENGINE
+        if motor == 'django.contrib.sessions.backends.file':
+            self._limpar_arquivos(options)
+        elif motor in MOTORES_BANCO:
+            self._limpar_banco(options)
+        else:
+            self.stdout.write(f"Nada a fazer para o motor de sessão {motor}.")
+
+    def _limpar_banco(self, options):
+        # A data é fixada no início: sessões que vencem durante a limpeza ficam para a próxima
+        expiradas = Session.objects.filter(expire_date__lt=timezone.now())
+        if options['dry_run']:
+            self.stdout.write(f"[dry-run] {expiradas.count()} sessões expiradas.")
+            return
+
+        total = 0
+        inicio = time.monotonic()
+        while True:
+            with transaction.atomic():
+                chaves = list(expiradas.values_list('session_key', flat=True)[:options['tamanho_lote']])
+                if not chaves:
+                    break
+                apagadas, _ = Session.objects.filter(session_key__in=chaves).delete()
+            total += apagadas
+            self.stdout.write(f"Lote: {apagadas} sessões apagadas ({total} no total)")
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} sessões expiradas apagadas em {duracao:.2f}s."
+        ))
+
+    def _limpar_arquivos(self, options):
+        if options['dry_run']:
+            self.stdout.write("[dry-run] O modo 'file' não conta antes de apagar.")
+            return
+        inicio = time.monotonic()
+        # Percorre o diretório de sessões e apaga um arquivo vencido por vez
+        SessaoArquivo.clear_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f"Arquivos de sessão vencidos apagados em {time.monotonic() - inicio:.2f}s."
+        ))
@@ -0,0 +1,82 @@
+# core/management/commands/processar_fotos.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core import fotos
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker das fotos de perfil: gera as variantes (avatar, card, full) em WebP, "
+        "sem metadados EXIF, das fotos enviadas que ainda não foram processadas. "
+        "O redimensionamento roda em um pool de processos; banco e storage ficam "
+        "no processo principal. Roda em laço até ser interrompido."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true',
+                            help="Processa a fila atual e termina (útil no cron).")
+        parser.add_argument('--intervalo', type=float, default=10,
+                            help="Segundos entre verificações da fila (padrão: 10).")
+        parser.add_argument('--processos', type=int, default=os.cpu_count() or 1,
+                            help="Tamanho do pool de processos (padrão: número de CPUs).")
+        parser.add_argument('--lote', type=int, default=50,
+                            help="Fotos lidas da fila por vez (padrão: 50).")
+
+    def handle(self, *args, **options):
+        try:
+            with ProcessPoolExecutor(max_workers=options['processos']) as pool:
+                while True:
+                    inicio = time.monotonic()
+                    prontas, falhas = self._processar_fila(pool, options['lote'])
+                    if prontas or falhas or options['uma_vez']:
+                        self.stdout.write(
+                            f"{prontas} fotos processadas, {falhas} falhas "
+                            f"em {time.monotonic() - inicio:.2f}s"
+                        )
+                    if options['uma_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Worker de fotos interrompido."))
+
+    def _processar_fila(self, pool, tamanho_lote):
+        prontas = falhas = 0
+        # Cada falha fica gravada (Usuario.foto_falhas): uma foto corrompida
+        # sai da fila depois de fotos.MAX_FALHAS ciclos, em vez de ser relida
+        # para sempre. Dentro do mesmo ciclo ela não é tentada de novo.
+        ignorar = set()
+        while True:
+            lote = [(pk, nome) for pk, nome in fotos.pendentes(tamanho_lote + len(ignorar))
+                    if pk not in ignorar][:tamanho_lote]
+            if not lote:
+                return prontas, falhas
+
+            tarefas = []
+            for pk, nome in lote:
+                if fotos.variantes_existem(nome):
+                    # Mesmo conteúdo já processado antes: só marca como pronta
+                    prontas += fotos.marcar_pronta(pk, nome)
+                    continue
+                try:
+                    tarefas.append((pk, nome, pool.submit(fotos.gerar_variantes, fotos.ler_original(nome))))
+                except OSError as erro:
+                    self.stderr.write(f"Usuário {pk}: não foi possível ler {nome} ({erro})")
+                    fotos.registrar_falha(pk, nome)
+                    ignorar.add(pk)
+                    falhas += 1
+
+            for pk, nome, tarefa in tarefas:
+                try:
+                    variantes = tarefa.result()
+                except Exception as erro:
+                    self.stderr.write(f"Usuário {pk}: falha ao processar {nome} ({erro})")
+                    fotos.registrar_falha(pk, nome)
+                    ignorar.add(pk)
+                    falhas += 1
+                    continue
+                if fotos.gravar_variantes(pk, nome, variantes):
+                    prontas += 1
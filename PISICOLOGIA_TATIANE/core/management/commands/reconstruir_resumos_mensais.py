@@ -0,0 +1,24 @@
+# core/management/commands/reconstruir_resumos_mensais.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import estatisticas
+
+
+class Command(BaseCommand):
+    help = (
+        "Refaz a tabela ResumoMensal (consultas por psicólogo, mês e status) a partir "
+        "das consultas. Use depois de importar dados ou se as estatísticas divergirem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--psicologo', type=int,
+                            help="Refaz só este psicólogo (id).")
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        linhas = estatisticas.reconstruir(options['psicologo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumos mensais reconstruídos em {time.monotonic() - inicio:.2f}s: {linhas} linhas."
+        ))
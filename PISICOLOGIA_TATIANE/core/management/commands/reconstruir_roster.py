@@ -0,0 +1,26 @@
+# core/management/commands/reconstruir_roster.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import roster
+
+
+class Command(BaseCommand):
+    help = (
+        "Preenche a tabela PsicologoPaciente (\"meus pacientes\") a partir das consultas. "
+        "Pode ser rodado a qualquer momento: pares existentes são sobrescritos e "
+        "pares sem consulta são removidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=1000,
+                            help="Linhas por INSERT (padrão: 1000).")
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        gravados, removidos = roster.reconstruir(options['tamanho_lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Roster reconstruído em {time.monotonic() - inicio:.2f}s: "
+            f"{gravados} pares gravados, {removidos} removidos."
+        ))
@@ -0,0 +1,42 @@
+# core/management/commands/verificar_roster.py
+from django.core.management.base import BaseCommand, CommandError
+
+from core import roster
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere se a tabela PsicologoPaciente bate com as consultas "
+        "(pares, nome do paciente e sessões realizadas: primeira, última e total). "
+        "Falha se houver divergência."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--psicologo', type=int,
+                            help="Confere só este psicólogo (id).")
+        parser.add_argument('--corrigir', action='store_true',
+                            help="Recalcula os pares divergentes em vez de falhar.")
+
+    def handle(self, *args, **options):
+        faltando, sobrando, diferentes = roster.divergencias(options['psicologo'])
+        problemas = faltando + sobrando + diferentes
+
+        for titulo, pares in (('Faltando', faltando), ('Sobrando', sobrando), ('Diferentes', diferentes)):
+            for psicologo_id, paciente_id in pares[:20]:
+                self.stdout.write(f"{titulo}: psicólogo {psicologo_id}, paciente {paciente_id}")
+            if len(pares) > 20:
+                self.stdout.write(f"{titulo}: ... e mais {len(pares) - 20}")
+
+        if not problemas:
+            self.stdout.write(self.style.SUCCESS("Roster consistente com as consultas."))
+            return
+
+        if options['corrigir']:
+            roster.recalcular(problemas)
+            self.stdout.write(self.style.SUCCESS(f"{len(problemas)} pares recalculados."))
+            return
+
+        raise CommandError(
+            f"Roster divergente: {len(faltando)} faltando, {len(sobrando)} sobrando, "
+            f"{len(diferentes)} diferentes. Rode com --corrigir ou use reconstruir_roster."
+        )
@@ -0,0 +1,71 @@
+# core/middleware.py
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core.exceptions import ObjectDoesNotExist
+
+BACKEND_PADRAO = 'django.contrib.auth.backends.ModelBackend'
+BACKEND_PERFIL = 'core.backends.PerfilModelBackend'
+
+
+def resolver_perfil(user):
+    """
+    Retorna (papel, perfil) do usuário: ('psicologo', Psicologo),
+    ('paciente', Paciente) ou (None, None) para anônimo/perfil incompleto.
+    Com o User vindo do PerfilModelBackend não faz nenhuma query.
+    """
+    if not user.is_authenticated:
+        return None, None
+    try:
+        usuario = user.usuario
+    except ObjectDoesNotExist:
+        return None, None
+    return perfil_do_usuario(usuario)
+
+
+def perfil_do_usuario(usuario):
+    """(papel, perfil) de um Usuario; (None, None) se o perfil estiver incompleto."""
+    for papel in ('psicologo', 'paciente'):
+        try:
+            return papel, getattr(usuario, papel)
+        except ObjectDoesNotExist:
+            continue
+    return None, None
+
+
+class SessaoPerfilBackendMiddleware:
+    """
+    Sessões abertas antes do PerfilModelBackend guardam o ModelBackend padrão;
+    troca para o novo backend (mesmo usuário, mesma senha) para que elas
+    também carreguem o perfil com select_related. Deve vir antes do
+    AuthenticationMiddleware.
+
+    Provisório: a troca grava a sessão uma única vez, e as sessões novas já
+    nascem com o PerfilModelBackend. Como as sessões expiram em
+    SESSION_COOKIE_AGE (padrão de 2 semanas) e o backend entrou em
+    2026-10-17, remover este middleware (e a linha em settings.MIDDLEWARE)
+    a partir de 2026-11-07. Não dá para resolver no PerfilModelBackend: o
+    get_user() do Django só chama backends listados em AUTHENTICATION_BACKENDS,
+    e listar o ModelBackend faria cada falha de login verificar a senha duas vezes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.session.get(BACKEND_SESSION_KEY) == BACKEND_PADRAO:
+            request.session[BACKEND_SESSION_KEY] = BACKEND_PERFIL
+        return self.get_response(request)
+
+
+class PerfilMiddleware:
+    """
+    Expõe o papel e o perfil do usuário logado na requisição:
+    request.role ('psicologo', 'paciente' ou None) e request.profile
+    (o Psicologo/Paciente, ou None). Deve vir depois do AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role, request.profile = resolver_perfil(request.user)
+        return self.get_response(request)
@@ -0,0 +1,196 @@
+# core/midia.py
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import fotos
+from .models import PsicologoPaciente, Usuario
+
+FOTO_PADRAO = Usuario._meta.get_field('foto_perfil').default
+
+# Decisões de acesso (usuário, arquivo) ficam no cache por este tempo
+TEMPO_CACHE_ACESSO = 300
+
+# Nomes com hash do conteúdo (core/storage.py) e suas variantes nunca mudam
+NOME_IMUTAVEL = re.compile(r'(?:^|/)[0-9a-f]{64}(?:-\w+)*\.\w+$')
+CACHE_IMUTAVEL = 'private, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'private, no-cache'
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+# --- Controle de acesso ---
+
+def _servivel(nome):
+    """
+    Só as variantes (WebP geradas sem metadados) e a foto padrão são servidas.
+    O original enviado guarda o EXIF (GPS, câmera...) e fica só para o worker.
+    """
+    if posixpath.normpath(nome) != nome:
+        # '..' e afins: fotos_perfil/variantes/../original.jpg
+        return False
+    return nome == FOTO_PADRAO or nome.startswith(f"{fotos.DIRETORIO_VARIANTES}/")
+
+
+def _calcular_acesso(user, nome):
+    if user.is_staff:
+        return True
+    donos = list(Usuario.objects.filter(fotos.filtro_donos_da_variante(nome)).values_list('pk', flat=True))
+    if not donos:
+        return False
+    try:
+        usuario = user.usuario
+    except Usuario.DoesNotExist:
+        return False
+    if usuario.pk in donos:
+        return True
+    # Psicólogo vê a foto dos seus pacientes e paciente vê a dos seus psicólogos
+    return PsicologoPaciente.objects.filter(
+        Q(psicologo__usuario=usuario, paciente__usuario__in=donos)
+        | Q(paciente__usuario=usuario, psicologo__usuario__in=donos)
+    ).exists()
+
+
+def pode_ver(user, nome):
+    """
+    O usuário logado pode ver o arquivo de mídia 'nome'? As variantes da
+    própria foto, a foto padrão e as de quem tem consulta com ele (roster).
+    Originais nunca (ver _servivel).
+    A decisão fica no cache: repetir a mesma imagem não vai ao banco.
+    """
+    if not user.is_authenticated or not _servivel(nome):
+        return False
+    if nome == FOTO_PADRAO:
+        return True
+    chave = f"midia-acesso:{user.pk}:{hashlib.sha1(nome.encode()).hexdigest()}"
+    permitido = cache.get(chave)
+    if permitido is None:
+        permitido = _calcular_acesso(user, nome)
+        cache.set(chave, permitido, TEMPO_CACHE_ACESSO)
+    return permitido
+
+
+# --- Resposta ---
+
+def caminho_seguro(nome):
+    """Caminho absoluto de 'nome' em MEDIA_ROOT, ou Http404 se sair das fotos."""
+    if not _servivel(nome) or nome.endswith('.tmp'):
+        raise Http404
+    try:
+        caminho = safe_join(settings.MEDIA_ROOT, nome)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(caminho):
+        raise Http404
+    return caminho
+
+
+def _intervalo(cabecalho, tamanho):
+    """
+    Lê 'Range: bytes=a-b' (um único intervalo). Retorna (inicio, fim) inclusivo,
+    None para ignorar o cabeçalho (responde o arquivo todo) ou False se não
+    puder ser atendido (416).
+    """
+    encontrado = re.fullmatch(r'bytes=(\d*)-(\d*)', cabecalho.strip())
+    if not encontrado or encontrado.groups() == ('', ''):
+        return None
+    inicio, fim = encontrado.groups()
+    if inicio == '':
+        # Sufixo: os últimos N bytes
+        quantidade = int(fim)
+        if quantidade == 0:
+            return False
+        return max(tamanho - quantidade, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+
+def _ler_trecho(caminho, inicio, fim):
+    with open(caminho, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+
+
+def servir_arquivo(request, nome):
+    """
+    Responde o arquivo de mídia 'nome' (já autorizado):
+      - 304/412 para GET condicional (ETag / Last-Modified);
+      - com settings.MIDIA_SENDFILE = 'nginx' ou 'apache', só os cabeçalhos:
+        o corpo (e o Range) fica com o servidor da frente;
+      - senão Range de um intervalo (206/416) ou FileResponse, que usa o
+        sendfile do servidor WSGI (cópia zero).
+    """
+    caminho = caminho_seguro(nome)
+    estado = os.stat(caminho)
+    imutavel = bool(NOME_IMUTAVEL.search(nome))
+    # Nome com hash: o próprio nome identifica o conteúdo (o mtime pode mudar
+    # quando o storage reaproveita o arquivo, o conteúdo não)
+    if imutavel:
+        etag = quote_etag(os.path.splitext(os.path.basename(nome))[0])
+    else:
+        etag = quote_etag(f"{estado.st_mtime_ns:x}-{estado.st_size:x}")
+    ultima_modificacao = datetime.fromtimestamp(int(estado.st_mtime), tz=dt_timezone.utc)
+
+    resposta = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao.timestamp())
+    if resposta is None:
+        resposta = _corpo(request, nome, caminho, estado.st_size, etag)
+
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(ultima_modificacao.timestamp())
+    resposta['Cache-Control'] = CACHE_IMUTAVEL if imutavel else CACHE_REVALIDAR
+    return resposta
+
+
+def _corpo(request, nome, caminho, tamanho, etag):
+    tipo = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+    modo = getattr(settings, 'MIDIA_SENDFILE', None)
+
+    if modo == 'nginx':
+        resposta = HttpResponse(content_type=tipo)
+        resposta['X-Accel-Redirect'] = settings.MIDIA_ACCEL_PREFIXO.rstrip('/') + '/' + nome
+        return resposta
+    if modo == 'apache':
+        resposta = HttpResponse(content_type=tipo)
+        resposta['X-Sendfile'] = caminho
+        return resposta
+
+    cabecalho_range = request.headers.get('Range')
+    se_intervalo = request.headers.get('If-Range')
+    if cabecalho_range and request.method == 'GET' and (se_intervalo is None or se_intervalo == etag):
+        intervalo = _intervalo(cabecalho_range, tamanho)
+        if intervalo is False:
+            resposta = HttpResponse(status=416)
+            resposta['Content-Range'] = f"bytes */{tamanho}"
+            return resposta
+        if intervalo is not None:
+            inicio, fim = intervalo
+            resposta = StreamingHttpResponse(_ler_trecho(caminho, inicio, fim), status=206, content_type=tipo)
+            resposta['Content-Range'] = f"bytes {inicio}-{fim}/{tamanho}"
+            resposta['Content-Length'] = str(fim - inicio + 1)
+            resposta['Accept-Ranges'] = 'bytes'
+            return resposta
+
+    resposta = FileResponse(open(caminho, 'rb'), content_type=tipo)
+    resposta['Accept-Ranges'] = 'bytes'
+    return resposta
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_consulta_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['psicologo', 'data', 'hora'], name='consulta_psi_data_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['psicologo', 'status', 'data', 'hora'], name='consulta_psi_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['psicologo', 'paciente'], name='consulta_psi_pac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['paciente', 'data', 'hora'], name='consulta_pac_data_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['paciente', 'status', 'data', 'hora'], name='consulta_pac_status_data_idx'),
+        ),
+    ]
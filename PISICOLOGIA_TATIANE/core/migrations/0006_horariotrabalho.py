@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_consulta_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorarioTrabalho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Dia da Semana')),
+                ('hora_inicio', models.TimeField(verbose_name='Início')),
+                ('hora_fim', models.TimeField(verbose_name='Fim')),
+                ('psicologo_clinica', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios', to='core.psicologoclinica')),
+            ],
+            options={
+                'ordering': ['dia_semana', 'hora_inicio'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('hora_fim__gt', models.F('hora_inicio'))), name='horario_fim_depois_inicio')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+STATUS_ATIVOS = ['pendente', 'confirmada', 'aguardando_remarcacao', 'realizada']
+
+# Quantos horários em conflito listar na mensagem de erro
+LIMITE_LISTAGEM = 20
+
+
+def verificar_duplicadas(apps, schema_editor):
+    """
+    A constraint não pode ser criada com dois agendamentos ativos no mesmo
+    horário do mesmo psicólogo. Qual deles cancelar é uma decisão de quem
+    administra a agenda: a migração só lista os conflitos e para.
+    """
+    Consulta = apps.get_model('core', 'Consulta')
+    conflitos = list(
+        Consulta.objects.filter(status__in=STATUS_ATIVOS)
+        .values('psicologo_id', 'data', 'hora')
+        .annotate(total=Count('id_consulta'))
+        .filter(total__gt=1)
+        .order_by('psicologo_id', 'data', 'hora')[:LIMITE_LISTAGEM]
+    )
+    if not conflitos:
+        return
+
+    linhas = []
+    for conflito in conflitos:
+        consultas = Consulta.objects.filter(
+            status__in=STATUS_ATIVOS,
+            psicologo_id=conflito['psicologo_id'],
+            data=conflito['data'],
+            hora=conflito['hora'],
+        ).order_by('id_consulta').values_list('id_consulta', 'status')
+        linhas.append(
+            f"  psicólogo {conflito['psicologo_id']}, {conflito['data']} {conflito['hora']}: "
+            + ', '.join(f"consulta {id_consulta} ({status})" for id_consulta, status in consultas)
+        )
+    raise RuntimeError(
+        "Existem consultas ativas no mesmo horário do mesmo psicólogo "
+        f"(até {LIMITE_LISTAGEM} horários listados):\n" + '\n'.join(linhas)
+        + "\nCancele ou remarque as duplicadas antes de aplicar esta migração."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_horariotrabalho'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='consulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pendente', 'confirmada', 'aguardando_remarcacao', 'realizada'])), fields=('psicologo', 'data', 'hora'), name='consulta_horario_unico', violation_error_message='Este horário já está reservado para este psicólogo.'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_consulta_horario_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieConsulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequencia', models.CharField(choices=[('semanal', 'Semanal'), ('quinzenal', 'Quinzenal')], max_length=10, verbose_name='Frequência')),
+                ('data_inicio', models.DateField(verbose_name='Início')),
+                ('hora', models.TimeField(verbose_name='Hora')),
+                ('total_sessoes', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Número de Sessões')),
+                ('data_fim', models.DateField(blank=True, null=True, verbose_name='Repetir até')),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='core.paciente')),
+                ('psicologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='core.psicologo')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='consulta',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='consultas', to='core.serieconsulta'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_serieconsulta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='atualizada_em',
+            field=models.DateTimeField(auto_now=True, verbose_name='Atualizada em'),
+        ),
+        migrations.AddField(
+            model_name='psicologo',
+            name='token_agenda',
+            field=models.CharField(blank=True, editable=False, max_length=43, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_feed_agenda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='fechamento_pendente',
+            field=models.BooleanField(default=False, verbose_name='Aguardando Fechamento'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_consulta_fechamento_pendente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lembrete',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('24h', '24 horas antes'), ('2h', '2 horas antes')], max_length=5, verbose_name='Tipo')),
+                ('enviar_em', models.DateTimeField(verbose_name='Enviar em')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('enviado', 'Enviado'), ('descartado', 'Descartado'), ('falhou', 'Falhou')], default='pendente', max_length=15, verbose_name='Status')),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('reservado_por', models.CharField(blank=True, max_length=32, null=True)),
+                ('reservado_em', models.DateTimeField(blank=True, null=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['data', 'hora'], name='consulta_data_hora_idx'),
+        ),
+        migrations.AddField(
+            model_name='lembrete',
+            name='consulta',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lembretes', to='core.consulta'),
+        ),
+        migrations.AddIndex(
+            model_name='lembrete',
+            index=models.Index(fields=['status', 'enviar_em'], name='lembrete_status_enviar_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lembrete',
+            constraint=models.UniqueConstraint(fields=('consulta', 'tipo'), name='lembrete_unico_por_tipo'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def preencher_roster(apps, schema_editor):
+    # Mesmo cálculo de core.roster.reconstruir, com os modelos históricos
+    Consulta = apps.get_model('core', 'Consulta')
+    PsicologoPaciente = apps.get_model('core', 'PsicologoPaciente')
+    linhas = (
+        Consulta.objects.order_by()
+        .values('psicologo_id', 'paciente_id')
+        .annotate(primeira=Min('data'), ultima=Max('data'), total=Count('id_consulta'))
+    )
+    PsicologoPaciente.objects.bulk_create([
+        PsicologoPaciente(
+            psicologo_id=linha['psicologo_id'], paciente_id=linha['paciente_id'],
+            primeira_sessao=linha['primeira'], ultima_sessao=linha['ultima'],
+            total_sessoes=linha['total'],
+        )
+        for linha in linhas.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_lembrete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PsicologoPaciente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('primeira_sessao', models.DateField(verbose_name='Primeira Sessão')),
+                ('ultima_sessao', models.DateField(verbose_name='Última Sessão')),
+                ('total_sessoes', models.PositiveIntegerField(default=0, verbose_name='Total de Sessões')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roster', to='core.paciente')),
+                ('psicologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roster', to='core.psicologo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['psicologo', '-ultima_sessao', '-id'], name='roster_psi_ultima_idx')],
+                'constraints': [models.UniqueConstraint(fields=('psicologo', 'paciente'), name='roster_par_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_roster, migrations.RunPython.noop),
+    ]
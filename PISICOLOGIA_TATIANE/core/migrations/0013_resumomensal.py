@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.db.models.functions import TruncMonth
+
+
+def preencher_resumos(apps, schema_editor):
+    # Mesmo cálculo de core.estatisticas.reconstruir, com os modelos históricos
+    Consulta = apps.get_model('core', 'Consulta')
+    ResumoMensal = apps.get_model('core', 'ResumoMensal')
+    linhas = (
+        Consulta.objects.order_by()
+        .annotate(
+            mes=TruncMonth('data'),
+            situacao=Case(
+                When(status='confirmada', fechamento_pendente=True, then=Value('faltou')),
+                default=F('status'),
+                output_field=CharField(),
+            ),
+        )
+        .values('psicologo_id', 'mes', 'situacao')
+        .annotate(total=Count('id_consulta'))
+    )
+    ResumoMensal.objects.bulk_create([
+        ResumoMensal(
+            psicologo_id=linha['psicologo_id'], mes=linha['mes'],
+            status=linha['situacao'], total=linha['total'],
+        )
+        for linha in linhas.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_psicologopaciente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('confirmada', 'Confirmada'), ('aguardando_remarcacao', 'Aguardando Remarcação'), ('cancelada', 'Cancelada'), ('realizada', 'Realizada'), ('faltou', 'Não Compareceu')], max_length=25, verbose_name='Status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total')),
+                ('psicologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_mensais', to='core.psicologo')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('psicologo', 'mes', 'status'), name='resumo_mensal_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
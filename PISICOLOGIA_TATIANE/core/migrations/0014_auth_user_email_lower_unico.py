@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:05
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# Índice único em LOWER(email) na tabela do User do Django (auth_user).
+# É parcial: usuários sem email (ex: criados pelo createsuperuser) não colidem.
+NOME_INDICE = 'auth_user_email_lower_uniq'
+
+
+def criar_indice(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    duplicados = list(
+        User.objects.exclude(email='')
+        .values(email_normalizado=Lower('email'))
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('email_normalizado', flat=True)[:10]
+    )
+    if duplicados:
+        raise RuntimeError(
+            "Existem usuários com o mesmo email (ignorando maiúsculas): "
+            f"{', '.join(duplicados)}. Resolva antes de aplicar esta migração."
+        )
+
+    tabela = schema_editor.quote_name(User._meta.db_table)
+    # No PostgreSQL o índice é criado sem travar a tabela (por isso atomic = False)
+    concorrente = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX {concorrente}IF NOT EXISTS {NOME_INDICE} "
+        f"ON {tabela} (LOWER(email)) WHERE email <> ''"
+    )
+
+
+def remover_indice(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX IF EXISTS {NOME_INDICE}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0013_resumomensal'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
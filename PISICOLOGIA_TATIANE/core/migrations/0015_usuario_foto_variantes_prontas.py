@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_auth_user_email_lower_unico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='foto_variantes_prontas',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:46
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_usuario_foto_variantes_prontas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuario',
+            name='foto_perfil',
+            field=models.ImageField(blank=True, default='fotos_perfil/default.png', null=True, storage=core.storage.armazenamento_fotos, upload_to='fotos_perfil/', verbose_name='Foto de Perfil'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_usuario_foto_perfil_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='foto_falhas',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:15
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+
+def recalcular_roster(apps, schema_editor):
+    # Mesmo cálculo de core.roster.reconstruir, com os modelos históricos:
+    # só consultas realizadas até hoje contam como sessão, e o nome do
+    # paciente é copiado para o roster
+    Consulta = apps.get_model('core', 'Consulta')
+    PsicologoPaciente = apps.get_model('core', 'PsicologoPaciente')
+    sessao = Q(status='realizada', data__lte=timezone.localdate())
+    linhas = (
+        Consulta.objects.order_by()
+        .values('psicologo_id', 'paciente_id', 'paciente__usuario__nome')
+        .annotate(
+            primeira=Min('data', filter=sessao),
+            ultima=Max('data', filter=sessao),
+            total=Count('id_consulta', filter=sessao),
+        )
+    )
+    PsicologoPaciente.objects.all().delete()
+    PsicologoPaciente.objects.bulk_create([
+        PsicologoPaciente(
+            psicologo_id=linha['psicologo_id'], paciente_id=linha['paciente_id'],
+            paciente_nome=linha['paciente__usuario__nome'],
+            primeira_sessao=linha['primeira'], ultima_sessao=linha['ultima'],
+            total_sessoes=linha['total'],
+        )
+        for linha in linhas.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_usuario_foto_falhas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='psicologopaciente',
+            name='paciente_nome',
+            field=models.CharField(default='', max_length=100, verbose_name='Nome do Paciente'),
+        ),
+        migrations.AlterField(
+            model_name='psicologopaciente',
+            name='primeira_sessao',
+            field=models.DateField(blank=True, null=True, verbose_name='Primeira Sessão'),
+        ),
+        migrations.AlterField(
+            model_name='psicologopaciente',
+            name='ultima_sessao',
+            field=models.DateField(blank=True, null=True, verbose_name='Última Sessão'),
+        ),
+        migrations.AddIndex(
+            model_name='psicologopaciente',
+            index=models.Index(fields=['psicologo', 'paciente_nome', 'id'], name='roster_psi_nome_idx'),
+        ),
+        migrations.RunPython(recalcular_roster, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_roster_sessoes_e_nome'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='psicologo',
+            name='versao_agenda',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
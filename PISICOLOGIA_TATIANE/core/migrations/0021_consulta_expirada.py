@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_psicologo_versao_agenda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='expirada',
+            field=models.BooleanField(default=False, verbose_name='Expirada'),
+        ),
+        migrations.AlterField(
+            model_name='resumomensal',
+            name='status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('confirmada', 'Confirmada'), ('aguardando_remarcacao', 'Aguardando Remarcação'), ('cancelada', 'Cancelada'), ('realizada', 'Realizada'), ('faltou', 'Não Compareceu'), ('expirada', 'Expirada sem Confirmação')], max_length=25, verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:40
+
+from django.db import migrations
+
+
+def devolver_fotos_a_fila(apps, schema_editor):
+    # As variantes passaram a ter a assinatura do processamento no nome
+    # (core/fotos.py): as já geradas ficam com o nome antigo, então as fotos
+    # voltam para a fila do processar_fotos. Até lá, url_foto() mostra a foto
+    # padrão; as variantes antigas são apagadas pelo limpar_midia_orfa.
+    Usuario = apps.get_model('core', 'Usuario')
+    Usuario.objects.filter(foto_variantes_prontas=True).update(foto_variantes_prontas=False, foto_falhas=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_consulta_expirada'),
+    ]
+
+    operations = [
+        migrations.RunPython(devolver_fotos_a_fila, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# core/minificar.py
+"""
+Minificação dos estáticos do projeto, usada pelo storage de estáticos
+(core/storage.py) no collectstatic.
+
+Com os pacotes rcssmin/rjsmin instalados, são eles que minificam. Sem
+eles, o CSS passa por uma minificação conservadora daqui (só comentários e
+espaços; strings intactas) e o JS é copiado como está: minificar JS com
+segurança exige um tokenizador de verdade (regex literal depois de
+'return', 'typeof'...), e o gzip/brotli já recupera a maior parte do ganho.
+"""
+import re
+
+try:
+    import rcssmin
+except ImportError:  # opcional
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:  # opcional: sem ele o JS não é minificado
+    rjsmin = None
+
+# --- CSS ---
+
+_CSS_STRING_OU_COMENTARIO = re.compile(
+    r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')'''   # strings
+    r'|(/\*.*?\*/)',                              # comentários
+    re.S,
+)
+
+
+def minificar_css(css):
+    if rcssmin is not None:
+        return rcssmin.cssmin(css)
+    partes = []
+    posicao = 0
+    for encontrado in _CSS_STRING_OU_COMENTARIO.finditer(css):
+        partes.append(_compactar_css(css[posicao:encontrado.start()]))
+        string, comentario = encontrado.groups()
+        if string:
+            partes.append(string)
+        elif comentario.startswith('/*!'):
+            # Comentários /*! ... */ costumam ser licenças: ficam
+            partes.append(comentario)
+        else:
+            partes.append(' ')
+        posicao = encontrado.end()
+    partes.append(_compactar_css(css[posicao:]))
+    return ''.join(partes).strip() + '\n'
+
+
+def _compactar_css(trecho):
+    """Espaços e ';' dispensáveis de um trecho de CSS sem strings nem comentários."""
+    trecho = re.sub(r'\s+', ' ', trecho)
+    # Em volta de { } ; , > o espaço nunca tem significado. Fora da lista:
+    # ':' antes (em seletor, "a :hover" != "a:hover"), '+' e '-' (calc())
+    trecho = re.sub(r' ?([{};,>]) ?', r'\1', trecho)
+    trecho = trecho.replace(': ', ':')
+    return trecho.replace(';}', '}')
+
+
+# --- JS ---
+
+def minificar_js(js):
+    """Minifica com o rjsmin; sem ele, None (o arquivo é copiado como está)."""
+    if rjsmin is None:
+        return None
+    return rjsmin.jsmin(js)
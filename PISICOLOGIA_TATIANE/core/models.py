@@ -1,6 +1,13 @@
 import os
-from django.db import models
+import secrets
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import ExpressionWrapper, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
 from django.contrib.auth.models import User # Importa o DjangoUser
+from .signals import consultas_alteradas_em_lote
+from .storage import armazenamento_fotos
 
 # --- 1. Modelos de Perfil e Usuário ---
 
@@ -28,10 +35,17 @@ class Usuario(models.Model):
     foto_perfil = models.ImageField(
         "Foto de Perfil", 
         upload_to='fotos_perfil/', # Salvará as fotos em MEDIA_ROOT/fotos_perfil/
+        storage=armazenamento_fotos, # Nome pelo hash do conteúdo, sem duplicatas (core/storage.py)
+        db_index=True, # Busca dos donos de um arquivo (core/midia.py, limpar_midia_orfa)
         null=True, 
         blank=True, # Permite que o campo seja opcional
         default='fotos_perfil/default.png' # Opcional: Uma imagem padrão
     )
+    # Variantes redimensionadas da foto (core/fotos.py) já geradas pelo worker
+    foto_variantes_prontas = models.BooleanField(default=False, editable=False)
+    # Falhas do worker ao processar a foto atual (arquivo corrompido, etc.);
+    # ao chegar em fotos.MAX_FALHAS a foto sai da fila até um novo envio
+    foto_falhas = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.nome
@@ -68,6 +82,15 @@ class Psicologo(models.Model):
     usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='psicologo')
     crp = models.CharField("CRP", max_length=20, unique=True) # CRP é único
     especialidade = models.CharField("Especialidade", max_length=100, null=True, blank=True)
+
+    # Token secreto do feed .ics da agenda (gerado quando o psicólogo pede o link)
+    token_agenda = models.CharField(max_length=43, unique=True, null=True, blank=True, editable=False)
+
+    # Sobe a cada mudança nas consultas ou nos pacientes do psicólogo, e no
+    # nome dele (psicologo/signals.py). Vai na chave do snapshot do dashboard,
+    # para que cada processo, com o seu cache local, ignore o snapshot antigo,
+    # e no ETag do feed .ics.
+    versao_agenda = models.PositiveIntegerField(default=0, editable=False)
     
     # A relação N-N com Clínica será definida abaixo
     # (veja 'clinicas')
@@ -76,6 +99,13 @@ class Psicologo(models.Model):
         # Retorna o nome do Usuário associado
         return self.usuario.nome
 
+    def obter_token_agenda(self, renovar=False):
+        """Retorna o token do feed da agenda, criando (ou trocando) se preciso."""
+        if renovar or not self.token_agenda:
+            self.token_agenda = secrets.token_urlsafe(32)
+            self.save(update_fields=['token_agenda'])
+        return self.token_agenda
+
 # --- 2. Modelos da Clínica ---
 
 class Clinica(models.Model):
@@ -118,9 +148,196 @@ class PsicologoClinica(models.Model):
     def __str__(self):
         return f"{self.psicologo} @ {self.clinica}"
 
+class HorarioTrabalho(models.Model):
+    """
+    Intervalo semanal de atendimento de um psicólogo em uma clínica
+    (ex: segunda-feira, das 08:00 às 12:00). Substitui o texto livre de
+    'PsicologoClinica.horario_trabalho' para o cálculo de horários livres.
+    """
+    DIAS_SEMANA = [
+        (0, 'Segunda-feira'),
+        (1, 'Terça-feira'),
+        (2, 'Quarta-feira'),
+        (3, 'Quinta-feira'),
+        (4, 'Sexta-feira'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+
+    psicologo_clinica = models.ForeignKey(PsicologoClinica, on_delete=models.CASCADE, related_name='horarios')
+    dia_semana = models.PositiveSmallIntegerField("Dia da Semana", choices=DIAS_SEMANA) # Igual a date.weekday()
+    hora_inicio = models.TimeField("Início")
+    hora_fim = models.TimeField("Fim")
+
+    class Meta:
+        ordering = ['dia_semana', 'hora_inicio']
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(hora_fim__gt=models.F('hora_inicio')),
+                name='horario_fim_depois_inicio',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.psicologo_clinica} - {self.get_dia_semana_display()} {self.hora_inicio:%H:%M}-{self.hora_fim:%H:%M}"
+
 
 # --- 3. Modelos de Consulta ---
 
+# Status que ocupam o horário na agenda do psicólogo (tudo menos 'cancelada')
+STATUS_CONSULTA_ATIVOS = ['pendente', 'confirmada', 'aguardando_remarcacao', 'realizada']
+
+class ConsultaQuerySet(models.QuerySet):
+
+    @staticmethod
+    def regra_remarcacao(agora=None):
+        """
+        Q das consultas que o paciente ainda pode pedir para remarcar: status
+        que a tabela de transições deixa ir para 'aguardando_remarcacao' e
+        início a mais de Consulta.ANTECEDENCIA_REMARCACAO de agora. Data e
+        hora são gravadas no fuso do projeto, então o limite é calculado
+        nesse fuso e comparado direto com as colunas (sem função no SQL).
+        Novas regras de remarcação devem entrar aqui.
+        """
+        limite = timezone.localtime((agora or timezone.now()) + Consulta.ANTECEDENCIA_REMARCACAO)
+        return Q(status__in=Consulta.TRANSICOES['aguardando_remarcacao']) & (
+            Q(data__gt=limite.date()) | Q(data=limite.date(), hora__gt=limite.time())
+        )
+
+    def com_remarcacao(self, agora=None):
+        """Anota 'can_reschedule' (True/False) em cada consulta, calculado no banco."""
+        return self.annotate(can_reschedule=ExpressionWrapper(
+            self.regra_remarcacao(agora), output_field=models.BooleanField()
+        ))
+
+    def remarcaveis(self, agora=None):
+        """Só as consultas que ainda podem ser remarcadas pelo paciente."""
+        return self.filter(self.regra_remarcacao(agora))
+
+    def transition(self, novo_status, origens=None, **campos):
+        """
+        Muda o status das consultas do queryset para 'novo_status' com um
+        único UPDATE ... WHERE status IN (origens válidas). Só as linhas que
+        ainda estão em um status de origem permitido por Consulta.TRANSICOES
+        mudam, então duas ações simultâneas não sobrescrevem uma à outra: quem
+        chega depois simplesmente não vence. Quem decide é o WHERE do UPDATE;
+        a leitura das consultas afetadas para o sinal de update() roda na mesma
+        transação e não interfere nisso.
+
+        'origens' restringe ainda mais as origens da tabela (nunca amplia).
+        'campos' são atualizados junto (ex: paciente_confirmou_presenca=True).
+        Retorna o número de consultas alteradas.
+        """
+        permitidas = Consulta.TRANSICOES.get(novo_status)
+        if permitidas is None:
+            raise ValueError(f"Status inválido: {novo_status}")
+        if origens is not None:
+            permitidas = [status for status in permitidas if status in origens]
+
+        return self.filter(status__in=permitidas).update(
+            status=novo_status, atualizada_em=timezone.now(), **campos
+        )
+
+    def update(self, **kwargs):
+        # update() não dispara post_save: avisa quem mantém caches e resumos
+        # por psicólogo (ver core/signals.py)
+        if not consultas_alteradas_em_lote.has_listeners(Consulta):
+            return super().update(**kwargs)
+        # A leitura das consultas afetadas e o UPDATE na mesma transação: o
+        # aviso corresponde ao que o UPDATE encontrou, e sai só no commit
+        with transaction.atomic():
+            afetadas = self._afetadas(**kwargs)
+            alteradas = super().update(**kwargs)
+            if alteradas:
+                consultas_alteradas_em_lote.send(sender=Consulta, **_argumentos_sinal(afetadas()))
+        return alteradas
+
+    def _afetadas(self, **kwargs):
+        """
+        Lê os (psicólogo, paciente, mês) das consultas do queryset antes do
+        UPDATE e retorna uma função que, depois dele, devolve os antigos mais
+        os novos (quando o UPDATE muda 'data', 'psicologo' ou 'paciente').
+        """
+        novos = {}
+        for campo in ('psicologo', 'paciente'):
+            valor = kwargs.get(f'{campo}_id', kwargs.get(campo))
+            if isinstance(valor, models.Model):
+                valor = valor.pk
+            if valor is not None:
+                novos[campo] = valor
+        nova_data = kwargs.get('data')
+        base = self.order_by()
+
+        if any(hasattr(valor, 'resolve_expression') for valor in [nova_data, *novos.values()]):
+            # Valores calculados no banco (F(), etc): relê as mesmas linhas depois
+            linhas = list(base.values_list('pk', 'psicologo_id', 'paciente_id', 'data'))
+            pks = [linha[0] for linha in linhas]
+            antigas = {
+                (psicologo_id, paciente_id, data.replace(day=1))
+                for _, psicologo_id, paciente_id, data in linhas
+            }
+            return lambda: antigas | {
+                (psicologo_id, paciente_id, data.replace(day=1))
+                for psicologo_id, paciente_id, data in Consulta.objects.filter(pk__in=pks)
+                .values_list('psicologo_id', 'paciente_id', 'data')
+            }
+
+        antigas = set(
+            base.annotate(mes=TruncMonth('data'))
+            .values_list('psicologo_id', 'paciente_id', 'mes').distinct()
+        )
+        novas = {
+            (
+                novos.get('psicologo', psicologo_id),
+                novos.get('paciente', paciente_id),
+                mes if nova_data is None else nova_data.replace(day=1),
+            )
+            for psicologo_id, paciente_id, mes in antigas
+        }
+        return lambda: antigas | novas
+
+    def bulk_create(self, objs, *args, **kwargs):
+        criadas = super().bulk_create(objs, *args, **kwargs)
+        if criadas:
+            consultas_alteradas_em_lote.send(sender=Consulta, **_argumentos_sinal(
+                (consulta.psicologo_id, consulta.paciente_id, consulta.data.replace(day=1))
+                for consulta in criadas
+            ))
+        return criadas
+
+
+def _argumentos_sinal(afetadas):
+    """Argumentos de consultas_alteradas_em_lote a partir de (psicólogo, paciente, mês)."""
+    afetadas = set(afetadas)
+    return {
+        'psicologo_ids': {psicologo_id for psicologo_id, _, _ in afetadas},
+        'meses': {(psicologo_id, mes) for psicologo_id, _, mes in afetadas},
+        'pares': {(psicologo_id, paciente_id) for psicologo_id, paciente_id, _ in afetadas},
+    }
+
+class SerieConsulta(models.Model):
+    """
+    Série de consultas recorrentes (ex: toda semana, às 14:00).
+    As consultas da série são criadas de uma vez e apontam para ela.
+    """
+    FREQUENCIA_CHOICES = [
+        ('semanal', 'Semanal'),
+        ('quinzenal', 'Quinzenal'),
+    ]
+    INTERVALO_DIAS = {'semanal': 7, 'quinzenal': 14}
+
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='series')
+    psicologo = models.ForeignKey(Psicologo, on_delete=models.CASCADE, related_name='series')
+    frequencia = models.CharField("Frequência", max_length=10, choices=FREQUENCIA_CHOICES)
+    data_inicio = models.DateField("Início")
+    hora = models.TimeField("Hora")
+    total_sessoes = models.PositiveSmallIntegerField("Número de Sessões", null=True, blank=True)
+    data_fim = models.DateField("Repetir até", null=True, blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Série {self.get_frequencia_display().lower()} de {self.paciente} com {self.psicologo}"
+
 class Consulta(models.Model):
     """
     Modelo central de Consultas, linkando Paciente e Psicologo.
@@ -133,6 +350,24 @@ class Consulta(models.Model):
         ('realizada', 'Realizada'),
     ]
 
+    STATUS_ATIVOS = STATUS_CONSULTA_ATIVOS
+
+    # Tabela de transições: status de destino -> status de origem permitidos.
+    # 'cancelada' e 'realizada' são finais. 'confirmada' -> 'confirmada'
+    # existe para o paciente confirmar presença sem mudar o status.
+    TRANSICOES = {
+        'pendente': ['confirmada', 'aguardando_remarcacao'],
+        'confirmada': ['pendente', 'confirmada', 'aguardando_remarcacao'],
+        'aguardando_remarcacao': ['pendente', 'confirmada'],
+        'cancelada': ['pendente', 'confirmada', 'aguardando_remarcacao'],
+        'realizada': ['pendente', 'confirmada', 'aguardando_remarcacao'],
+    }
+
+    # Antecedência mínima para o paciente pedir remarcação
+    ANTECEDENCIA_REMARCACAO = timedelta(hours=6)
+
+    objects = ConsultaQuerySet.as_manager()
+
     id_consulta = models.AutoField(primary_key=True)
     
     # Links (Chaves Estrangeiras)
@@ -153,9 +388,185 @@ class Consulta(models.Model):
         help_text="Indica se o paciente clicou em 'Confirmar Presença'"
     )
 
+    # Marcado pela rotina de manutenção (comando 'fechar_consultas_passadas')
+    # quando uma consulta confirmada já passou e ainda não foi fechada
+    fechamento_pendente = models.BooleanField("Aguardando Fechamento", default=False)
+
+    # Pendente que a mesma rotina cancelou porque a data passou sem
+    # confirmação: nas estatísticas não conta como cancelamento
+    expirada = models.BooleanField("Expirada", default=False)
+
+    # Atualizado a cada save(). Atualizações em massa (queryset.update)
+    # devem preencher este campo explicitamente (ETag do feed .ics).
+    atualizada_em = models.DateTimeField("Atualizada em", auto_now=True)
+
+    # Preenchido quando a consulta faz parte de uma série recorrente
+    serie = models.ForeignKey(SerieConsulta, on_delete=models.SET_NULL, null=True, blank=True, related_name='consultas')
+
+    class Meta:
+        # Índices compostos que seguem os filtros e ordenações das views
+        # (agenda, dashboards e lista de diagnósticos). Com eles o banco
+        # lê as consultas já na ordem de ('-data', '-hora') sem ordenar a tabela.
+        indexes = [
+            # Agenda completa e "consultas de hoje" do psicólogo
+            models.Index(fields=['psicologo', 'data', 'hora'], name='consulta_psi_data_hora_idx'),
+            # Lista de consultas realizadas (diagnósticos)
+            models.Index(fields=['psicologo', 'status', 'data', 'hora'], name='consulta_psi_status_data_idx'),
+            # Pacientes distintos de um psicólogo (dashboard e meus pacientes)
+            models.Index(fields=['psicologo', 'paciente'], name='consulta_psi_pac_idx'),
+            # Meus agendamentos e próximas consultas do paciente
+            models.Index(fields=['paciente', 'data', 'hora'], name='consulta_pac_data_hora_idx'),
+            # Últimas realizadas / canceladas do paciente
+            models.Index(fields=['paciente', 'status', 'data', 'hora'], name='consulta_pac_status_data_idx'),
+            # Próximas consultas de todos os psicólogos (agendador de lembretes)
+            models.Index(fields=['data', 'hora'], name='consulta_data_hora_idx'),
+        ]
+        constraints = [
+            # Um psicólogo não pode ter duas consultas ativas no mesmo horário.
+            # O banco garante isso mesmo com agendamentos simultâneos;
+            # consultas canceladas liberam o horário.
+            models.UniqueConstraint(
+                fields=['psicologo', 'data', 'hora'],
+                condition=models.Q(status__in=STATUS_CONSULTA_ATIVOS),
+                name='consulta_horario_unico',
+                violation_error_message="Este horário já está reservado para este psicólogo.",
+            ),
+        ]
+
+    # Valores como estão no banco, guardados ao carregar e a cada save: os
+    # receivers de post_save (core/receivers.py) refazem também o par e o
+    # mês antigos quando a consulta muda de data, psicólogo ou paciente, e
+    # reprogramam os lembretes quando muda de data ou horário
+    CAMPOS_RASTREADOS = ('psicologo_id', 'paciente_id', 'data', 'hora')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        consulta = super().from_db(db, field_names, values)
+        consulta.valores_salvos = consulta.valores_rastreados()
+        return consulta
+
+    def valores_rastreados(self):
+        """(psicologo_id, paciente_id, data, hora) atuais; None nos campos adiados (only/defer)."""
+        return tuple(self.__dict__.get(campo) for campo in self.CAMPOS_RASTREADOS)
+
     def __str__(self):
         return f"Consulta de {self.paciente} com {self.psicologo} em {self.data}"
 
+    def pode_transicionar(self, novo_status):
+        """Indica se a tabela de transições permite ir do status atual para 'novo_status'."""
+        return self.status in self.TRANSICOES.get(novo_status, [])
+
+    def transition(self, novo_status, origens=None, **campos):
+        """
+        Versão de ConsultaQuerySet.transition para uma consulta já carregada.
+        Retorna True se esta ação venceu (a linha foi alterada).
+        """
+        venceu = Consulta.objects.filter(pk=self.pk).transition(novo_status, origens, **campos) == 1
+        if venceu:
+            self.status = novo_status
+            for campo, valor in campos.items():
+                setattr(self, campo, valor)
+        return venceu
+
+class Lembrete(models.Model):
+    """
+    Fila de lembretes de consulta (ex: 24h e 2h antes). As linhas são
+    pré-calculadas pelo agendador e consumidas em lotes pelo worker
+    (comando 'enviar_lembretes').
+    """
+    TIPO_CHOICES = [
+        ('24h', '24 horas antes'),
+        ('2h', '2 horas antes'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('enviado', 'Enviado'),
+        ('descartado', 'Descartado'), # Consulta cancelada/realizada antes do envio
+        ('falhou', 'Falhou'),
+    ]
+
+    consulta = models.ForeignKey(Consulta, on_delete=models.CASCADE, related_name='lembretes')
+    tipo = models.CharField("Tipo", max_length=5, choices=TIPO_CHOICES)
+    enviar_em = models.DateTimeField("Enviar em")
+    status = models.CharField("Status", max_length=15, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+
+    # Reserva do worker que pegou o lembrete (para não enviar duas vezes)
+    reservado_por = models.CharField(max_length=32, null=True, blank=True)
+    reservado_em = models.DateTimeField(null=True, blank=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['consulta', 'tipo'], name='lembrete_unico_por_tipo'),
+        ]
+        indexes = [
+            # O worker busca sempre "pendentes vencidos, mais antigos primeiro"
+            models.Index(fields=['status', 'enviar_em'], name='lembrete_status_enviar_idx'),
+        ]
+
+    def __str__(self):
+        return f"Lembrete {self.tipo} - {self.consulta}"
+
+class PsicologoPaciente(models.Model):
+    """
+    "Meus pacientes" já calculado: uma linha por par psicólogo/paciente que
+    tem pelo menos uma consulta. Mantida por core/roster.py a cada consulta
+    criada, alterada ou apagada (ver core/receivers.py).
+    As sessões são só as consultas realizadas até hoje: sem nenhuma ainda
+    (ex: só consultas futuras), primeira/última ficam vazias.
+    """
+    psicologo = models.ForeignKey(Psicologo, on_delete=models.CASCADE, related_name='roster')
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='roster')
+    # Cópia de paciente.usuario.nome, para ordenar pelo índice sem join
+    paciente_nome = models.CharField("Nome do Paciente", max_length=100, default='')
+    primeira_sessao = models.DateField("Primeira Sessão", null=True, blank=True)
+    ultima_sessao = models.DateField("Última Sessão", null=True, blank=True)
+    total_sessoes = models.PositiveIntegerField("Total de Sessões", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['psicologo', 'paciente'], name='roster_par_unico'),
+        ]
+        indexes = [
+            # Lista "meus pacientes" (e dashboard) por nome
+            models.Index(fields=['psicologo', 'paciente_nome', 'id'], name='roster_psi_nome_idx'),
+            # Lista "meus pacientes" pela última visita
+            models.Index(fields=['psicologo', '-ultima_sessao', '-id'], name='roster_psi_ultima_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.psicologo} - {self.paciente}"
+
+class ResumoMensal(models.Model):
+    """
+    Total de consultas de um psicólogo por mês e status, para a página de
+    estatísticas. Mantido por core/estatisticas.py, que refaz o mês afetado
+    a cada mudança de consulta.
+    """
+    # Além dos status da consulta: confirmada que passou sem ser marcada
+    # como realizada (fechamento_pendente) conta como falta, e pendente
+    # cancelada pela rotina de manutenção (expirada) conta à parte
+    STATUS_CHOICES = Consulta.STATUS_CHOICES + [
+        ('faltou', 'Não Compareceu'),
+        ('expirada', 'Expirada sem Confirmação'),
+    ]
+
+    psicologo = models.ForeignKey(Psicologo, on_delete=models.CASCADE, related_name='resumos_mensais')
+    mes = models.DateField("Mês") # Sempre o dia 1
+    status = models.CharField("Status", max_length=25, choices=STATUS_CHOICES)
+    total = models.PositiveIntegerField("Total", default=0)
+
+    class Meta:
+        constraints = [
+            # Também serve de índice para "psicólogo X, meses de A até B"
+            models.UniqueConstraint(fields=['psicologo', 'mes', 'status'], name='resumo_mensal_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.psicologo} - {self.mes:%m/%Y} - {self.status}: {self.total}"
+
 class Diagnostico(models.Model):
     """
     Modelo para diagnósticos formais (CID-10), 
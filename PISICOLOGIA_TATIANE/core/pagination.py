@@ -0,0 +1,179 @@
+# core/pagination.py
+from django.core import signing
+from django.db.models import F, Q
+
+
+class KeysetPage:
+    """
+    Uma página de resultados do KeysetPaginator.
+    Pode ser iterada no template como o 'page_obj' do Paginator do Django.
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginação por cursor ("seek"): em vez de COUNT(*) + OFFSET, cada página
+    filtra a partir da última linha vista. O custo de uma página não depende
+    de quão longe o usuário já navegou.
+
+    'ordering' deve terminar em uma coluna única (ex: a chave primária),
+    para que o cursor identifique exatamente uma linha. Colunas que aceitam
+    NULL são ordenadas com o NULL como o menor valor (no fim das decrescentes),
+    igual em todos os bancos.
+    Ex: KeysetPaginator(qs, ('-data', '-hora', '-id_consulta'), 10)
+    """
+    salt = 'core.pagination.cursor'
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    def get_page(self, cursor=None):
+        """
+        Retorna a página do cursor. Cursor ausente ou inválido = primeira página.
+        Se as linhas depois do cursor sumiram (apagadas desde que o link foi
+        gerado), devolve a última página; se sumiram as de antes, a primeira.
+        """
+        valores, direcao = self._decode(cursor)
+
+        if valores is None:
+            return self._pagina_da_ponta(ultima=False)
+
+        reverso = direcao == 'p'
+        linhas = list(
+            self._ordenado(reverso=reverso)
+            .filter(self._seek(valores, reverso))[:self.per_page + 1]
+        )
+        if not linhas:
+            return self._pagina_da_ponta(ultima=not reverso)
+        tem_mais = len(linhas) > self.per_page
+        linhas = linhas[:self.per_page]
+
+        if reverso:
+            # Voltando: busca na ordem inversa e desvira o resultado
+            linhas.reverse()
+            return KeysetPage(
+                linhas,
+                next_cursor=self._encode(linhas[-1], 'n'),
+                previous_cursor=self._encode(linhas[0], 'p') if tem_mais else None,
+            )
+
+        return KeysetPage(
+            linhas,
+            next_cursor=self._encode(linhas[-1], 'n') if tem_mais else None,
+            previous_cursor=self._encode(linhas[0], 'p'),
+        )
+
+    def _pagina_da_ponta(self, ultima):
+        """A primeira página ou, com 'ultima', a última (lida de trás para frente)."""
+        linhas = list(self._ordenado(reverso=ultima)[:self.per_page + 1])
+        tem_mais = len(linhas) > self.per_page
+        linhas = linhas[:self.per_page]
+        if ultima:
+            linhas.reverse()
+            return KeysetPage(linhas, previous_cursor=self._encode(linhas[0], 'p') if tem_mais else None)
+        return KeysetPage(linhas, next_cursor=self._encode(linhas[-1], 'n') if tem_mais else None)
+
+    # --- Auxiliares ---
+
+    def _campos(self):
+        """Lista de (nome_do_campo, decrescente)."""
+        return [(campo.lstrip('-'), campo.startswith('-')) for campo in self.ordering]
+
+    def _ordenado(self, reverso):
+        return self.queryset.order_by(*[
+            self._ordem(nome, desc != reverso) for nome, desc in self._campos()
+        ])
+
+    def _ordem(self, nome, desc):
+        if not self._anulavel(nome):
+            return f'-{nome}' if desc else nome
+        # NULL é o menor valor: primeiro na crescente, último na decrescente
+        return F(nome).desc(nulls_last=True) if desc else F(nome).asc(nulls_first=True)
+
+    def _anulavel(self, nome):
+        """A coluna 'nome' (ex: 'paciente__usuario__nome') aceita NULL?"""
+        modelo = self.queryset.model
+        for parte in nome.split('__'):
+            campo = modelo._meta.get_field(parte)
+            modelo = campo.related_model
+        return campo.null
+
+    def _comparar(self, nome, lookup, valor):
+        """nome > valor ('gt') ou nome < valor ('lt'), com NULL como o menor valor."""
+        if valor is None:
+            # Nada é menor que NULL; maior que NULL é qualquer valor
+            return Q(**{f'{nome}__isnull': False}) if lookup == 'gt' else None
+        condicao = Q(**{f'{nome}__{lookup}': valor})
+        if lookup.startswith('lt') and self._anulavel(nome):
+            condicao |= Q(**{f'{nome}__isnull': True})
+        return condicao
+
+    def _seek(self, valores, reverso):
+        """
+        Monta a comparação de tupla (a, b, c) > (x, y, z) como
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        respeitando a direção de cada coluna.
+        """
+        condicao = Q()
+        iguais = Q()
+        for (nome, desc), valor in zip(self._campos(), valores):
+            comparacao = self._comparar(nome, 'lt' if desc != reverso else 'gt', valor)
+            if comparacao is not None:
+                condicao |= iguais & comparacao
+            iguais &= Q(**({f'{nome}__isnull': True} if valor is None else {nome: valor}))
+
+        # Limite redundante na primeira coluna: permite ao banco usar o
+        # índice como faixa em vez de filtrar linha a linha.
+        primeiro, desc = self._campos()[0]
+        if valores[0] is None:
+            # Em volta do NULL (o menor valor) a faixa não restringe nada útil
+            return condicao
+        limite = self._comparar(primeiro, 'lte' if desc != reverso else 'gte', valores[0])
+        return limite & condicao
+
+    def _valores(self, obj):
+        valores = []
+        for nome, _ in self._campos():
+            valor = obj
+            for parte in nome.split('__'):
+                valor = getattr(valor, parte)
+            # Datas e horas viram texto ISO, que o ORM aceita de volta no filtro
+            valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+        return valores
+
+    def _salt(self):
+        # Cursor de uma ordenação não vale em outra (ex: ?ordem= trocado na URL)
+        return f"{self.salt}:{','.join(self.ordering)}"
+
+    def _encode(self, obj, direcao):
+        return signing.dumps({'v': self._valores(obj), 'd': direcao}, salt=self._salt(), compress=True)
+
+    def _decode(self, cursor):
+        if not cursor:
+            return None, None
+        try:
+            dados = signing.loads(cursor, salt=self._salt())
+            valores, direcao = dados['v'], dados['d']
+        except (signing.BadSignature, KeyError, TypeError):
+            return None, None
+        if direcao not in ('n', 'p') or len(valores) != len(self.ordering):
+            return None, None
+        return valores, direcao
@@ -0,0 +1,68 @@
+# core/perfil_services.py
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .middleware import perfil_do_usuario
+from .models import Psicologo, Usuario
+
+
+def completar_perfil(user, usuario_form, perfil_form):
+    """
+    Cria o Usuario e o Paciente/Psicologo (conforme o model do perfil_form)
+    de um User em uma única transação: ou os dois são gravados, ou nenhum.
+
+    Idempotente: se o perfil já estiver completo (reenvio do formulário,
+    duas abas, retry do proxy), não grava nada e devolve o perfil existente.
+    Um Usuario que ficou sem Paciente/Psicologo (cadastro interrompido) é
+    reaproveitado em vez de gerar outro.
+
+    cpf, email e crp são garantidos pelas constraints do banco; em caso de
+    conflito o erro é adicionado ao form e o retorno é (None, None).
+    Retorna (papel, perfil).
+    """
+    with transaction.atomic():
+        # Trava o User: envios simultâneos do mesmo usuário esperam aqui
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+
+        usuario = Usuario.objects.select_related('paciente', 'psicologo').filter(user=user).first()
+        if usuario is not None:
+            papel, perfil = perfil_do_usuario(usuario)
+            if perfil is not None:
+                return papel, perfil
+        else:
+            usuario = Usuario(user=user)
+
+        for campo, valor in usuario_form.cleaned_data.items():
+            setattr(usuario, campo, valor)
+        usuario.email = user.email
+
+        perfil = perfil_form.save(commit=False)
+        try:
+            with transaction.atomic():
+                usuario.save()
+                perfil.usuario = usuario
+                perfil.save()
+        except IntegrityError:
+            # Outra requisição do mesmo usuário pode ter completado o perfil
+            existente = Usuario.objects.select_related('paciente', 'psicologo').filter(user=user).first()
+            if existente is not None and perfil_do_usuario(existente)[1] is not None:
+                return perfil_do_usuario(existente)
+            _explicar_conflito(user, usuario, perfil, usuario_form, perfil_form)
+            return None, None
+
+    papel = 'psicologo' if isinstance(perfil, Psicologo) else 'paciente'
+    return papel, perfil
+
+
+def _explicar_conflito(user, usuario, perfil, usuario_form, perfil_form):
+    """Descobre qual campo único colidiu (só roda quando o INSERT falha)."""
+    outros_usuarios = Usuario.objects.exclude(user=user)
+    if outros_usuarios.filter(cpf=usuario.cpf).exists():
+        usuario_form.add_error('cpf', "Já existe um cadastro com este CPF.")
+    elif outros_usuarios.filter(email=usuario.email).exists():
+        usuario_form.add_error(None, "O email da sua conta já está vinculado a outro cadastro.")
+    elif isinstance(perfil, Psicologo) and Psicologo.objects.filter(crp=perfil.crp).exists():
+        perfil_form.add_error('crp', "Já existe um psicólogo cadastrado com este CRP.")
+    else:
+        usuario_form.add_error(None, "Não foi possível salvar o perfil. Tente novamente.")
@@ -0,0 +1,63 @@
+# core/receivers.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import estatisticas, reminders, roster
+from .models import Consulta, Usuario
+from .signals import consultas_alteradas_em_lote
+
+
+def _mes(consulta):
+    return (consulta.psicologo_id, consulta.data.replace(day=1))
+
+
+@receiver(post_save, sender=Consulta)
+def consulta_salva(sender, instance, created, update_fields=None, **kwargs):
+    # Psicólogo, paciente, data e hora de antes deste save (ver Consulta.from_db)
+    antes = getattr(instance, 'valores_salvos', (None,) * len(Consulta.CAMPOS_RASTREADOS))
+    psicologo_antes, paciente_antes, data_antes, hora_antes = antes
+    # Com update_fields, só os campos gravados passam a valer no banco
+    instance.valores_salvos = tuple(
+        atual if update_fields is None or campo.removesuffix('_id') in update_fields else anterior
+        for campo, anterior, atual in zip(Consulta.CAMPOS_RASTREADOS, antes, instance.valores_rastreados())
+    )
+
+    if created:
+        roster.registrar_consultas([instance])
+    elif update_fields is None or {'data', 'status', 'psicologo', 'paciente'} & set(update_fields):
+        # Data ou status podem ter mudado: as sessões do par precisam ser
+        # refeitas, e as do par antigo se a consulta mudou de psicólogo/paciente
+        pares = {(instance.psicologo_id, instance.paciente_id)}
+        if psicologo_antes is not None and paciente_antes is not None:
+            pares.add((psicologo_antes, paciente_antes))
+        roster.recalcular(pares)
+
+    if not created and (data_antes, hora_antes) != (instance.data, instance.hora):
+        # Remarcada: os lembretes ainda na fila passam a valer para o novo horário
+        reminders.reprogramar_lembretes([instance.pk])
+
+    meses = {_mes(instance)}
+    if psicologo_antes is not None and data_antes is not None:
+        # Mudou de mês (ou de psicólogo): o mês antigo perdeu a consulta
+        meses.add((psicologo_antes, data_antes.replace(day=1)))
+    estatisticas.agendar_recalculo(meses)
+
+
+@receiver(post_delete, sender=Consulta)
+def consulta_apagada(sender, instance, **kwargs):
+    roster.recalcular([(instance.psicologo_id, instance.paciente_id)])
+    estatisticas.agendar_recalculo([_mes(instance)])
+
+
+@receiver(consultas_alteradas_em_lote, sender=Consulta)
+def consultas_alteradas(sender, meses, pares, **kwargs):
+    # Mudanças de status em lote (transições, fechamento do dia, séries)
+    roster.recalcular(pares)
+    estatisticas.agendar_recalculo(meses)
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_salvo(sender, instance, created, update_fields=None, **kwargs):
+    # O roster guarda uma cópia do nome do paciente (ordenação por índice)
+    if not created and (update_fields is None or 'nome' in update_fields):
+        roster.renomear_paciente(instance)
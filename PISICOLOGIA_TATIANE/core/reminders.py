@@ -0,0 +1,206 @@
+# core/reminders.py
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Consulta, Lembrete
+
+# Antecedência de cada tipo de lembrete
+ANTECEDENCIAS = {
+    '24h': timedelta(hours=24),
+    '2h': timedelta(hours=2),
+}
+
+# Consultas nesses status recebem lembrete
+STATUS_COM_LEMBRETE = ['pendente', 'confirmada']
+
+# Lembretes 'processando' há mais tempo que isso voltam para a fila
+# (o worker que os pegou provavelmente caiu)
+TEMPO_RESERVA = timedelta(minutes=10)
+
+MAX_TENTATIVAS = 3
+
+# Espera antes de tentar de novo um envio que falhou: dobra a cada tentativa
+# (5 min, 10 min, ...). Sem ela, uma queda do SMTP esgotaria as tentativas
+# no mesmo ciclo, em milissegundos.
+ESPERA_NOVA_TENTATIVA = timedelta(minutes=5)
+
+# Atraso máximo de um envio em relação ao horário calculado a partir da
+# consulta. Cobre as novas tentativas (5 + 10 min) e um ciclo atrasado do
+# worker; além disso o lembrete já não serve (consulta antecipada, worker
+# parado por horas) e é descartado.
+ATRASO_MAXIMO = timedelta(hours=1)
+
+
+def _inicio_consulta(data, hora):
+    return timezone.make_aware(datetime.combine(data, hora), timezone.get_current_timezone())
+
+
+def agendar_lembretes(agora=None, horizonte=None):
+    """
+    Pré-calcula os lembretes das próximas consultas e grava na fila.
+    Lê só a janela de datas do horizonte (índice em data/hora), nunca a
+    tabela inteira. Pode rodar a cada ciclo: lembretes já existentes são
+    ignorados pela UniqueConstraint (consulta, tipo).
+    Retorna quantos lembretes foram considerados.
+    """
+    agora = agora or timezone.now()
+    horizonte = horizonte or max(ANTECEDENCIAS.values()) + timedelta(hours=1)
+    limite = agora + horizonte
+
+    consultas = Consulta.objects.filter(
+        data__range=(timezone.localtime(agora).date(), timezone.localtime(limite).date()),
+        status__in=STATUS_COM_LEMBRETE,
+    ).values_list('id_consulta', 'data', 'hora')
+
+    novos = []
+    for id_consulta, data, hora in consultas:
+        inicio = _inicio_consulta(data, hora)
+        if not (agora < inicio <= limite):
+            continue
+        for tipo, antecedencia in ANTECEDENCIAS.items():
+            enviar_em = inicio - antecedencia
+            # Não cria lembrete "atrasado" (ex: 24h para uma consulta daqui a 3h)
+            if enviar_em >= agora - timedelta(minutes=5):
+                novos.append(Lembrete(consulta_id=id_consulta, tipo=tipo, enviar_em=enviar_em))
+
+    Lembrete.objects.bulk_create(novos, ignore_conflicts=True, batch_size=500)
+    return len(novos)
+
+
+def reprogramar_lembretes(consulta_ids):
+    """
+    Recalcula o enviar_em dos lembretes pendentes dessas consultas a partir
+    da data/hora atuais. Chamado quando uma consulta muda de data ou horário
+    (core/receivers.py e a alteração de horário da série).
+    """
+    pendentes = Lembrete.objects.filter(consulta_id__in=consulta_ids, status='pendente').values_list(
+        'id', 'tipo', 'enviar_em', 'consulta__data', 'consulta__hora'
+    )
+    for id_lembrete, tipo, enviar_em, data, hora in pendentes:
+        novo = _inicio_consulta(data, hora) - ANTECEDENCIAS[tipo]
+        if novo != enviar_em:
+            Lembrete.objects.filter(id=id_lembrete, status='pendente').update(enviar_em=novo)
+
+
+def reservar_lembretes(tamanho_lote, agora=None):
+    """
+    Reserva um lote de lembretes vencidos para este worker.
+    No PostgreSQL usa SELECT ... FOR UPDATE SKIP LOCKED; no SQLite, onde as
+    escritas já são serializadas, o UPDATE condicional (status='pendente')
+    garante que cada lembrete fique com um único worker.
+    Retorna a lista de lembretes reservados, com consulta e paciente carregados.
+    """
+    agora = agora or timezone.now()
+    dono = uuid.uuid4().hex
+
+    with transaction.atomic():
+        vencidos = Lembrete.objects.filter(status='pendente', enviar_em__lte=agora).order_by('enviar_em')
+        if connection.features.has_select_for_update_skip_locked:
+            vencidos = vencidos.select_for_update(skip_locked=True)
+        ids = list(vencidos.values_list('id', flat=True)[:tamanho_lote])
+
+        Lembrete.objects.filter(id__in=ids, status='pendente').update(
+            status='processando', reservado_por=dono, reservado_em=agora,
+        )
+
+    return list(
+        Lembrete.objects.filter(reservado_por=dono, status='processando')
+        .select_related('consulta__paciente__usuario', 'consulta__psicologo__usuario')
+    )
+
+
+def liberar_reservas_expiradas(agora=None):
+    """Devolve para a fila os lembretes presos em 'processando'."""
+    agora = agora or timezone.now()
+    return Lembrete.objects.filter(
+        status='processando', reservado_em__lt=agora - TEMPO_RESERVA,
+    ).update(status='pendente', reservado_por=None, reservado_em=None)
+
+
+def _mensagem(lembrete):
+    consulta = lembrete.consulta
+    return EmailMessage(
+        subject=f"Lembrete: consulta em {consulta.data:%d/%m/%Y} às {consulta.hora:%H:%M}",
+        body=(
+            f"Olá, {consulta.paciente.usuario.nome}!\n\n"
+            f"Lembramos que você tem uma consulta com Dr(a). {consulta.psicologo.usuario.nome} "
+            f"em {consulta.data:%d/%m/%Y} às {consulta.hora:%H:%M}.\n\n"
+            "Se ainda não confirmou sua presença, acesse o seu painel."
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[consulta.paciente.usuario.email],
+    )
+
+
+def enviar_lote(lembretes, agora=None):
+    """
+    Envia os lembretes reservados usando uma única conexão de email.
+    Retorna (enviados, descartados, falhas).
+    """
+    agora = agora or timezone.now()
+    validos, descartados = [], []
+    for lembrete in lembretes:
+        consulta = lembrete.consulta
+        inicio = _inicio_consulta(consulta.data, consulta.hora)
+        enviar_em = inicio - ANTECEDENCIAS[lembrete.tipo]
+        # Consulta cancelada/realizada, já começada, ou antecipada a ponto de o
+        # lembrete chegar tarde demais (ex: o de 24h para uma consulta daqui a 3h)
+        if (consulta.status not in STATUS_COM_LEMBRETE or inicio <= agora
+                or agora - enviar_em > ATRASO_MAXIMO):
+            descartados.append(lembrete.id)
+            continue
+        # Consulta remarcada para mais tarde: o lembrete volta para a fila no novo horário
+        if enviar_em > agora:
+            Lembrete.objects.filter(id=lembrete.id).update(
+                status='pendente', enviar_em=enviar_em, reservado_por=None, reservado_em=None,
+            )
+            continue
+        validos.append(lembrete)
+
+    enviados, falhas = [], []
+    with get_connection() as conexao:
+        for lembrete in validos:
+            try:
+                conexao.send_messages([_mensagem(lembrete)])
+            except Exception:
+                falhas.append(lembrete)
+            else:
+                enviados.append(lembrete.id)
+
+    Lembrete.objects.filter(id__in=enviados).update(status='enviado', enviado_em=agora)
+    Lembrete.objects.filter(id__in=descartados).update(status='descartado')
+    for lembrete in falhas:
+        # Volta para a fila, mais adiante, até esgotar as tentativas
+        tentativas = lembrete.tentativas + 1
+        Lembrete.objects.filter(id=lembrete.id).update(
+            tentativas=tentativas,
+            status='falhou' if tentativas >= MAX_TENTATIVAS else 'pendente',
+            enviar_em=agora + ESPERA_NOVA_TENTATIVA * 2 ** (tentativas - 1),
+            reservado_por=None, reservado_em=None,
+        )
+    return len(enviados), len(descartados), len(falhas)
+
+
+def processar_ciclo(tamanho_lote=200, agora=None):
+    """
+    Um ciclo completo do worker: agenda, libera reservas vencidas e envia
+    lotes até esvaziar a fila de lembretes vencidos.
+    Retorna (enviados, descartados, falhas).
+    """
+    agora = agora or timezone.now()
+    agendar_lembretes(agora)
+    liberar_reservas_expiradas(agora)
+
+    totais = [0, 0, 0]
+    while True:
+        lote = reservar_lembretes(tamanho_lote, agora)
+        if not lote:
+            break
+        for i, valor in enumerate(enviar_lote(lote, agora)):
+            totais[i] += valor
+    return tuple(totais)
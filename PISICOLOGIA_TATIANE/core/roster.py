@@ -0,0 +1,194 @@
+# core/roster.py
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import Consulta, PsicologoPaciente, Usuario
+
+# Campos do roster recalculados a partir das consultas
+CAMPOS_CALCULADOS = ['paciente_nome', 'primeira_sessao', 'ultima_sessao', 'total_sessoes']
+
+
+def _sessao(hoje=None):
+    """Filtro das consultas que contam como sessão: realizadas, até hoje."""
+    return Q(status='realizada', data__lte=hoje or timezone.localdate())
+
+
+def _conta_como_sessao(consulta, hoje):
+    return consulta.status == 'realizada' and consulta.data <= hoje
+
+
+def _resumo(consultas):
+    """
+    Agrupa as consultas por (psicologo_id, paciente_id): [primeira, última,
+    total] só das sessões. Pares sem sessão ficam com [None, None, 0].
+    """
+    hoje = timezone.localdate()
+    pares = defaultdict(lambda: [None, None, 0])
+    for consulta in consultas:
+        resumo = pares[(consulta.psicologo_id, consulta.paciente_id)]
+        if not _conta_como_sessao(consulta, hoje):
+            continue
+        resumo[0] = consulta.data if resumo[0] is None else min(resumo[0], consulta.data)
+        resumo[1] = consulta.data if resumo[1] is None else max(resumo[1], consulta.data)
+        resumo[2] += 1
+    return pares
+
+
+def registrar_consultas(consultas):
+    """
+    Soma consultas recém-criadas ao roster com um UPDATE por par
+    (total + n, primeira/última ajustadas no próprio banco). Se o par
+    ainda não existe, cria; se outro processo criou no meio, repete o UPDATE.
+    Consultas que ainda não são sessão (futuras, pendentes...) só garantem o par.
+    """
+    for (psicologo_id, paciente_id), (primeira, ultima, total) in _resumo(consultas).items():
+        par = PsicologoPaciente.objects.filter(psicologo_id=psicologo_id, paciente_id=paciente_id)
+        campos = {}
+        if total:
+            # Least/Greatest com NULL dão NULL no SQLite: o Coalesce cobre o par sem sessões
+            campos = {
+                'total_sessoes': F('total_sessoes') + total,
+                'primeira_sessao': Least(Coalesce(F('primeira_sessao'), Value(primeira)), Value(primeira)),
+                'ultima_sessao': Greatest(Coalesce(F('ultima_sessao'), Value(ultima)), Value(ultima)),
+            }
+        existe = par.update(**campos) if campos else par.exists()
+        if existe:
+            continue
+        nome = Usuario.objects.filter(paciente__pk=paciente_id).values_list('nome', flat=True).get()
+        try:
+            with transaction.atomic():
+                PsicologoPaciente.objects.create(
+                    psicologo_id=psicologo_id, paciente_id=paciente_id, paciente_nome=nome,
+                    primeira_sessao=primeira, ultima_sessao=ultima, total_sessoes=total,
+                )
+        except IntegrityError:
+            if campos:
+                par.update(**campos)
+
+
+def recalcular(pares):
+    """
+    Recalcula do zero os pares (psicologo_id, paciente_id) a partir das
+    consultas, com uma leitura agrupada para todos. Usado quando consultas
+    são apagadas ou mudam de data ou status; o par some se não restar
+    nenhuma consulta.
+    """
+    pares = set(pares)
+    if not pares:
+        return
+    esperado = roster_esperado(pares=pares)
+    _gravar(esperado)
+    sobrando = pares - set(esperado)
+    if sobrando:
+        PsicologoPaciente.objects.filter(_filtro_pares(sobrando)).delete()
+
+
+def renomear_paciente(usuario):
+    """Atualiza a cópia do nome do paciente (Usuario) no roster."""
+    PsicologoPaciente.objects.filter(paciente__usuario=usuario).exclude(
+        paciente_nome=usuario.nome
+    ).update(paciente_nome=usuario.nome)
+
+
+def _filtro_pares(pares):
+    filtro = Q()
+    for psicologo_id, paciente_id in pares:
+        filtro |= Q(psicologo_id=psicologo_id, paciente_id=paciente_id)
+    return filtro
+
+
+def _gravar(esperado, tamanho_lote=1000):
+    """Insere ou sobrescreve as linhas do roster de um dict de roster_esperado()."""
+    PsicologoPaciente.objects.bulk_create(
+        [
+            PsicologoPaciente(
+                psicologo_id=psicologo_id, paciente_id=paciente_id, paciente_nome=nome,
+                primeira_sessao=primeira, ultima_sessao=ultima, total_sessoes=total,
+            )
+            for (psicologo_id, paciente_id), (nome, primeira, ultima, total) in esperado.items()
+        ],
+        batch_size=tamanho_lote,
+        update_conflicts=True,
+        unique_fields=['psicologo', 'paciente'],
+        update_fields=CAMPOS_CALCULADOS,
+    )
+
+
+def roster_esperado(psicologo_id=None, pares=None):
+    """
+    O roster como ele deveria estar, calculado direto das consultas:
+    {(psicologo_id, paciente_id): (nome do paciente, primeira, última, total)}.
+    """
+    consultas = Consulta.objects.all()
+    if psicologo_id is not None:
+        consultas = consultas.filter(psicologo_id=psicologo_id)
+    if pares is not None:
+        # Faixa pelos ids (índice psicólogo/paciente); os pares exatos são separados abaixo
+        consultas = consultas.filter(
+            psicologo_id__in={psicologo for psicologo, _ in pares},
+            paciente_id__in={paciente for _, paciente in pares},
+        )
+    sessao = _sessao()
+    linhas = (
+        consultas.order_by()
+        .values('psicologo_id', 'paciente_id', 'paciente__usuario__nome')
+        .annotate(
+            primeira=Min('data', filter=sessao),
+            ultima=Max('data', filter=sessao),
+            total=Count('id_consulta', filter=sessao),
+        )
+    )
+    esperado = {
+        (linha['psicologo_id'], linha['paciente_id']): (
+            linha['paciente__usuario__nome'], linha['primeira'], linha['ultima'], linha['total'],
+        )
+        for linha in linhas.iterator()
+    }
+    if pares is not None:
+        esperado = {par: valores for par, valores in esperado.items() if par in pares}
+    return esperado
+
+
+def roster_atual(psicologo_id=None):
+    """O roster gravado, no mesmo formato de roster_esperado()."""
+    linhas = PsicologoPaciente.objects.all()
+    if psicologo_id is not None:
+        linhas = linhas.filter(psicologo_id=psicologo_id)
+    return {
+        (psicologo, paciente): (nome, primeira, ultima, total)
+        for psicologo, paciente, nome, primeira, ultima, total in linhas.values_list(
+            'psicologo_id', 'paciente_id', *CAMPOS_CALCULADOS
+        ).iterator()
+    }
+
+
+def divergencias(psicologo_id=None):
+    """
+    Compara o roster gravado com o esperado.
+    Retorna (faltando, sobrando, diferentes) como listas de pares.
+    """
+    esperado = roster_esperado(psicologo_id)
+    atual = roster_atual(psicologo_id)
+    faltando = [par for par in esperado if par not in atual]
+    sobrando = [par for par in atual if par not in esperado]
+    diferentes = [par for par, valores in esperado.items() if par in atual and atual[par] != valores]
+    return faltando, sobrando, diferentes
+
+
+def reconstruir(tamanho_lote=1000):
+    """
+    Preenche o roster inteiro a partir das consultas (backfill). Idempotente:
+    pares existentes são sobrescritos e pares sem consulta são removidos.
+    Retorna (gravados, removidos).
+    """
+    esperado = roster_esperado()
+    with transaction.atomic():
+        _gravar(esperado, tamanho_lote)
+        sobrando = [par for par in roster_atual() if par not in esperado]
+        for psicologo_id, paciente_id in sobrando:
+            PsicologoPaciente.objects.filter(psicologo_id=psicologo_id, paciente_id=paciente_id).delete()
+    return len(esperado), len(sobrando)
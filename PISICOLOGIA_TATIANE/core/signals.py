@@ -0,0 +1,10 @@
+# core/signals.py
+from django.dispatch import Signal
+
+# Enviado por ConsultaQuerySet.update() e .bulk_create(), que não disparam
+# post_save. Argumentos:
+#   psicologo_ids: conjunto de ids dos psicólogos afetados
+#   meses: conjunto de (psicologo_id, primeiro dia do mês) das consultas afetadas
+#   pares: conjunto de (psicologo_id, paciente_id) das consultas afetadas
+# Quando o UPDATE muda data, psicólogo ou paciente, vão os valores antigos e os novos.
+consultas_alteradas_em_lote = Signal()
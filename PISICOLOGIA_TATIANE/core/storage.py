@@ -0,0 +1,189 @@
+# core/storage.py
+import gzip
+import hashlib
+import os
+import re
+import uuid
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+from .minificar import minificar_css, minificar_js
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só são gerados os .gz
+    brotli = None
+
+# Níveis de subdiretório tirados do início do hash (ab/cd/abcd...): evita
+# diretórios com centenas de milhares de arquivos
+NIVEIS_SHARD = 2
+TAMANHO_BLOCO = 64 * 1024
+
+
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """
+    Storage de uploads endereçado por conteúdo.
+
+    O nome do arquivo é o SHA-256 do conteúdo (mais a extensão original),
+    dentro do diretório do upload_to e dividido em subdiretórios:
+        fotos_perfil/3f/a2/3fa2...e1.jpg
+    Enviar de novo um arquivo que já existe não grava nada: o campo só passa
+    a apontar para o arquivo existente. Como o nome muda sempre que o conteúdo
+    muda, os arquivos nunca são alterados e podem ser servidos com cache longo.
+
+    Arquivos que nenhum registro usa mais são apagados pelo comando
+    limpar_midia_orfa (nunca na hora, pois outro registro pode usar o mesmo arquivo).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo só é conhecido em _save (depende do conteúdo)
+        return name
+
+    def nome_por_conteudo(self, name, content):
+        sha = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for bloco in content.chunks(TAMANHO_BLOCO):
+            sha.update(bloco)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        digest = sha.hexdigest()
+        diretorio = os.path.dirname(name)
+        extensao = os.path.splitext(name)[1].lower()
+        shards = [digest[2 * i:2 * i + 2] for i in range(NIVEIS_SHARD)]
+        return '/'.join(filter(None, [diretorio, *shards, digest + extensao]))
+
+    def _save(self, name, content):
+        nome = self.nome_por_conteudo(name, content)
+        if self.exists(nome):
+            # Renova a data do arquivo: o limpar_midia_orfa não o apaga antes
+            # de o registro que acabou de referenciá-lo ser gravado
+            os.utime(self.path(nome))
+            return nome
+        # Grava com nome temporário e renomeia: quem lê nunca vê um arquivo
+        # pela metade, e dois uploads iguais ao mesmo tempo não colidem
+        temporario = super()._save(f"{nome}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(temporario), self.path(nome))
+        return nome
+
+
+_armazenamento_fotos = ArmazenamentoPorConteudo()
+
+
+def armazenamento_fotos():
+    """Storage das fotos de perfil (callable: a migração guarda só a referência)."""
+    return _armazenamento_fotos
+
+
+# --- Estáticos ---
+
+MINIFICADORES = {
+    '.css': minificar_css,
+    '.js': minificar_js,
+}
+# Arquivos de texto que valem a pena pré-comprimir (imagens já são comprimidas)
+EXTENSOES_COMPRIMIVEIS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# Abaixo disso o cabeçalho da compressão come o ganho
+TAMANHO_MINIMO_COMPRESSAO = 256
+
+
+# Hash que o ManifestStaticFilesStorage põe no nome: app.3f2a9c1e0b7d.css
+HASH_NO_NOME = re.compile(r'\.[0-9a-f]{12}(?=\.[^./]+$)')
+
+
+def _do_projeto(nome):
+    """O arquivo 'nome' (com ou sem hash) vem de STATICFILES_DIRS, e não de um app?"""
+    # As cópias com hash também são gravadas a partir do original
+    nome = HASH_NO_NOME.sub('', nome)
+    for entrada in settings.STATICFILES_DIRS:
+        prefixo, diretorio = entrada if isinstance(entrada, (list, tuple)) else ('', entrada)
+        relativo = nome
+        if prefixo:
+            if not nome.startswith(f"{prefixo}/"):
+                continue
+            relativo = nome[len(prefixo) + 1:]
+        if os.path.isfile(os.path.join(diretorio, relativo)):
+            return True
+    return False
+
+
+class ArmazenamentoEstatico(ManifestStaticFilesStorage):
+    """
+    Storage do collectstatic (settings.STORAGES['staticfiles']).
+
+    Além do que o ManifestStaticFilesStorage já faz (copia cada arquivo com o
+    hash do conteúdo no nome, app.css -> app.3f2a9c1e.css, e o {% static %}
+    passa a apontar para o nome com hash quando DEBUG=False):
+      - minifica o CSS e o JS do projeto nas cópias com hash (ver
+        core/minificar.py). O hash é calculado sobre os bytes já
+        minificados: se o minificador mudar (outra versão, rcssmin/rjsmin
+        instalados ou não), o nome muda junto;
+      - grava ao lado de cada arquivo com hash um .gz e, se o pacote brotli
+        estiver instalado, um .br, para o servidor da frente servir sem
+        comprimir a cada requisição (gzip_static / brotli_static no nginx).
+    Como o nome muda quando o conteúdo muda, a frente pode mandar
+    Cache-Control: immutable com validade de um ano.
+    """
+
+    def _minificado(self, name, content):
+        """Bytes minificados de 'content', ou None se 'name' não é minificado."""
+        minificador = MINIFICADORES.get(os.path.splitext(name)[1].lower())
+        # Só os arquivos do próprio projeto (STATICFILES_DIRS): os dos apps
+        # (ex: admin) e os .min.* já vêm prontos de fora
+        if (minificador is None or '.min.' in os.path.basename(name)
+                or not _do_projeto(name)):
+            return None
+        content.seek(0)
+        dados = content.read()
+        content.seek(0)
+        try:
+            minificado = minificador(dados.decode('utf-8'))
+        except UnicodeDecodeError:
+            return None
+        return None if minificado is None else minificado.encode('utf-8')
+
+    def file_hash(self, name, content=None):
+        # Recebe o conteúdo que _save vai gravar com o nome com hash; o
+        # save_manifest() chama sem nome, para o hash do próprio manifesto
+        minificado = None if content is None or name is None else self._minificado(name, content)
+        if minificado is not None:
+            content = ContentFile(minificado)
+        return super().file_hash(name, content)
+
+    def _save(self, name, content):
+        # Só as cópias com hash são minificadas: a cópia sem hash fica igual à
+        # fonte, e o hashed_name() que a relê (referências entre arquivos)
+        # minifica uma vez só, chegando ao mesmo hash
+        if HASH_NO_NOME.search(os.path.basename(name)):
+            minificado = self._minificado(name, content)
+            if minificado is not None:
+                content = ContentFile(minificado)
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for nome in sorted(set(self.hashed_files.values())):
+            if nome.lower().endswith(EXTENSOES_COMPRIMIVEIS):
+                self._pre_comprimir(nome)
+
+    def _pre_comprimir(self, nome):
+        with self.open(nome) as arquivo:
+            dados = arquivo.read()
+        if len(dados) < TAMANHO_MINIMO_COMPRESSAO:
+            return
+        # mtime=0: o mesmo conteúdo gera sempre o mesmo .gz
+        versoes = {'.gz': gzip.compress(dados, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            versoes['.br'] = brotli.compress(dados, mode=brotli.MODE_TEXT)
+        for sufixo, comprimido in versoes.items():
+            if len(comprimido) >= len(dados):
+                continue
+            if self.exists(nome + sufixo):
+                self.delete(nome + sufixo)
+            super()._save(nome + sufixo, ContentFile(comprimido))
@@ -0,0 +1,19 @@
+# core/templatetags/perfil_tags.py
+
+from django import template
+
+from core import fotos
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(usuario, tamanho=48):
+    """
+    URL da foto de perfil de 'usuario' na variante certa para 'tamanho' px.
+    Uso: <img src="{% avatar user.usuario 48 %}" width="48" height="48">
+    Enquanto o worker não gerou as variantes, devolve a foto padrão.
+    """
+    if usuario is None:
+        return ''
+    return fotos.url_foto(usuario, int(tamanho))
@@ -1,3 +1,937 @@
-from django.test import TestCase
+import atexit
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import consulta_services, estatisticas, fotos, midia, reminders, roster, storage, throttle
+from .forms import ConsultaForm
+from .models import (
+    Clinica, Consulta, ConsultaQuerySet, HorarioTrabalho, Lembrete, Paciente, Psicologo, PsicologoClinica,
+    PsicologoPaciente, ResumoMensal, SerieConsulta, Usuario,
+)
+from .pagination import KeysetPaginator
+from .signals import consultas_alteradas_em_lote
+
+_ESTATICOS_COLETADOS = []
+
+
+def _coletar_estaticos():
+    """
+    Roda o collectstatic (ArmazenamentoEstatico: manifesto, minificação) uma
+    vez por execução dos testes, num STATIC_ROOT temporário, e retorna o diretório.
+    """
+    if not _ESTATICOS_COLETADOS:
+        diretorio = tempfile.mkdtemp(prefix='estaticos-teste-')
+        atexit.register(shutil.rmtree, diretorio, ignore_errors=True)
+        with override_settings(STATIC_ROOT=diretorio):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        _ESTATICOS_COLETADOS.append(diretorio)
+    return _ESTATICOS_COLETADOS[0]
+
+
+class EstaticosColetadosMixin:
+    """
+    Os testes rodam com DEBUG=False: o {% static %} lê o manifesto do
+    collectstatic, como em produção. Uma referência a um arquivo que não
+    existe quebra o teste (ValueError: Missing staticfiles manifest entry).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(override_settings(STATIC_ROOT=_coletar_estaticos()))
+        super().setUpClass()
+
+
+def criar_perfil(tipo, indice):
+    """Cria User + Usuario + Psicologo/Paciente ('psicologo' ou 'paciente')."""
+    user = User.objects.create_user(f'{tipo}{indice}', f'{tipo}{indice}@exemplo.com', 'senha-forte-123')
+    usuario = Usuario.objects.create(
+        user=user,
+        cpf=f"{'1' if tipo == 'psicologo' else '2'}{indice:010d}",
+        nome=f'{tipo.title()} {indice}',
+        email=user.email,
+    )
+    if tipo == 'psicologo':
+        return Psicologo.objects.create(usuario=usuario, crp=f'CRP-{indice}')
+    return Paciente.objects.create(usuario=usuario)
+
+
+class DadosConsultasMixin:
+    """Um psicólogo e alguns pacientes com consultas passadas e futuras."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.psicologo = criar_perfil('psicologo', 0)
+        cls.pacientes = [criar_perfil('paciente', i) for i in range(3)]
+        hoje = date.today()
+        status = ['realizada', 'confirmada', 'pendente', 'cancelada']
+        for i in range(12):
+            Consulta.objects.create(
+                psicologo=cls.psicologo,
+                paciente=cls.pacientes[i % 3],
+                data=hoje + timedelta(days=i * 7 - 42),
+                hora=time(9 + i % 8),
+                status=status[i % 4] if i < 6 else 'pendente',
+            )
+        cls.consulta = Consulta.objects.filter(status='realizada').first()
+
+
+class OrcamentoQueriesTests(EstaticosColetadosMixin, DadosConsultasMixin, TestCase):
+    """
+    Número de queries por página (GET), contando sessão e usuário.
+    Se uma mudança alterar um número, reveja a view antes de atualizar o teste.
+    """
+
+    PAGINAS_PSICOLOGO = [
+        ('psicologo:dashboard', lambda consulta: [], 5),
+        ('psicologo:agenda_completa', lambda consulta: [], 3),
+        ('psicologo:consulta_detalhes', lambda consulta: [consulta.id_consulta], 4),
+        ('psicologo:listar_consultas_diagnostico', lambda consulta: [], 3),
+        ('psicologo:registrar_diagnostico', lambda consulta: [consulta.id_consulta], 3),
+        ('psicologo:meus_pacientes', lambda consulta: [], 3),
+        ('psicologo:paciente_historico', lambda consulta: [consulta.paciente_id], 6),
+        ('psicologo:estatisticas', lambda consulta: [], 3),
+        ('agendar_consulta', lambda consulta: [], 3),
+        ('meu_perfil', lambda consulta: [], 2),
+        ('editar_perfil', lambda consulta: [], 2),
+    ]
+
+    PAGINAS_PACIENTE = [
+        ('paciente:dashboard', lambda consulta: [], 3),
+        ('paciente:meus_agendamentos', lambda consulta: [], 3),
+        ('paciente:consulta_detalhes', lambda consulta: [consulta.id_consulta], 4),
+        ('agendar_consulta', lambda consulta: [], 3),
+        ('meu_perfil', lambda consulta: [], 2),
+        ('editar_perfil', lambda consulta: [], 2),
+    ]
+
+    def _verificar(self, user, paginas):
+        self.client.force_login(user)
+        for nome, argumentos, queries in paginas:
+            url = reverse(nome, args=argumentos(self.consulta))
+            with self.subTest(url=url):
+                # Cache frio: mede o pior caso (ex: snapshot do dashboard)
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    resposta = self.client.get(url)
+                self.assertEqual(resposta.status_code, 200)
+
+    def test_paginas_do_psicologo(self):
+        self._verificar(self.psicologo.usuario.user, self.PAGINAS_PSICOLOGO)
+
+    def test_paginas_do_paciente(self):
+        self._verificar(self.consulta.paciente.usuario.user, self.PAGINAS_PACIENTE)
+
+
+class DashboardCacheTests(EstaticosColetadosMixin, DadosConsultasMixin, TestCase):
+    """
+    Dashboards com o cache quente: só a sessão e o usuário (com o perfil)
+    vão ao banco. Mudanças trocam a chave em vez de apagar a entrada, o que
+    vale também para os outros processos, cada um com o seu cache local.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dashboard_do_psicologo_quente(self):
+        self.client.force_login(self.psicologo.usuario.user)
+        url = reverse('psicologo:dashboard')
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_mudanca_troca_o_snapshot_sem_apagar_o_cache(self):
+        self.client.force_login(self.psicologo.usuario.user)
+        url = reverse('psicologo:dashboard')
+        self.client.get(url)
+        usuario = self.pacientes[0].usuario
+        usuario.nome = 'Nome Novo'
+        # Outro processo: o delete do cache daqui não alcançaria o dele
+        with mock.patch.object(cache, 'delete_many'), mock.patch.object(cache, 'delete'):
+            usuario.save()
+        self.assertContains(self.client.get(url), 'Nome Novo')
+
+    def test_dashboard_do_paciente_quente(self):
+        # Sessão, usuário e a query única das consultas (sem snapshot)
+        self.client.force_login(self.pacientes[0].usuario.user)
+        url = reverse('paciente:dashboard')
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_fragmentos_variam_pelo_que_mostram(self):
+        paciente = self.pacientes[0]
+        self.client.force_login(paciente.usuario.user)
+        url = reverse('paciente:dashboard')
+        self.client.get(url)
+        paciente.plano_saude = 'Plano Novo'
+        paciente.usuario.nome = 'Nome Novo'
+        with mock.patch.object(cache, 'delete_many'), mock.patch.object(cache, 'delete'):
+            paciente.save()
+            paciente.usuario.save()
+        resposta = self.client.get(url)
+        self.assertContains(resposta, 'Plano Novo')
+        self.assertContains(resposta, 'Olá, Nome Novo')
+
+
+@skipUnless(connection.vendor == 'sqlite', "Lê o EXPLAIN QUERY PLAN do SQLite.")
+class PlanosConsultaTests(EstaticosColetadosMixin, DadosConsultasMixin, TestCase):
+    """
+    EXPLAIN QUERY PLAN do SQL que as views de agenda, listas e dashboards
+    realmente executam (capturado com CaptureQueriesContext, inclusive a
+    segunda página dos cursores): nenhuma varredura completa de tabela nem
+    ordenação em B-tree temporária.
+    """
+
+    # Varredura de tabela ou alias (subquery 'U0'...); as sub-rotinas do
+    # próprio SQLite ('SCAN (subquery-1)', 'SCAN qualify') não contam
+    VARREDURA = re.compile(r'\bSCAN (?!\(subquery|qualify\b)')
+    ORDENACAO_TEMPORARIA = 'USE TEMP B-TREE'
+    TABELAS = ('"core_consulta"', '"core_psicologopaciente"')
+
+    # Páginas em que a ordenação temporária é esperada:
+    #   paciente:dashboard - ROW_NUMBER() OVER (PARTITION BY seção) ordena as
+    #                        consultas do paciente (o WHERE ainda usa índice)
+    ORDENACAO_TOLERADA = {'paciente:dashboard'}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Mais de uma página (10 por página) no roster e nos agendamentos
+        hoje = date.today()
+        for i in range(3, 14):
+            Consulta.objects.create(
+                psicologo=cls.psicologo, paciente=criar_perfil('paciente', i),
+                data=hoje - timedelta(days=100 + i), hora=time(10), status='realizada',
+            )
+        for i in range(8):
+            Consulta.objects.create(
+                psicologo=cls.psicologo, paciente=cls.pacientes[0],
+                data=hoje - timedelta(days=200 + i), hora=time(11), status='realizada',
+            )
+
+    def _planos(self, url, parametros=None):
+        """GET em 'url'; retorna (resposta, [(sql, plano)]) das queries nas tabelas de consulta."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            resposta = self.client.get(url, parametros)
+        self.assertEqual(resposta.status_code, 200)
+        planos = []
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(tabela in sql for tabela in self.TABELAS):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                planos.append((sql, [linha[-1] for linha in cursor.fetchall()]))
+        self.assertTrue(planos, f"{url} não consultou {', '.join(self.TABELAS)}")
+        return resposta, planos
+
+    def _verificar(self, nome, parametros=None, segunda_pagina=False):
+        url = reverse(nome)
+        with self.subTest(url=url, parametros=parametros, segunda_pagina=segunda_pagina):
+            resposta, planos = self._planos(url, parametros)
+            if segunda_pagina:
+                cursor = resposta.context['page_obj'].next_cursor
+                self.assertIsNotNone(cursor, f"{url} tem uma página só")
+                resposta, planos = self._planos(url, {**(parametros or {}), 'cursor': cursor})
+                self.assertTrue(resposta.context['page_obj'].has_previous())
+            for sql, plano in planos:
+                problemas = [linha for linha in plano if self.VARREDURA.search(linha)]
+                if nome not in self.ORDENACAO_TOLERADA:
+                    problemas += [linha for linha in plano if self.ORDENACAO_TEMPORARIA in linha]
+                self.assertEqual(problemas, [], f"{sql}\n" + "\n".join(plano))
+
+    def test_paginas_do_psicologo(self):
+        self.client.force_login(self.psicologo.usuario.user)
+        self._verificar('psicologo:dashboard')
+        self._verificar('psicologo:agenda_completa')
+        self._verificar('psicologo:agenda_completa', segunda_pagina=True)
+        self._verificar('psicologo:listar_consultas_diagnostico')
+        for ordem in ('nome', 'ultima'):
+            self._verificar('psicologo:meus_pacientes', {'ordem': ordem})
+            self._verificar('psicologo:meus_pacientes', {'ordem': ordem}, segunda_pagina=True)
+
+    def test_paginas_do_paciente(self):
+        self.client.force_login(self.pacientes[0].usuario.user)
+        self._verificar('paciente:dashboard')
+        self._verificar('paciente:meus_agendamentos')
+        self._verificar('paciente:meus_agendamentos', segunda_pagina=True)
+
+
+class SerieAlterarHoraTests(TestCase):
+    """consulta_services.alterar_hora_desta_em_diante valida a agenda e atualiza a série."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.psicologo = criar_perfil('psicologo', 0)
+        cls.paciente = criar_perfil('paciente', 0)
+        clinica = Clinica.objects.create(nome='Clínica', endereco='Rua A', cidade='Cidade', estado='SP', cep='00000000')
+        vinculo = PsicologoClinica.objects.create(psicologo=cls.psicologo, clinica=clinica)
+        cls.inicio = date.today() + timedelta(days=7)
+        # Atende das 08:00 às 12:00 no dia da semana da série
+        HorarioTrabalho.objects.create(
+            psicologo_clinica=vinculo, dia_semana=cls.inicio.weekday(),
+            hora_inicio=time(8), hora_fim=time(12),
+        )
+
+    def setUp(self):
+        self.serie = SerieConsulta.objects.create(
+            paciente=self.paciente, psicologo=self.psicologo, frequencia='semanal',
+            data_inicio=self.inicio, hora=time(9), total_sessoes=3,
+        )
+        self.sessoes = [
+            Consulta.objects.create(
+                psicologo=self.psicologo, paciente=self.paciente, serie=self.serie,
+                data=self.inicio + timedelta(weeks=semana), hora=time(9),
+            )
+            for semana in range(3)
+        ]
+
+    def _horas(self):
+        return [consulta.hora for consulta in Consulta.objects.filter(serie=self.serie).order_by('data')]
+
+    def test_altera_sessoes_seguintes_e_a_serie(self):
+        total = consulta_services.alterar_hora_desta_em_diante(self.sessoes[1], time(10))
+        self.assertEqual(total, 2)
+        self.assertEqual(self._horas(), [time(9), time(10), time(10)])
+        self.assertEqual(SerieConsulta.objects.get(pk=self.serie.pk).hora, time(10))
+
+    def test_horario_indisponivel_nao_altera_nada(self):
+        outro = criar_perfil('paciente', 1)
+        ocupada = self.sessoes[2].data
+        Consulta.objects.create(psicologo=self.psicologo, paciente=outro, data=ocupada, hora=time(11))
+        for nova_hora, datas in [(time(11), [ocupada]), (time(13), [s.data for s in self.sessoes])]:
+            with self.subTest(nova_hora=nova_hora):
+                with self.assertRaises(ValidationError) as erro:
+                    consulta_services.alterar_hora_desta_em_diante(self.sessoes[0], nova_hora)
+                self.assertIn(", ".join(data.strftime('%d/%m/%Y') for data in datas), erro.exception.messages[0])
+                self.assertEqual(self._horas(), [time(9)] * 3)
+                self.assertEqual(SerieConsulta.objects.get(pk=self.serie.pk).hora, time(9))
+
+
+class StatusEmLoteTests(DadosConsultasMixin, TestCase):
+    """consulta_services.atualizar_status_em_lote: um único desfecho por id pedido."""
+
+    def _id(self, status):
+        return Consulta.objects.filter(psicologo=self.psicologo, status=status).values_list('pk', flat=True)[0]
+
+    def test_cada_id_tem_um_desfecho(self):
+        outro = criar_perfil('psicologo', 1)
+        alheia = Consulta.objects.create(
+            psicologo=outro, paciente=self.pacientes[0], data=date.today(), hora=time(8),
+        )
+        pendente, confirmada, realizada = self._id('pendente'), self._id('confirmada'), self._id('realizada')
+        ids = [pendente, confirmada, realizada, alheia.pk, 999999, pendente]
+
+        atualizadas, recusadas = consulta_services.atualizar_status_em_lote(self.psicologo, ids, 'confirmada')
+
+        self.assertEqual(atualizadas, 1)
+        self.assertEqual([id_consulta for id_consulta, _ in recusadas], [confirmada, realizada, alheia.pk, 999999])
+        self.assertIn("já está", recusadas[0][1])
+        self.assertIn("não pode sair", recusadas[1][1])
+        self.assertEqual(recusadas[2][1], "consulta não encontrada")
+        self.assertEqual(Consulta.objects.get(pk=pendente).status, 'confirmada')
+        self.assertEqual(Consulta.objects.get(pk=alheia.pk).status, 'pendente')
+
+    def test_alteracao_concorrente_entre_leitura_e_update(self):
+        pendentes = list(
+            Consulta.objects.filter(psicologo=self.psicologo, status='pendente').values_list('pk', flat=True)[:3]
+        )
+        transition = ConsultaQuerySet.transition
+
+        def outra_acao_antes(queryset, *args, **kwargs):
+            # Outra requisição cancela uma das consultas depois da leitura
+            Consulta.objects.filter(pk=pendentes[0]).update(status='cancelada')
+            return transition(queryset, *args, **kwargs)
+
+        with mock.patch.object(ConsultaQuerySet, 'transition', outra_acao_antes):
+            atualizadas, recusadas = consulta_services.atualizar_status_em_lote(
+                self.psicologo, pendentes, 'confirmada'
+            )
+        self.assertEqual(atualizadas, 2)
+        self.assertEqual(recusadas, [(pendentes[0], "foi alterada ao mesmo tempo por outra ação")])
+
+
+class RosterTests(DadosConsultasMixin, TestCase):
+    """Roster (PsicologoPaciente): só consultas realizadas até hoje são sessões."""
+
+    def _linha(self, paciente):
+        return PsicologoPaciente.objects.get(psicologo=self.psicologo, paciente=paciente)
+
+    def test_conta_so_realizadas_ate_hoje(self):
+        hoje = date.today()
+        for paciente in self.pacientes:
+            with self.subTest(paciente=paciente.pk):
+                sessoes = Consulta.objects.filter(
+                    psicologo=self.psicologo, paciente=paciente, status='realizada', data__lte=hoje,
+                )
+                linha = self._linha(paciente)
+                self.assertEqual(linha.total_sessoes, sessoes.count())
+                self.assertEqual(linha.ultima_sessao, max(sessoes.values_list('data', flat=True), default=None))
+        self.assertEqual(roster.divergencias(), ([], [], []))
+
+    def test_transicao_e_renomear_atualizam_o_roster(self):
+        paciente = self.pacientes[2]
+        passada = Consulta.objects.filter(
+            psicologo=self.psicologo, paciente=paciente, data__lt=date.today(),
+        ).exclude(status='realizada').order_by('-data').first()
+        Consulta.objects.filter(pk=passada.pk).update(status='confirmada')
+        Consulta.objects.filter(pk=passada.pk).transition('realizada')
+        self.assertEqual(self._linha(paciente).ultima_sessao, passada.data)
+
+        usuario = paciente.usuario
+        usuario.nome = 'Aaron'
+        usuario.save()
+        self.assertEqual(self._linha(paciente).paciente_nome, 'Aaron')
+        self.assertEqual(roster.divergencias(), ([], [], []))
+
+    def test_cursor_passa_pelas_linhas_sem_sessao(self):
+        # Pacientes só com consultas futuras: última sessão NULL
+        for i in range(3, 6):
+            Consulta.objects.create(
+                psicologo=self.psicologo, paciente=criar_perfil('paciente', i),
+                data=date.today() + timedelta(days=60 + i), hora=time(8),
+            )
+        linhas = PsicologoPaciente.objects.filter(psicologo=self.psicologo)
+        esperado = [
+            linha.pk for linha in sorted(
+                linhas, key=lambda linha: (linha.ultima_sessao or date.min, linha.pk), reverse=True,
+            )
+        ]
+        self.assertIsNone(PsicologoPaciente.objects.get(pk=esperado[-1]).ultima_sessao)
+
+        paginator = KeysetPaginator(linhas, ('-ultima_sessao', '-id'), 2)
+        paginas = [paginator.get_page()]
+        while paginas[-1].has_next():
+            paginas.append(paginator.get_page(paginas[-1].next_cursor))
+        self.assertEqual([linha.pk for pagina in paginas for linha in pagina], esperado)
+
+        # E de volta, da última página para a primeira
+        voltando = [paginas[-1]]
+        while voltando[-1].has_previous():
+            voltando.append(paginator.get_page(voltando[-1].previous_cursor))
+        self.assertEqual([linha.pk for pagina in reversed(voltando) for linha in pagina], esperado)
+
+
+class KeysetPaginatorTests(DadosConsultasMixin, TestCase):
+    """Cursores do KeysetPaginator (core/pagination.py) na agenda do psicólogo."""
+
+    ORDEM = ('-data', '-hora', '-id_consulta')
+
+    def setUp(self):
+        self.consultas = Consulta.objects.filter(psicologo=self.psicologo)
+        self.esperado = list(self.consultas.order_by(*self.ORDEM).values_list('pk', flat=True))
+        self.paginator = KeysetPaginator(self.consultas, self.ORDEM, 5)
+
+    def _pks(self, pagina):
+        return [consulta.pk for consulta in pagina]
+
+    def test_ida_e_volta(self):
+        paginas = [self.paginator.get_page()]
+        while paginas[-1].has_next():
+            paginas.append(self.paginator.get_page(paginas[-1].next_cursor))
+        self.assertEqual([len(pagina) for pagina in paginas], [5, 5, 2])
+        self.assertEqual([pk for pagina in paginas for pk in self._pks(pagina)], self.esperado)
+        self.assertFalse(paginas[0].has_previous())
+
+        voltando = self.paginator.get_page(paginas[-1].previous_cursor)
+        self.assertEqual(self._pks(voltando), self.esperado[5:10])
+        self.assertEqual(self._pks(self.paginator.get_page(voltando.previous_cursor)), self.esperado[:5])
+
+    def test_cursor_invalido_ou_de_outra_ordenacao_e_a_primeira_pagina(self):
+        cursor = self.paginator.get_page().next_cursor
+        outra = KeysetPaginator(self.consultas, ('data', 'hora', 'id_consulta'), 5)
+        for pagina in [self.paginator.get_page('lixo'), outra.get_page(cursor)]:
+            self.assertEqual(len(pagina), 5)
+            self.assertFalse(pagina.has_previous())
+
+    def test_linhas_do_cursor_apagadas(self):
+        segunda = self.paginator.get_page(self.paginator.get_page().next_cursor)
+        # Tudo depois da segunda página some: a próxima vira a última que sobrou
+        Consulta.objects.filter(pk__in=self.esperado[10:]).delete()
+        pagina = self.paginator.get_page(segunda.next_cursor)
+        self.assertEqual(self._pks(pagina), self.esperado[5:10])
+        self.assertFalse(pagina.has_next())
+        self.assertTrue(pagina.has_previous())
+
+        # Voltando para linhas que sumiram: a primeira página
+        Consulta.objects.filter(pk__in=self.esperado[:5]).delete()
+        pagina = self.paginator.get_page(segunda.previous_cursor)
+        self.assertEqual(self._pks(pagina), self.esperado[5:10])
+        self.assertFalse(pagina.has_previous())
+
+
+class ConsultaSalvaTests(DadosConsultasMixin, TestCase):
+    """post_save de Consulta refaz o mês e o par de antes e os de depois."""
+
+    def _resumos(self):
+        return set(ResumoMensal.objects.filter(total__gt=0).values_list('psicologo_id', 'mes', 'status', 'total'))
+
+    def test_mudanca_de_mes_refaz_os_dois_meses(self):
+        estatisticas.reconstruir()
+        consulta = Consulta.objects.get(pk=self.consulta.pk)
+        consulta.data = (consulta.data.replace(day=1) - timedelta(days=60)).replace(day=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            consulta.save()
+        gravados = self._resumos()
+        estatisticas.reconstruir()
+        self.assertEqual(gravados, self._resumos())
+
+    def test_mudanca_de_paciente_refaz_o_par_antigo(self):
+        consulta = Consulta.objects.get(pk=self.consulta.pk)
+        antigo = consulta.paciente
+        consulta.paciente = next(paciente for paciente in self.pacientes if paciente != antigo)
+        consulta.save()
+        self.assertEqual(roster.divergencias(), ([], [], []))
+        self.assertNotEqual(
+            PsicologoPaciente.objects.get(psicologo=self.psicologo, paciente=antigo).ultima_sessao,
+            consulta.data,
+        )
+
+
+class AgendaIcsTests(EstaticosColetadosMixin, DadosConsultasMixin, TestCase):
+    """Link e feed .ics da agenda do psicólogo (token na URL, ETag)."""
+
+    def test_token_so_e_criado_no_post(self):
+        self.client.force_login(self.psicologo.usuario.user)
+        resposta = self.client.get(reverse('psicologo:agenda_completa'))
+        self.assertIsNone(resposta.context['link_ics'])
+        self.assertIsNone(Psicologo.objects.get(pk=self.psicologo.pk).token_agenda)
+
+        self.client.post(reverse('psicologo:agenda_ics_novo_token'))
+        token = Psicologo.objects.get(pk=self.psicologo.pk).token_agenda
+        self.assertTrue(token)
+        resposta = self.client.get(reverse('psicologo:agenda_completa'))
+        self.assertTrue(resposta.context['link_ics'].endswith(reverse('psicologo:agenda_ics', args=[token])))
+
+    def test_etag_muda_com_o_nome_do_paciente(self):
+        url = reverse('psicologo:agenda_ics', args=[self.psicologo.obter_token_agenda()])
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        etag = resposta['ETag']
+        # Nada mudou: 304 com uma única query (o psicólogo pelo token)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        usuario = self.pacientes[0].usuario
+        usuario.nome = 'Nome Novo'
+        usuario.save()
+        resposta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+        self.assertIn('Nome Novo', b''.join(resposta.streaming_content).decode())
+
+
+class EstatisticasTests(DadosConsultasMixin, TestCase):
+    """Indicadores do ResumoMensal depois da rotina 'fechar_consultas_passadas'."""
+
+    def test_pendentes_expiradas_nao_contam_como_cancelamento(self):
+        hoje = date.today()
+        passadas = Consulta.objects.filter(psicologo=self.psicologo, data__lt=hoje)
+        pendentes = passadas.filter(status='pendente').count()
+        canceladas = passadas.filter(status='cancelada').count()
+        self.assertTrue(pendentes and canceladas)
+
+        estatisticas.reconstruir()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('fechar_consultas_passadas', stdout=StringIO())
+        _, periodo = estatisticas.resumo_do_periodo(self.psicologo, hoje=hoje)
+        gravados = set(ResumoMensal.objects.values_list('psicologo_id', 'mes', 'status', 'total'))
+        estatisticas.reconstruir()
+        self.assertEqual(gravados, set(ResumoMensal.objects.values_list('psicologo_id', 'mes', 'status', 'total')))
+
+        self.assertEqual((periodo['canceladas'], periodo['expiradas']), (canceladas, pendentes))
+        self.assertEqual(periodo['base_cancelamento'], periodo['total'] - pendentes)
+        self.assertEqual(periodo['taxa_cancelamento'], round(100 * canceladas / (periodo['total'] - pendentes), 1))
+
+
+class MidiaTests(DadosConsultasMixin, TestCase):
+    """Variantes das fotos (core/fotos.py) e a view de mídia (core/midia.py)."""
+
+    def setUp(self):
+        diretorio = tempfile.mkdtemp(prefix='midia-teste-')
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+
+        imagem = io.BytesIO()
+        Image.new('RGB', (400, 300), 'teal').save(imagem, 'PNG')
+        self.usuario = self.pacientes[0].usuario
+        self.usuario.foto_perfil.save('foto.png', ContentFile(imagem.getvalue()))
+        self.original = self.usuario.foto_perfil.name
+        self.assertTrue(fotos.gravar_variantes(self.usuario.pk, self.original, fotos.gerar_variantes(imagem.getvalue())))
+        self.variante = fotos.nome_variante(self.original, 'card')
+        self.url = reverse('midia', args=[self.variante])
+
+    def test_variante_tem_assinatura_e_nunca_e_regravada(self):
+        self.assertIn(f"-{fotos.ASSINATURA}-card.", self.variante)
+        self.assertEqual(list(Usuario.objects.filter(fotos.filtro_donos_da_variante(self.variante))), [self.usuario])
+        with default_storage.open(self.variante) as arquivo:
+            antes = arquivo.read()
+        fotos.gravar_variantes(self.usuario.pk, self.original, {'card': b'outro conteudo'})
+        with default_storage.open(self.variante) as arquivo:
+            self.assertEqual(arquivo.read(), antes)
+
+    def test_etag_304_range_e_416(self):
+        self.client.force_login(self.usuario.user)
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Cache-Control'], midia.CACHE_IMUTAVEL)
+        conteudo = b''.join(resposta.streaming_content)
+        etag = resposta['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        resposta = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(resposta.status_code, 206)
+        self.assertEqual(resposta['Content-Range'], f"bytes 0-9/{len(conteudo)}")
+        self.assertEqual(b''.join(resposta.streaming_content), conteudo[:10])
+
+        resposta = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(resposta.streaming_content), conteudo[-5:])
+
+        # If-Range com outro ETag: o arquivo inteiro
+        resposta = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outro"')
+        self.assertEqual(resposta.status_code, 200)
+
+        resposta = self.client.get(self.url, HTTP_RANGE=f'bytes={len(conteudo)}-')
+        self.assertEqual(resposta.status_code, 416)
+        self.assertEqual(resposta['Content-Range'], f"bytes */{len(conteudo)}")
+
+    def test_acesso(self):
+        # Psicólogo do paciente (roster) vê; outro paciente e o original não
+        self.client.force_login(self.psicologo.usuario.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.force_login(self.pacientes[1].usuario.user)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.usuario.user)
+        self.assertEqual(self.client.get(reverse('midia', args=[self.original])).status_code, 404)
+
+
+@override_settings(LOGIN_THROTTLE={'usuario': (3, 60), 'ip': (100, 60)})
+class LoginThrottleTests(EstaticosColetadosMixin, TestCase):
+    """Limite de tentativas de login (core/throttle.py) no formulário da conta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = criar_perfil('paciente', 0).usuario.user
+
+    def setUp(self):
+        # Os baldes guardam uma cópia local do estado, por processo
+        cache.clear()
+        throttle._baldes.clear()
+
+    def _entrar(self, senha, username='paciente0'):
+        return self.client.post(reverse('account_view'), {
+            'login_submit': '1', 'username': username, 'password': senha,
+        })
+
+    def test_balde_recarrega_com_o_tempo(self):
+        balde = throttle.BaldeDeFichas('teste', 3, 60)
+        self.assertEqual([balde.consumir('chave', agora=0) for _ in range(4)], [True, True, True, False])
+        # Uma ficha a cada 20 s
+        self.assertTrue(balde.consumir('chave', agora=20))
+        self.assertFalse(balde.consumir('chave', agora=21))
+        self.assertTrue(balde.consumir('outra', agora=21))
+
+    def test_excesso_e_recusado_sem_verificar_a_senha(self):
+        for _ in range(3):
+            self.assertEqual(self._entrar('errada').status_code, 200)
+        with mock.patch('django.contrib.auth.forms.authenticate') as autenticar:
+            resposta = self._entrar('senha-forte-123')
+        autenticar.assert_not_called()
+        self.assertContains(resposta, "Muitas tentativas de login")
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+        # O limite é por username: outro usuário entra normalmente
+        outro = criar_perfil('paciente', 1).usuario.user
+        self.assertEqual(self._entrar('senha-forte-123', outro.username).status_code, 302)
+
+    def test_login_correto_zera_o_limite(self):
+        for _ in range(2):
+            self._entrar('errada')
+        self.assertEqual(self._entrar('senha-forte-123').status_code, 302)
+        self.client.logout()
+        for _ in range(3):
+            self.assertNotContains(self._entrar('errada'), "Muitas tentativas de login")
+
+
+class ManifestoEstaticosTests(EstaticosColetadosMixin, DadosConsultasMixin, TestCase):
+    """Referências {% static %} contra o manifesto real do collectstatic."""
+
+    def test_toda_referencia_dos_templates_esta_no_manifesto(self):
+        referencias = set()
+        for diretorio in [*settings.TEMPLATES[0]['DIRS'], *(
+            os.path.join(app.path, 'templates') for app in apps.get_app_configs()
+            if app.path.startswith(str(settings.BASE_DIR))
+        )]:
+            for caminho in Path(diretorio).rglob('*.html'):
+                referencias |= set(re.findall(r"{%\s*static\s+'([^']+)'", caminho.read_text()))
+        self.assertTrue(referencias)
+        for nome in sorted(referencias):
+            with self.subTest(nome=nome):
+                # Levanta ValueError se o arquivo não estiver no manifesto
+                self.assertNotEqual(staticfiles_storage.url(nome), settings.STATIC_URL + nome)
+
+    def test_hash_no_nome_e_o_do_conteudo_gravado(self):
+        # Vale também para o CSS/JS minificado: o mesmo nome nunca serve outros bytes
+        minificados = 0
+        for nome, nome_com_hash in staticfiles_storage.hashed_files.items():
+            if not nome.endswith(('.css', '.js')):
+                continue
+            with self.subTest(nome=nome):
+                with staticfiles_storage.open(nome_com_hash) as arquivo:
+                    gravado = arquivo.read()
+                hash_no_nome = re.search(r'\.([0-9a-f]{12})\.[^.]+$', nome_com_hash).group(1)
+                self.assertEqual(hashlib.md5(gravado).hexdigest()[:12], hash_no_nome)
+                if storage._do_projeto(nome) and nome.endswith('.css'):
+                    with open(finders.find(nome), 'rb') as fonte:
+                        minificados += len(gravado) < len(fonte.read())
+        self.assertTrue(minificados, "nenhum CSS do projeto foi minificado")
+
+    def test_paginas_com_o_css_compartilhado(self):
+        sem_perfil = User.objects.create_user('sem-perfil', 'sem-perfil@exemplo.com', 'senha-forte-123')
+        casos = [
+            (sem_perfil, 'completar_perfil'),
+            (self.psicologo.usuario.user, 'agendar_consulta'),
+            (self.psicologo.usuario.user, 'editar_perfil'),
+            (self.pacientes[0].usuario.user, 'agendar_consulta'),
+        ]
+        css = staticfiles_storage.url('css/core/dashboard.css')
+        for user, nome in casos:
+            with self.subTest(user=user.username, pagina=nome):
+                self.client.force_login(user)
+                resposta = self.client.get(reverse(nome))
+                self.assertEqual(resposta.status_code, 200)
+                self.assertContains(resposta, css)
+
+
+class SinalUpdateConsultasTests(DadosConsultasMixin, TestCase):
+    """ConsultaQuerySet.update() avisa os (psicólogo, mês) de antes e de depois."""
+
+    def _capturar(self):
+        recebidos = []
+
+        def receptor(sender, **kwargs):
+            recebidos.append(kwargs['meses'])
+
+        consultas_alteradas_em_lote.connect(receptor, sender=Consulta)
+        self.addCleanup(consultas_alteradas_em_lote.disconnect, receptor, sender=Consulta)
+        return recebidos
+
+    def test_mudanca_de_data_avisa_mes_antigo_e_novo(self):
+        recebidos = self._capturar()
+        consulta = self.consulta
+        nova_data = (consulta.data.replace(day=1) - timedelta(days=40)).replace(day=10)
+        Consulta.objects.filter(pk=consulta.pk).update(data=nova_data)
+        self.assertEqual(recebidos, [{
+            (self.psicologo.pk, consulta.data.replace(day=1)),
+            (self.psicologo.pk, nova_data.replace(day=1)),
+        }])
+
+    def test_transicao_sem_linhas_alteradas_nao_avisa(self):
+        recebidos = self._capturar()
+        Consulta.objects.filter(pk=self.consulta.pk).transition('pendente')
+        self.assertEqual(recebidos, [])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class LembretesTests(TestCase):
+    """Worker de lembretes (core/reminders.py) com o backend de email em memória."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.psicologo = criar_perfil('psicologo', 0)
+        cls.paciente = criar_perfil('paciente', 0)
+
+    def setUp(self):
+        # Consulta daqui a 3 horas: só o lembrete de 2h cabe na janela
+        self.agora = timezone.now().replace(minute=0, second=0, microsecond=0)
+        inicio = timezone.localtime(self.agora + timedelta(hours=3))
+        self.consulta = Consulta.objects.create(
+            psicologo=self.psicologo, paciente=self.paciente,
+            data=inicio.date(), hora=inicio.time(), status='confirmada',
+        )
+
+    def test_envia_lembrete_vencido_uma_vez(self):
+        reminders.agendar_lembretes(self.agora)
+        lembrete = Lembrete.objects.get(consulta=self.consulta)
+        self.assertEqual(lembrete.tipo, '2h')
+
+        # Ainda não venceu
+        self.assertEqual(reminders.processar_ciclo(agora=self.agora), (0, 0, 0))
+        self.assertEqual(mail.outbox, [])
+
+        depois = self.agora + timedelta(hours=1, minutes=1)
+        self.assertEqual(reminders.processar_ciclo(agora=depois), (1, 0, 0))
+        self.assertEqual(reminders.processar_ciclo(agora=depois), (0, 0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.paciente.usuario.email])
+        self.assertEqual(Lembrete.objects.get(pk=lembrete.pk).status, 'enviado')
+
+    def test_consulta_cancelada_descarta_lembrete(self):
+        reminders.agendar_lembretes(self.agora)
+        Consulta.objects.filter(pk=self.consulta.pk).update(status='cancelada')
+        depois = self.agora + timedelta(hours=1, minutes=1)
+        self.assertEqual(reminders.processar_ciclo(agora=depois), (0, 1, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_falha_no_envio_espera_antes_de_tentar_de_novo(self):
+        reminders.agendar_lembretes(self.agora)
+        depois = self.agora + timedelta(hours=1, minutes=1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionRefusedError):
+            # Uma única tentativa no ciclo, não MAX_TENTATIVAS seguidas
+            self.assertEqual(reminders.processar_ciclo(agora=depois), (0, 0, 1))
+        lembrete = Lembrete.objects.get(consulta=self.consulta)
+        self.assertEqual((lembrete.status, lembrete.tentativas), ('pendente', 1))
+        self.assertEqual(lembrete.enviar_em, depois + reminders.ESPERA_NOVA_TENTATIVA)
+
+        # Antes da espera nada é reenviado; depois dela, o envio acontece
+        self.assertEqual(reminders.processar_ciclo(agora=depois + timedelta(minutes=1)), (0, 0, 0))
+        self.assertEqual(reminders.processar_ciclo(agora=lembrete.enviar_em), (1, 0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_remarcar_reprograma_lembrete_pendente(self):
+        reminders.agendar_lembretes(self.agora)
+        inicio = timezone.localtime(self.agora + timedelta(hours=5))
+        consulta = Consulta.objects.get(pk=self.consulta.pk)
+        consulta.data, consulta.hora = inicio.date(), inicio.time()
+        consulta.save()
+        lembrete = Lembrete.objects.get(consulta=self.consulta)
+        self.assertEqual(lembrete.enviar_em, self.agora + timedelta(hours=3))
+
+        # No horário antigo nada sai; no novo, o envio acontece
+        self.assertEqual(reminders.processar_ciclo(agora=self.agora + timedelta(hours=1, minutes=1)), (0, 0, 0))
+        self.assertEqual(reminders.processar_ciclo(agora=lembrete.enviar_em), (1, 0, 0))
+
+    def test_consulta_ja_comecada_descarta_lembrete(self):
+        reminders.agendar_lembretes(self.agora)
+        # Worker parado: o lembrete de 2h só é processado quando a consulta já começou
+        self.assertEqual(reminders.processar_ciclo(agora=self.agora + timedelta(hours=3)), (0, 1, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_consulta_antecipada_descarta_lembrete_fora_de_hora(self):
+        # Lembrete de 24h de uma consulta daqui a 25h...
+        inicio = timezone.localtime(self.agora + timedelta(hours=25))
+        Consulta.objects.filter(pk=self.consulta.pk).update(data=inicio.date(), hora=inicio.time())
+        reminders.agendar_lembretes(self.agora)
+        self.assertEqual(Lembrete.objects.get(consulta=self.consulta, tipo='24h').enviar_em,
+                         self.agora + timedelta(hours=1))
+        # ...antecipada para daqui a 4h sem passar pelo save (UPDATE direto)
+        inicio = timezone.localtime(self.agora + timedelta(hours=4))
+        Consulta.objects.filter(pk=self.consulta.pk).update(data=inicio.date(), hora=inicio.time())
+        depois = self.agora + timedelta(hours=1, minutes=1)
+        self.assertEqual(reminders.processar_ciclo(agora=depois), (0, 1, 0))
+        self.assertEqual(mail.outbox, [])
+
+
+class AgendamentoConcorrenteTests(TransactionTestCase):
+    """
+    Vários pacientes reservam o mesmo horário ao mesmo tempo: todos passam
+    pela validação do formulário (horário livre) e só então gravam. A
+    UniqueConstraint 'consulta_horario_unico' deixa exatamente um vencer; os
+    outros recebem IntegrityError, o caminho que a view transforma em erro
+    no formulário.
+    """
+
+    CONCORRENTES = 8
+
+    def setUp(self):
+        self.psicologo = criar_perfil('psicologo', 0)
+        self.pacientes = [criar_perfil('paciente', i) for i in range(self.CONCORRENTES)]
+        self.data = date.today() + timedelta(days=7)
+        # O SQLite já serializa as escritas, mas o banco de teste em memória
+        # (cache compartilhado) responde 'table is locked' em vez de esperar:
+        # lá só a gravação é serializada; a corrida entre validar e gravar fica
+        self.trava_escrita = threading.Lock() if connection.vendor == 'sqlite' else nullcontext()
+
+    def _reservar(self, paciente, barreira, resultados):
+        try:
+            form = ConsultaForm(
+                {'paciente': paciente.pk, 'psicologo': self.psicologo.pk,
+                 'data': self.data.isoformat(), 'hora': '10:00'},
+                role='paciente', profile=paciente,
+            )
+            valido = form.is_valid()
+            # Ninguém grava antes de todos terem validado
+            barreira.wait()
+            if not valido:
+                resultados.append('invalido')
+                return
+            try:
+                with self.trava_escrita:
+                    consulta_services.criar_consultas(form)
+            except IntegrityError:
+                resultados.append('recusado')
+            else:
+                resultados.append('criado')
+        except Exception as erro:
+            # Qualquer outra exceção seria um 500 na view
+            resultados.append(repr(erro))
+        finally:
+            connection.close()
+
+    def test_so_um_agendamento_vence(self):
+        barreira = threading.Barrier(self.CONCORRENTES, timeout=10)
+        resultados = []
+        threads = [
+            threading.Thread(target=self._reservar, args=(paciente, barreira, resultados))
+            for paciente in self.pacientes
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Todos validaram antes de qualquer gravação: os perdedores caem no
+        # IntegrityError, nenhum na validação nem em outra exceção
+        self.assertEqual(sorted(resultados), ['criado'] + ['recusado'] * (self.CONCORRENTES - 1))
+        self.assertEqual(
+            Consulta.objects.filter(psicologo=self.psicologo, data=self.data, hora=time(10)).count(), 1
+        )
+
+    def test_cancelada_libera_horario_e_ativa_bloqueia(self):
+        Consulta.objects.create(
+            psicologo=self.psicologo, paciente=self.pacientes[0],
+            data=self.data, hora=time(10), status='cancelada',
+        )
+        Consulta.objects.create(
+            psicologo=self.psicologo, paciente=self.pacientes[1],
+            data=self.data, hora=time(10),
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Consulta.objects.create(
+                psicologo=self.psicologo, paciente=self.pacientes[0],
+                data=self.data, hora=time(10),
+            )
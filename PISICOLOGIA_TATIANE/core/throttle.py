@@ -0,0 +1,119 @@
+# core/throttle.py
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# (capacidade, janela em segundos): 'capacidade' tentativas seguidas e depois
+# uma nova tentativa a cada janela/capacidade segundos. Sobrescreva em
+# settings.LOGIN_THROTTLE.
+LIMITES_PADRAO = {
+    'usuario': (5, 60),
+    'ip': (30, 60),
+}
+
+# Acima disso o dicionário local é podado (só chaves com balde cheio saem)
+MAX_CHAVES_LOCAIS = 10000
+
+
+class BaldeDeFichas:
+    """
+    Token bucket por chave (usuário, IP...).
+
+    O estado (fichas, instante) fica no cache, compartilhado entre processos,
+    e uma cópia fica na memória do processo. A cópia local nunca tem mais
+    fichas que o cache (outros processos só consomem), então se ela já está
+    vazia a tentativa é recusada sem nem consultar o cache.
+    get/set no cache não é atômico: sob concorrência entre processos alguns
+    pedidos a mais podem passar, o que é aceitável para este fim.
+    """
+
+    def __init__(self, nome, capacidade, janela):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.janela = janela
+        self.taxa = capacidade / janela
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _chave_cache(self, chave):
+        # Hash: a chave vem do usuário (tamanho e caracteres livres)
+        return f"throttle:{self.nome}:{hashlib.sha256(chave.encode()).hexdigest()}"
+
+    def _fichas(self, estado, agora):
+        fichas, visto_em = estado
+        return min(self.capacidade, fichas + max(0, agora - visto_em) * self.taxa)
+
+    def _podar(self, agora):
+        cheias = [chave for chave, estado in self._local.items()
+                  if self._fichas(estado, agora) >= self.capacidade]
+        for chave in cheias:
+            del self._local[chave]
+        if len(self._local) > MAX_CHAVES_LOCAIS:
+            self._local.clear()
+
+    def consumir(self, chave, agora=None):
+        """Gasta uma ficha de 'chave'. Retorna False se o balde estiver vazio."""
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            local = self._local.get(chave)
+            if local is not None and self._fichas(local, agora) < 1:
+                return False
+
+            estado = cache.get(self._chave_cache(chave)) or local or (self.capacidade, agora)
+            fichas = self._fichas(estado, agora)
+            permitido = fichas >= 1
+            novo = (fichas - 1 if permitido else fichas, agora)
+
+            if len(self._local) >= MAX_CHAVES_LOCAIS:
+                self._podar(agora)
+            self._local[chave] = novo
+
+        if permitido:
+            cache.set(self._chave_cache(chave), novo, timeout=math.ceil(self.janela) + 1)
+        return permitido
+
+    def liberar(self, chave):
+        """Enche de novo o balde de 'chave' (ex: depois de um login correto)."""
+        with self._lock:
+            self._local.pop(chave, None)
+        cache.delete(self._chave_cache(chave))
+
+
+_baldes = {}
+_baldes_lock = threading.Lock()
+
+
+def balde(nome):
+    """Balde de login configurado em settings.LOGIN_THROTTLE (um por processo)."""
+    limites = {**LIMITES_PADRAO, **getattr(settings, 'LOGIN_THROTTLE', {})}
+    capacidade, janela = limites[nome]
+    with _baldes_lock:
+        atual = _baldes.get(nome)
+        if atual is None or (atual.capacidade, atual.janela) != (capacidade, janela):
+            atual = _baldes[nome] = BaldeDeFichas(nome, capacidade, janela)
+        return atual
+
+
+def ip_do_request(request):
+    # Atrás de um proxy reverso, configure-o para preencher REMOTE_ADDR
+    # (não confiamos em X-Forwarded-For vindo do cliente)
+    return request.META.get('REMOTE_ADDR') or 'desconhecido'
+
+
+def permitir_login(request, username):
+    """
+    Consome uma ficha do IP e outra do username. Deve ser chamada antes de
+    verificar a senha, para que tentativas em excesso não custem um hash.
+    """
+    if request is not None and not balde('ip').consumir(ip_do_request(request)):
+        return False
+    return balde('usuario').consumir((username or '').strip().lower())
+
+
+def login_bem_sucedido(username):
+    """Zera o limite do username: erros anteriores do dono não contam mais."""
+    balde('usuario').liberar((username or '').strip().lower())
@@ -10,6 +10,7 @@ urlpatterns = [
     path('conta/completar-perfil/', views.completar_perfil_view, name='completar_perfil'),
     
     path('agendar-consulta/', views.agendar_consulta_view, name='agendar_consulta'),
+    path('api/disponibilidade/<int:psicologo_id>/', views.disponibilidade_view, name='disponibilidade'),
     
     path('meu-perfil/', views.meu_perfil, name='meu_perfil'),
     path('editar-perfil/', views.editar_perfil_view, name='editar_perfil'),
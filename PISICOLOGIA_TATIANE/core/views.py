@@ -1,14 +1,20 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
-from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
-from .forms import CustomUserCreationForm
-from django.contrib.auth.decorators import login_required
+from .forms import CustomUserCreationForm, LoginForm
 from django.contrib.auth.decorators import login_required
+from .decorators import perfil_required
 
-from . import auth_services
+from . import auth_services, consulta_services, midia, perfil_services
 from .forms import UsuarioProfileForm, PacienteProfileForm, PsicologoProfileForm, ConsultaForm, FotoPerfilForm
 from django.contrib import messages
-
+from django.db import IntegrityError
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_safe
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+
+from .availability import horarios_livres
 from .models import Usuario
 
 # Create your views here.
@@ -35,7 +41,7 @@ def account_view(request):
             active_form = 'register'
             # Chama o serviço de cadastro
             redirect_response, register_form = auth_services.handle_register_post(request)
-            login_form = AuthenticationForm() # Cria um form de login vazio
+            login_form = LoginForm() # Cria um form de login vazio
             auth_services.add_login_form_placeholders(login_form)
         
         # Se o login ou cadastro foi BEM SUCEDIDO, o serviço retornou um redirect
@@ -44,7 +50,7 @@ def account_view(request):
 
     else:
         # GET: Cria formulários vazios e adiciona placeholders
-        login_form = AuthenticationForm()
+        login_form = LoginForm()
         register_form = CustomUserCreationForm()
         auth_services.add_login_form_placeholders(login_form)
         auth_services.add_register_form_placeholders(register_form)
@@ -62,11 +68,10 @@ def account_view(request):
 def completar_perfil_view(request):
     
     # Se o usuário já completou o perfil, manda embora
-    if hasattr(request.user, 'usuario'):
-        if hasattr(request.user.usuario, 'paciente'):
-            return redirect('paciente:dashboard')
-        elif hasattr(request.user.usuario, 'psicologo'):
-            return redirect('psicologo:dashboard')
+    if request.role == 'paciente':
+        return redirect('paciente:dashboard')
+    elif request.role == 'psicologo':
+        return redirect('psicologo:dashboard')
             
     # Variável para o template saber qual radio 'checar'
     profile_type = 'paciente' # Padrão
@@ -75,47 +80,26 @@ def completar_perfil_view(request):
         # Pega o tipo de perfil escolhido (do radio button)
         profile_type = request.POST.get('profile_type')
         
-        # Pega o formulário comum
-        usuario_form = UsuarioProfileForm(request.POST)
-
-        if profile_type == 'paciente':
-            paciente_form = PacienteProfileForm(request.POST)
-            psicologo_form = PsicologoProfileForm() # Vazio
-
-            # Valida o form comum E o de paciente
-            if usuario_form.is_valid() and paciente_form.is_valid():
-                # Salva o Usuario
-                usuario_profile = usuario_form.save(commit=False)
-                usuario_profile.user = request.user
-                usuario_profile.email = request.user.email
-                usuario_profile.save()
-
-                # Salva o Paciente
-                paciente_profile = paciente_form.save(commit=False)
-                paciente_profile.usuario = usuario_profile
-                paciente_profile.save()
-
-                return redirect('paciente:dashboard')
-
-        elif profile_type == 'psicologo':
-            psicologo_form = PsicologoProfileForm(request.POST)
-            paciente_form = PacienteProfileForm() # Vazio
-
-            # Valida o form comum E o de psicólogo
-            if usuario_form.is_valid() and psicologo_form.is_valid():
-                # Salva o Usuario
-                usuario_profile = usuario_form.save(commit=False)
-                usuario_profile.user = request.user
-                usuario_profile.email = request.user.email
-                usuario_profile.save()
-
-                # Salva o Psicologo
-                psicologo_profile = psicologo_form.save(commit=False)
-                psicologo_profile.usuario = usuario_profile
-                psicologo_profile.save()
-
-                return redirect('psicologo:dashboard')
-        
+        # Pega o formulário comum (cpf único é garantido pelo banco, no serviço)
+        usuario_form = UsuarioProfileForm(request.POST, validar_unicos=False)
+
+        if profile_type in ('paciente', 'psicologo'):
+            if profile_type == 'paciente':
+                paciente_form = PacienteProfileForm(request.POST)
+                psicologo_form = PsicologoProfileForm() # Vazio
+                perfil_form = paciente_form
+            else:
+                psicologo_form = PsicologoProfileForm(request.POST, validar_unicos=False)
+                paciente_form = PacienteProfileForm() # Vazio
+                perfil_form = psicologo_form
+
+            # Valida o form comum E o do perfil escolhido
+            if usuario_form.is_valid() and perfil_form.is_valid():
+                # Usuario + Paciente/Psicologo em uma transação; reenviar é seguro
+                papel, _ = perfil_services.completar_perfil(request.user, usuario_form, perfil_form)
+                if papel is not None:
+                    return redirect(f'{papel}:dashboard')
+
         else:
             # Erro: Nenhum tipo de perfil foi selecionado
             usuario_form.add_error(None, "Por favor, selecione um tipo de perfil.")
@@ -142,35 +126,36 @@ def logout_view(request):
     # como definido no seu LOGOUT_REDIRECT_URL
     return redirect('home')
 
-@login_required
+@perfil_required # 1. Se o usuário não tem perfil, manda completar.
 def agendar_consulta_view(request):
-    # 1. Checa se o usuário tem perfil. Se não, manda completar.
-    if not hasattr(request.user, 'usuario'):
-        messages.error(request, 'Você precisa completar seu perfil antes de agendar consultas.')
-        return redirect('completar_perfil')
-
     if request.method == 'POST':
-        # 2. Passa o 'user' E os dados do 'POST' para o formulário
-        form = ConsultaForm(request.POST, user=request.user)
+        # 2. Passa o papel/perfil E os dados do 'POST' para o formulário
+        form = ConsultaForm(request.POST, role=request.role, profile=request.profile)
         if form.is_valid():
-            nova_consulta = form.save(commit=False)
-            
             # O status padrão já é 'pendente' (definido no models.py)
-            # Mas podemos ser explícitos se quisermos:
-            # nova_consulta.status = 'pendente' 
-            
-            nova_consulta.save()
-            messages.success(request, 'Consulta agendada com sucesso! Aguardando confirmação.')
             
-            # 3. Redireciona para o dashboard correto
-            if hasattr(request.user.usuario, 'paciente'):
-                return redirect('paciente:dashboard')
+            # A UniqueConstraint 'consulta_horario_unico' é a garantia final:
+            # se outro agendamento ocupou o horário entre a validação e o
+            # INSERT, o banco recusa e mostramos o conflito no formulário.
+            try:
+                criadas = consulta_services.criar_consultas(form)
+            except IntegrityError:
+                form.add_error('hora', 'Este horário acabou de ser reservado. Por favor, escolha outro.')
             else:
-                return redirect('psicologo:dashboard')
+                if len(criadas) > 1:
+                    messages.success(request, f'{len(criadas)} consultas agendadas com sucesso! Aguardando confirmação.')
+                else:
+                    messages.success(request, 'Consulta agendada com sucesso! Aguardando confirmação.')
+                
+                # 3. Redireciona para o dashboard correto
+                if request.role == 'paciente':
+                    return redirect('paciente:dashboard')
+                else:
+                    return redirect('psicologo:dashboard')
     
     else:
-        # 4. É um GET: Cria um form em branco, passando o 'user'
-        form = ConsultaForm(user=request.user)
+        # 4. É um GET: Cria um form em branco, passando o papel/perfil
+        form = ConsultaForm(role=request.role, profile=request.profile)
 
     context = {
         'form': form
@@ -195,7 +180,12 @@ def meu_perfil(request):
         # (Podemos adicionar um name="submit_foto" ao botão depois)
         foto_form = FotoPerfilForm(request.POST, request.FILES, instance=usuario_profile)
         if foto_form.is_valid():
-            foto_form.save()
+            # As variantes (avatar, card, full), sem EXIF, são geradas pelo worker
+            # processar_fotos; até lá as páginas mostram a foto padrão
+            usuario_profile = foto_form.save(commit=False)
+            usuario_profile.foto_variantes_prontas = False
+            usuario_profile.foto_falhas = 0
+            usuario_profile.save()
             messages.success(request, 'Foto de perfil atualizada com sucesso!')
             # Redireciona para a mesma página para evitar reenvio do form
             return redirect('meu_perfil') 
@@ -204,14 +194,9 @@ def meu_perfil(request):
             # exibe a página novamente com os erros
              messages.error(request, 'Erro ao atualizar a foto.')
 
-    # --- Lógica existente para buscar paciente/psicologo ---
-    paciente_profile = None
-    psicologo_profile = None
-    if hasattr(usuario_profile, 'paciente'):
-        paciente_profile = usuario_profile.paciente
-    elif hasattr(usuario_profile, 'psicologo'):
-        psicologo_profile = usuario_profile.psicologo
-    # --- Fim da lógica existente ---
+    # Perfil específico já resolvido pelo PerfilMiddleware
+    paciente_profile = request.profile if request.role == 'paciente' else None
+    psicologo_profile = request.profile if request.role == 'psicologo' else None
 
     context = {
         'usuario': usuario_profile,
@@ -230,9 +215,9 @@ def editar_perfil_view(request):
         messages.warning(request, 'Você precisa completar seu perfil para poder editá-lo.')
         return redirect('completar_perfil')
 
-    # Busca o perfil específico (Paciente ou Psicologo) se existir
-    paciente_profile = getattr(usuario_profile, 'paciente', None)
-    psicologo_profile = getattr(usuario_profile, 'psicologo', None)
+    # Perfil específico (Paciente ou Psicologo), já resolvido pelo PerfilMiddleware
+    paciente_profile = request.profile if request.role == 'paciente' else None
+    psicologo_profile = request.profile if request.role == 'psicologo' else None
 
     if request.method == 'POST':
         # Cria os formulários com os dados do POST E a instância atual para edição
@@ -284,4 +269,43 @@ def editar_perfil_view(request):
         'psicologo_form': psicologo_form, # Será None se não for psicólogo
     }
     # Vamos criar este template a seguir
-    return render(request, 'core/editar_perfil.html', context)
\ No newline at end of file
+    return render(request, 'core/editar_perfil.html', context)
+
+@login_required
+def disponibilidade_view(request, psicologo_id):
+    """
+    Retorna em JSON os horários livres de um psicólogo.
+    Parâmetros (opcionais): ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD (padrão: próximos 30 dias).
+    """
+    hoje = timezone.localdate()
+    try:
+        inicio = parse_date(request.GET.get('inicio', '')) or hoje
+        fim = parse_date(request.GET.get('fim', '')) or inicio + timedelta(days=30)
+    except ValueError:
+        return JsonResponse({'erro': 'Data inválida.'}, status=400)
+
+    if fim < inicio or (fim - inicio).days > 62:
+        return JsonResponse({'erro': 'Período inválido (máximo de 62 dias).'}, status=400)
+
+    horarios = [
+        {
+            'data': slot['data'].isoformat(),
+            'hora': slot['hora'].strftime('%H:%M'),
+            'clinica_id': slot['clinica_id'],
+            'clinica': slot['clinica'],
+        }
+        for slot in horarios_livres(psicologo_id, max(inicio, hoje), fim)
+    ]
+    return JsonResponse({'psicologo': psicologo_id, 'horarios': horarios})
+
+
+@require_safe
+def midia_view(request, caminho):
+    """
+    Serve os arquivos de MEDIA_URL (fotos de perfil) com controle de acesso:
+    a própria foto e as de quem tem consulta com o usuário. Quem não pode
+    ver recebe 404, como se o arquivo não existisse.
+    """
+    if not midia.pode_ver(request.user, caminho):
+        raise Http404
+    return midia.servir_arquivo(request, caminho)
@@ -0,0 +1,66 @@
+# paciente/dashboard.py
+from django.db.models import Case, CharField, F, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from core.models import Consulta
+
+# Quantas consultas cada seção do dashboard mostra
+LIMITES = {
+    'futura': 3,
+    'realizada': 5,
+    'cancelada': 3,
+}
+
+
+def consultas_do_dashboard(paciente, agora=None):
+    """
+    Próximas consultas, últimas realizadas e últimas canceladas do paciente
+    em uma única query: cada consulta recebe a sua seção ('secao') e a
+    posição dentro dela (ROW_NUMBER() OVER (PARTITION BY secao ...)), e só
+    as primeiras de cada seção voltam do banco, já com o psicólogo.
+    Retorna um dict com 'consultas_futuras', 'consultas_realizadas' e
+    'consultas_canceladas'.
+    """
+    agora = agora or timezone.now()
+    hoje, hora_atual = agora.date(), agora.time()
+
+    # Pendentes/confirmadas a partir de agora (as de hoje que já passaram ficam de fora)
+    futura = Q(status__in=['confirmada', 'pendente']) & (
+        Q(data__gt=hoje) | Q(data=hoje, hora__gte=hora_atual)
+    )
+    # O WHERE já deixa só as futuras entre as pendentes/confirmadas, então
+    # basta o status para saber a seção
+    ativas = Q(status__in=['confirmada', 'pendente'])
+    secao = Case(When(ativas, then=Value('futura')), default=F('status'), output_field=CharField())
+    # Futuras em ordem crescente; realizadas e canceladas, das mais recentes
+    # para as mais antigas (nas futuras as duas primeiras chaves já decidem)
+    data_futura = Case(When(ativas, then=F('data')))
+    hora_futura = Case(When(ativas, then=F('hora')))
+
+    consultas = (
+        Consulta.objects.filter(paciente=paciente)
+        .filter(futura | Q(status__in=['realizada', 'cancelada']))
+        .select_related('psicologo__usuario')
+        .annotate(
+            secao=secao,
+            posicao=Window(
+                RowNumber(),
+                partition_by=[secao],
+                order_by=[data_futura.asc(), hora_futura.asc(), F('data').desc(), F('hora').desc()],
+            ),
+        )
+        .filter(posicao__lte=max(LIMITES.values()))
+        .order_by('secao', 'posicao')
+    )
+
+    secoes = {nome: [] for nome in LIMITES}
+    for consulta in consultas:
+        if consulta.posicao <= LIMITES[consulta.secao]:
+            secoes[consulta.secao].append(consulta)
+
+    return {
+        'consultas_futuras': secoes['futura'],
+        'consultas_realizadas': secoes['realizada'],
+        'consultas_canceladas': secoes['cancelada'],
+    }
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PsicologoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'psicologo'
+
+    def ready(self):
+        # Versão do snapshot do dashboard
+        from . import signals  # noqa: F401
@@ -0,0 +1,72 @@
+# psicologo/dashboard.py
+from django.core.cache import cache
+from django.utils import timezone
+
+from django.db.models import F
+
+from core.models import Consulta, Psicologo, PsicologoPaciente
+
+# A chave muda com Psicologo.versao_agenda, que os signals sobem
+# (psicologo/signals.py); o tempo de vida só limita o espaço ocupado pelos
+# snapshots antigos e o estrago se algum caminho escapar dos signals.
+TEMPO_CACHE = 60 * 15
+
+
+def _chave(psicologo, dia):
+    return f'psicologo:dashboard:{psicologo.pk}:{psicologo.versao_agenda}:{dia.isoformat()}'
+
+
+def montar_snapshot(psicologo_id, dia):
+    """Lê do banco tudo o que o dashboard mostra, já com os joins necessários."""
+    consultas_hoje = list(
+        Consulta.objects.filter(
+            psicologo_id=psicologo_id,
+            data=dia,
+            status__in=['confirmada', 'pendente'],
+        )
+        .select_related('paciente__usuario')
+        .order_by('hora')
+    )
+    meus_pacientes = [
+        linha.paciente
+        for linha in PsicologoPaciente.objects.filter(psicologo_id=psicologo_id)
+        .select_related('paciente__usuario')
+        .order_by('paciente_nome', 'id')
+    ]
+    # Consultas confirmadas que já passaram e ainda não foram fechadas
+    # (marcadas pelo comando 'fechar_consultas_passadas')
+    total_a_fechar = Consulta.objects.filter(
+        psicologo_id=psicologo_id,
+        status='confirmada',
+        fechamento_pendente=True,
+    ).count()
+    return {
+        'consultas_hoje': consultas_hoje,
+        'meus_pacientes': meus_pacientes,
+        'total_a_fechar': total_a_fechar,
+    }
+
+
+def obter_snapshot(psicologo):
+    """
+    Snapshot do dashboard do dia, do cache quando possível. 'psicologo' é o
+    perfil carregado na requisição: a versão dele diz qual snapshot vale.
+    """
+    dia = timezone.localdate()
+    chave = _chave(psicologo, dia)
+    snapshot = cache.get(chave)
+    if snapshot is None:
+        snapshot = montar_snapshot(psicologo.pk, dia)
+        cache.set(chave, snapshot, TEMPO_CACHE)
+    return snapshot
+
+
+def invalidar(psicologo_ids):
+    """
+    Sobe a versão da agenda dos psicólogos informados. Vai pelo banco, e não
+    por cache.delete: o cache é local a cada processo, e a mudança pode vir
+    de outro (worker, comandos de manutenção).
+    """
+    psicologo_ids = {psicologo_id for psicologo_id in psicologo_ids if psicologo_id}
+    if psicologo_ids:
+        Psicologo.objects.filter(pk__in=psicologo_ids).update(versao_agenda=F('versao_agenda') + 1)
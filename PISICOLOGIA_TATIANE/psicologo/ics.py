@@ -0,0 +1,73 @@
+# psicologo/ics.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from core.availability import DURACAO_SESSAO_MINUTOS
+
+# Status da consulta -> STATUS do VEVENT (RFC 5545)
+STATUS_ICS = {
+    'pendente': 'TENTATIVE',
+    'aguardando_remarcacao': 'TENTATIVE',
+    'confirmada': 'CONFIRMED',
+    'realizada': 'CONFIRMED',
+    'cancelada': 'CANCELLED',
+}
+
+
+def _escapar(texto):
+    """Escapa um valor de texto para o formato iCalendar."""
+    return (
+        str(texto).replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _linha(texto):
+    """Dobra a linha em blocos de 75 octetos e termina com CRLF."""
+    dados = texto.encode('utf-8')
+    partes = []
+    while len(dados) > 75:
+        corte = 75 if not partes else 74
+        # Não corta no meio de um caractere UTF-8
+        while corte > 0 and (dados[corte] & 0xC0) == 0x80:
+            corte -= 1
+        partes.append(dados[:corte])
+        dados = dados[corte:]
+    partes.append(dados)
+    return b'\r\n '.join(partes) + b'\r\n'
+
+
+def _utc(data, hora):
+    local = timezone.make_aware(datetime.combine(data, hora), timezone.get_current_timezone())
+    return local.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def gerar_ics(psicologo, consultas, dominio):
+    """
+    Gera o calendário linha a linha (bytes), para ser usado com
+    StreamingHttpResponse. 'consultas' deve ser um iterador.
+    """
+    duracao = timedelta(minutes=DURACAO_SESSAO_MINUTOS)
+    agora = timezone.now().astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    yield _linha('BEGIN:VCALENDAR')
+    yield _linha('VERSION:2.0')
+    yield _linha('PRODID:-//Psicologia Tatiane//Agenda//PT-BR')
+    yield _linha('CALSCALE:GREGORIAN')
+    yield _linha(f'X-WR-CALNAME:{_escapar("Agenda - " + psicologo.usuario.nome)}')
+
+    for consulta in consultas:
+        fim = datetime.combine(consulta.data, consulta.hora) + duracao
+        yield _linha('BEGIN:VEVENT')
+        yield _linha(f'UID:consulta-{consulta.id_consulta}@{dominio}')
+        yield _linha(f'DTSTAMP:{agora}')
+        yield _linha(f'DTSTART:{_utc(consulta.data, consulta.hora)}')
+        yield _linha(f'DTEND:{_utc(fim.date(), fim.time())}')
+        yield _linha(f'SUMMARY:{_escapar("Consulta - " + consulta.paciente.usuario.nome)}')
+        yield _linha(f'STATUS:{STATUS_ICS.get(consulta.status, "TENTATIVE")}')
+        if consulta.observacao:
+            yield _linha(f'DESCRIPTION:{_escapar(consulta.observacao)}')
+        yield _linha('END:VEVENT')
+
+    yield _linha('END:VCALENDAR')
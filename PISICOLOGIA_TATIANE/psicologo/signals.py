@@ -0,0 +1,45 @@
+# psicologo/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Consulta, Paciente, Psicologo, Usuario
+from core.signals import consultas_alteradas_em_lote
+
+from . import dashboard
+
+
+# A versão da agenda sobe na mesma transação da mudança: um leitor
+# concorrente vê ou os dados e a versão antigos, ou os novos, e nunca
+# guarda dados antigos sob a versão nova.
+
+@receiver([post_save, post_delete], sender=Consulta)
+def consulta_alterada(sender, instance, **kwargs):
+    dashboard.invalidar([instance.psicologo_id])
+
+
+@receiver(consultas_alteradas_em_lote, sender=Consulta)
+def consultas_alteradas(sender, psicologo_ids, **kwargs):
+    dashboard.invalidar(psicologo_ids)
+
+
+# Nome e plano do paciente aparecem no dashboard de quem o atende, e o nome também no feed .ics
+
+@receiver([post_save, post_delete], sender=Paciente)
+def paciente_alterado(sender, instance, **kwargs):
+    dashboard.invalidar(
+        Consulta.objects.filter(paciente_id=instance.pk)
+        .values_list('psicologo_id', flat=True).distinct()
+    )
+
+
+@receiver([post_save, post_delete], sender=Usuario)
+def usuario_alterado(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    # De um paciente: os psicólogos que o atendem; de um psicólogo: ele
+    # mesmo (o nome vai no feed .ics)
+    dashboard.invalidar([
+        *Consulta.objects.filter(paciente__usuario_id=instance.pk)
+        .values_list('psicologo_id', flat=True).distinct(),
+        *Psicologo.objects.filter(usuario_id=instance.pk).values_list('pk', flat=True),
+    ])
@@ -8,10 +8,16 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     
     path('agenda/', views.agenda_completa, name='agenda_completa'),
+    path('agenda/<str:token>.ics', views.agenda_ics, name='agenda_ics'),
+    path('agenda/ics/novo-link/', views.agenda_ics_novo_token, name='agenda_ics_novo_token'),
     path('diagnosticos/listar/', views.listar_consultas_diagnostico, name='listar_consultas_diagnostico'),
     path('diagnosticos/registrar/<int:consulta_id>/', views.registrar_diagnostico, name='registrar_diagnostico'),
     path('consulta/<int:consulta_id>/detalhes/', views.consulta_detalhes, name='consulta_detalhes'),
     path('consulta/<int:consulta_id>/atualizar/<str:novo_status>/', views.atualizar_status_consulta, name='atualizar_status_consulta'),
+    path('consulta/<int:consulta_id>/serie/cancelar/', views.serie_cancelar, name='serie_cancelar'),
+    path('consulta/<int:consulta_id>/serie/alterar-hora/', views.serie_alterar_hora, name='serie_alterar_hora'),
+    path('consultas/atualizar-status/', views.atualizar_status_em_lote, name='atualizar_status_em_lote'),
     path('pacientes/', views.meus_pacientes, name='meus_pacientes'),
     path('paciente/<int:paciente_id>/historico/', views.paciente_historico, name='paciente_historico'),
+    path('estatisticas/', views.estatisticas_view, name='estatisticas'),
 ]
\ No newline at end of file
@@ -1,83 +1,115 @@
 # psicologo/views.py
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from core.decorators import psicologo_required
 from django.views.decorators.http import require_POST
-from django.utils import timezone
-from core.models import Consulta, Paciente 
-from django.core.paginator import Paginator
+from core.models import Consulta, Paciente, Psicologo, PsicologoPaciente
+from core.pagination import KeysetPaginator
 from .forms import DiagnosticoForm 
 from django.contrib import messages
-
-@login_required
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.utils.dateparse import parse_time
+from core import consulta_services, estatisticas
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from .ics import gerar_ics
+from . import dashboard as dashboard_snapshot
+
+@psicologo_required
 def dashboard(request):
-    # Proteção: Se não for psicólogo, manda para completar o perfil
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         return redirect('completar_perfil')
-
-    psicologo_obj = request.user.usuario.psicologo
-    hoje = timezone.now().date()
-    
-    # 1. Busca as consultas de hoje
-    consultas_hoje = Consulta.objects.filter(
-        psicologo=psicologo_obj, 
-        data=hoje,
-        status__in=['confirmada', 'pendente'] # Filtra só o que importa
-    ).order_by('hora')
-    
-    # 2. Busca todos os pacientes únicos deste psicólogo
-    pacientes_ids = Consulta.objects.filter(
-        psicologo=psicologo_obj
-    ).values_list('paciente_id', flat=True).distinct()
-    
-    meus_pacientes = Paciente.objects.filter(id__in=pacientes_ids)
+    psicologo_obj = request.profile
 
+    # Consultas de hoje, pacientes e pendências de fechamento vêm de um
+    # snapshot em cache, trocado quando consultas ou pacientes mudam
     context = {
         'psicologo': psicologo_obj,
-        'consultas_hoje': consultas_hoje,
-        'meus_pacientes': meus_pacientes
+        **dashboard_snapshot.obter_snapshot(psicologo_obj),
     }
     return render(request, 'psicologo/dashboard.html', context)
 
-@login_required
+@psicologo_required
 def agenda_completa(request):
-    # Proteção: Garante que é um psicólogo
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         return redirect('completar_perfil')
-
-    psicologo_obj = request.user.usuario.psicologo
+    psicologo_obj = request.profile
     
-    # Busca TODAS as consultas, ordenadas da mais recente para a mais antiga
+    # Busca TODAS as consultas, da mais recente para a mais antiga
     lista_consultas = Consulta.objects.filter(
         psicologo=psicologo_obj
-    ).order_by('-data', '-hora') # '-' ordena decrescente
+    ).select_related('paciente__usuario')
     
-    # Configura a paginação: 10 consultas por página
-    paginator = Paginator(lista_consultas, 10) 
+    # Paginação por cursor: 10 consultas por página, ordenadas por
+    # ('-data', '-hora') com o id como desempate
+    paginator = KeysetPaginator(lista_consultas, ('-data', '-hora', '-id_consulta'), 10)
     
-    # Pega o número da página da URL (ex: ?page=2)
-    page_number = request.GET.get('page')
-    
-    # Obtém o objeto Page correspondente
-    page_obj = paginator.get_page(page_number)
+    # Pega o cursor da URL (ex: ?cursor=...)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+
+    # Link do feed .ics para assinar a agenda no app de calendário. O token
+    # só é criado no POST de agenda_ics_novo_token: o GET não grava nada
+    link_ics = None
+    if psicologo_obj.token_agenda:
+        link_ics = request.build_absolute_uri(
+            reverse('psicologo:agenda_ics', args=[psicologo_obj.token_agenda])
+        )
 
     context = {
-        'page_obj': page_obj # Envia o objeto Page para o template
+        'page_obj': page_obj, # Envia o objeto Page para o template
+        'link_ics': link_ics,
     }
     # Vamos criar este template a seguir
     return render(request, 'psicologo/agenda_completa.html', context)
 
-@login_required
+def agenda_ics(request, token):
+    """
+    Feed iCalendar da agenda do psicólogo, autenticado pelo token da URL
+    (apps de calendário não fazem login). Responde 304 se nada mudou
+    desde a última sincronização e, caso contrário, envia as consultas
+    em streaming, sem carregar a agenda inteira na memória.
+    """
+    psicologo_obj = get_object_or_404(Psicologo.objects.select_related('usuario'), token_agenda=token)
+
+    # ETag sem query extra: Psicologo.versao_agenda sobe a cada mudança nas
+    # consultas, nos nomes dos pacientes e no nome do próprio psicólogo
+    etag = quote_etag(f"{psicologo_obj.pk}-{psicologo_obj.versao_agenda}")
+    resposta_condicional = get_conditional_response(request, etag=etag)
+    if resposta_condicional is not None:
+        return resposta_condicional
+
+    linhas = (
+        Consulta.objects.filter(psicologo=psicologo_obj).select_related('paciente__usuario')
+        .only('id_consulta', 'data', 'hora', 'status', 'observacao', 'paciente__usuario__nome')
+        .order_by('data', 'hora')
+        .iterator(chunk_size=500)
+    )
+    response = StreamingHttpResponse(
+        gerar_ics(psicologo_obj, linhas, request.get_host().split(':')[0]),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['ETag'] = etag
+    response['Content-Disposition'] = 'inline; filename="agenda.ics"'
+    return response
+
+@psicologo_required
+@require_POST
+def agenda_ics_novo_token(request):
+    """Cria o token do feed .ics ou troca o atual (o link antigo deixa de funcionar)."""
+    if request.profile.token_agenda:
+        request.profile.obter_token_agenda(renovar=True)
+        messages.success(request, "Novo link do calendário gerado. Atualize a assinatura no seu app de calendário.")
+    else:
+        request.profile.obter_token_agenda()
+        messages.success(request, "Link do calendário gerado. Use-o para assinar a agenda no seu app de calendário.")
+    return redirect('psicologo:agenda_completa')
+
+@psicologo_required
 def consulta_detalhes(request, consulta_id):
     """Exibe os detalhes de uma consulta específica e as ações possíveis."""
-    # Garante que o usuário é um psicólogo
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         return redirect('completar_perfil')
-
     # Busca a consulta, garantindo que pertence ao psicólogo logado
     consulta = get_object_or_404(
-        Consulta, 
+        Consulta.objects.select_related('paciente__usuario'),
         id_consulta=consulta_id, 
-        psicologo=request.user.usuario.psicologo
+        psicologo=request.profile
     )
     
     # Busca diagnósticos já registrados para esta consulta
@@ -90,19 +122,16 @@ def consulta_detalhes(request, consulta_id):
     # Vamos criar este template a seguir
     return render(request, 'psicologo/consulta_detalhes.html', context)
 
-@login_required
+@psicologo_required
 def listar_consultas_diagnostico(request):
     """Mostra as consultas realizadas para que o psicólogo escolha qual diagnosticar."""
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         return redirect('completar_perfil')
-
-    psicologo_obj = request.user.usuario.psicologo
+    psicologo_obj = request.profile
     
     # Busca consultas realizadas, ordenadas por data
     consultas_realizadas = Consulta.objects.filter(
         psicologo=psicologo_obj,
         status='realizada' # Só permite diagnosticar consultas concluídas
-    ).order_by('-data', '-hora')
+    ).select_related('paciente__usuario').order_by('-data', '-hora')
     
     # (Opcional: Adicionar paginação aqui também, se a lista for longa)
 
@@ -112,15 +141,15 @@ def listar_consultas_diagnostico(request):
     return render(request, 'psicologo/listar_consultas_diagnostico.html', context)
 
 
-@login_required
+@psicologo_required
 def registrar_diagnostico(request, consulta_id):
     """Exibe o formulário para registrar um diagnóstico para uma consulta específica."""
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         return redirect('completar_perfil')
-
     # Busca a consulta específica ou retorna erro 404 se não existir
     # Garante também que a consulta pertence ao psicólogo logado
-    consulta = get_object_or_404(Consulta, id_consulta=consulta_id, psicologo=request.user.usuario.psicologo)
+    consulta = get_object_or_404(
+        Consulta.objects.select_related('paciente__usuario'),
+        id_consulta=consulta_id, psicologo=request.profile,
+    )
     
     # Não permitir diagnosticar consulta que não foi realizada
     if consulta.status != 'realizada':
@@ -147,23 +176,10 @@ def registrar_diagnostico(request, consulta_id):
     }
     return render(request, 'psicologo/registrar_diagnostico.html', context)
 
-@login_required
+@psicologo_required
 @require_POST # Garante que esta view só aceita requisições POST
 def atualizar_status_consulta(request, consulta_id, novo_status):
     """Atualiza o status de uma consulta específica."""
-    # Garante que o usuário é um psicólogo
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         # Teoricamente, não deveriam chegar aqui, mas é uma segurança extra
-         messages.error(request, "Acesso não permitido.")
-         return redirect('home') 
-
-    # Busca a consulta, garantindo que pertence ao psicólogo logado
-    consulta = get_object_or_404(
-        Consulta, 
-        id_consulta=consulta_id, # <-- CORRIGIDO
-        psicologo=request.user.usuario.psicologo
-    )
-    
     # Valida se o novo_status é válido (está nas opções do modelo)
     valid_statuses = [status[0] for status in Consulta.STATUS_CHOICES]
     if novo_status not in valid_statuses:
@@ -171,66 +187,133 @@ def atualizar_status_consulta(request, consulta_id, novo_status):
         # Redireciona de volta para a página anterior ou para a agenda
         return redirect(request.META.get('HTTP_REFERER', 'psicologo:agenda_completa'))
 
-    # Lógica de transição de status (opcional, mas recomendado)
-    # Ex: Não permitir confirmar uma consulta já cancelada, etc.
-    # (Pode adicionar mais regras aqui se necessário)
-    if consulta.status == 'cancelada' and novo_status != 'cancelada':
-         messages.warning(request, "Não é possível alterar o status de uma consulta cancelada.")
-         return redirect(request.META.get('HTTP_REFERER', 'psicologo:agenda_completa'))
-         
-    if consulta.status == 'realizada' and novo_status != 'realizada':
-         messages.warning(request, "Não é possível alterar o status de uma consulta já realizada.")
-         return redirect(request.META.get('HTTP_REFERER', 'psicologo:agenda_completa'))
-
-
-    # Atualiza o status e salva
-    consulta.status = novo_status
-    consulta.save()
-    
-    messages.success(request, f"Status da consulta de {consulta.paciente.usuario.nome} atualizado para '{consulta.get_status_display()}'.")
+    # Atualiza com um UPDATE condicional (regras em Consulta.TRANSICOES),
+    # garantindo que a consulta pertence ao psicólogo logado
+    minhas_consultas = Consulta.objects.filter(
+        id_consulta=consulta_id,
+        psicologo=request.profile
+    )
+    nome_status = dict(Consulta.STATUS_CHOICES)[novo_status]
+
+    if minhas_consultas.transition(novo_status):
+        messages.success(request, f"Status da consulta atualizado para '{nome_status}'.")
+    else:
+        # Não venceu: descobre o motivo (só neste caminho há um SELECT)
+        status_atual = minhas_consultas.values_list('status', flat=True).first()
+        if status_atual is None:
+            raise Http404("Consulta não encontrada.")
+        messages.warning(
+            request,
+            f"Não é possível alterar uma consulta '{dict(Consulta.STATUS_CHOICES)[status_atual]}' para '{nome_status}'."
+        )
     
     # Redireciona de volta para a página de onde veio (provavelmente a agenda)
     return redirect(request.META.get('HTTP_REFERER', 'psicologo:agenda_completa'))
 
-@login_required
-def meus_pacientes(request):
-    # Proteção: Garante que é um psicólogo
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         return redirect('completar_perfil')
+@psicologo_required
+@require_POST
+def serie_cancelar(request, consulta_id):
+    """Cancela esta consulta e as seguintes da mesma série."""
+    consulta = get_object_or_404(
+        Consulta,
+        id_consulta=consulta_id,
+        psicologo=request.profile,
+        serie__isnull=False,
+    )
+    total = consulta_services.cancelar_desta_em_diante(consulta)
+    messages.success(request, f"{total} consulta(s) da série cancelada(s).")
+    return redirect('psicologo:consulta_detalhes', consulta_id=consulta_id)
+
+@psicologo_required
+@require_POST
+def serie_alterar_hora(request, consulta_id):
+    """Muda o horário desta consulta e das seguintes da mesma série."""
+    consulta = get_object_or_404(
+        Consulta,
+        id_consulta=consulta_id,
+        psicologo=request.profile,
+        serie__isnull=False,
+    )
+    try:
+        nova_hora = parse_time(request.POST.get('hora', ''))
+    except ValueError:
+        nova_hora = None
+    if nova_hora is None:
+        messages.error(request, "Horário inválido.")
+        return redirect('psicologo:consulta_detalhes', consulta_id=consulta_id)
+
+    try:
+        total = consulta_services.alterar_hora_desta_em_diante(consulta, nova_hora)
+    except ValidationError as erro:
+        messages.error(request, f"{' '.join(erro.messages)}. Nada foi alterado.")
+    except IntegrityError:
+        messages.error(request, "O novo horário conflita com outra consulta já agendada. Nada foi alterado.")
+    else:
+        messages.success(request, f"Horário de {total} consulta(s) da série alterado para {nova_hora:%H:%M}.")
+    return redirect('psicologo:consulta_detalhes', consulta_id=consulta_id)
+
+@psicologo_required
+@require_POST
+def atualizar_status_em_lote(request):
+    """Aplica um novo status a várias consultas selecionadas de uma vez."""
+    voltar = request.META.get('HTTP_REFERER', 'psicologo:agenda_completa')
+    novo_status = request.POST.get('novo_status')
+    valid_statuses = [status[0] for status in Consulta.STATUS_CHOICES]
+    if novo_status not in valid_statuses:
+        messages.error(request, "Status inválido.")
+        return redirect(voltar)
 
-    psicologo_obj = request.user.usuario.psicologo
+    ids = [int(valor) for valor in request.POST.getlist('consultas') if valor.isdigit()]
+    if not ids:
+        messages.warning(request, "Nenhuma consulta selecionada.")
+        return redirect(voltar)
 
-    # Busca todos os IDs de pacientes únicos que tiveram consulta com este psicólogo
-    pacientes_ids = Consulta.objects.filter(
-        psicologo=psicologo_obj
-    ).values_list('paciente_id', flat=True).distinct()
+    atualizadas, recusadas = consulta_services.atualizar_status_em_lote(
+        request.profile, ids, novo_status
+    )
+    nome_status = dict(Consulta.STATUS_CHOICES)[novo_status]
+    if atualizadas:
+        messages.success(request, f"{atualizadas} consulta(s) atualizada(s) para '{nome_status}'.")
+    if recusadas:
+        detalhes = "; ".join(f"#{id_consulta}: {motivo}" for id_consulta, motivo in recusadas)
+        messages.warning(request, f"{len(recusadas)} consulta(s) não foram alteradas ({detalhes}).")
+    return redirect(voltar)
+
+# Ordenações da lista "meus pacientes" (?ordem=...)
+ORDENACOES_PACIENTES = {
+    'nome': ('paciente_nome', 'id'), # Usa o índice roster_psi_nome_idx
+    'ultima': ('-ultima_sessao', '-id'), # Usa o índice roster_psi_ultima_idx
+}
+
+@psicologo_required
+def meus_pacientes(request):
+    psicologo_obj = request.profile
 
-    # Busca os objetos Paciente correspondentes, ordenados pelo nome do usuário
-    lista_pacientes = Paciente.objects.filter(
-        id__in=pacientes_ids
-    ).select_related('usuario').order_by('usuario__nome') # select_related otimiza a busca do nome
+    # "Meus pacientes" vem do roster (PsicologoPaciente), sem tocar em Consulta
+    ordem = request.GET.get('ordem')
+    if ordem not in ORDENACOES_PACIENTES:
+        ordem = 'nome'
+    lista_pacientes = PsicologoPaciente.objects.filter(
+        psicologo=psicologo_obj
+    ).select_related('paciente__usuario') # select_related otimiza a busca do nome
 
-    # Configura a paginação: 10 pacientes por página
-    paginator = Paginator(lista_pacientes, 1)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginação por cursor: 10 pacientes por página
+    paginator = KeysetPaginator(lista_pacientes, ORDENACOES_PACIENTES[ordem], 10)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
-        'page_obj': page_obj # Envia o objeto Page (contendo pacientes) para o template
+        'page_obj': page_obj, # Envia o objeto Page (contendo pacientes) para o template
+        'ordem': ordem,
     }
     # Vamos criar este template a seguir
     return render(request, 'psicologo/meus_pacientes.html', context)
 
-@login_required
+@psicologo_required
 def paciente_historico(request, paciente_id):
-    # Proteção: Garante que é um psicólogo
-    if not hasattr(request.user, 'usuario') or not hasattr(request.user.usuario, 'psicologo'):
-         return redirect('completar_perfil')
-
-    psicologo_obj = request.user.usuario.psicologo
+    psicologo_obj = request.profile
 
     # Busca o Paciente específico ou retorna 404
-    paciente_obj = get_object_or_404(Paciente, pk=paciente_id)
+    paciente_obj = get_object_or_404(Paciente.objects.select_related('usuario'), pk=paciente_id)
     
     # Busca todas as consultas DESTE paciente COM ESTE psicólogo
     # Ordenadas da mais recente para a mais antiga
@@ -245,9 +328,8 @@ def paciente_historico(request, paciente_id):
     )
 
     # (Opcional: Paginação para as consultas, se a lista for muito longa)
-    paginator = Paginator(consultas_historico, 15) # 15 por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # paginator = Paginator(consultas_historico, 15) # 15 por página
+    # page_obj = paginator.get_page(request.GET.get('page'))
 
     context = {
         'paciente': paciente_obj,
@@ -256,3 +338,30 @@ def paciente_historico(request, paciente_id):
     }
     # Vamos criar este template a seguir
     return render(request, 'psicologo/paciente_historico.html', context)
+
+# Períodos aceitos na página de estatísticas (?meses=...)
+PERIODOS_ESTATISTICAS = (6, 12, 24)
+
+@psicologo_required
+def estatisticas_view(request):
+    """Comparecimento, faltas, cancelamentos e sessões por mês, lidos dos resumos mensais."""
+    psicologo_obj = request.profile
+
+    try:
+        meses = int(request.GET.get('meses', 12))
+    except ValueError:
+        meses = 12
+    if meses not in PERIODOS_ESTATISTICAS:
+        meses = 12
+
+    por_mes, periodo = estatisticas.resumo_do_periodo(psicologo_obj, meses)
+    maior_mes = max((mes['total'] for mes in por_mes), default=0)
+
+    context = {
+        'por_mes': por_mes,
+        'periodo': periodo,
+        'meses': meses,
+        'periodos': PERIODOS_ESTATISTICAS,
+        'maior_mes': maior_mes or 1, # Base das barras do gráfico
+    }
+    return render(request, 'psicologo/estatisticas.html', context)